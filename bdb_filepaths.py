@@ -9,6 +9,14 @@ data_dir = os.path.join(base, 'data')
 img_dir = os.path.join(base, 'img')
 helpers_dir = os.path.join(base, 'bdb_helpers')
 gif_dir = os.path.join(img_dir, 'gif')
+logos_dir = os.path.join(img_dir, 'logos')
+cache_dir = os.path.join(data_dir, 'cache')
+export_dir = os.path.join(data_dir, 'export')
+
+# Scratch space for temporary gif frames. Each rendering job makes its own
+# uniquely-named subdirectory here, so this may be pointed somewhere else
+# (e.g. a local SSD) by setting the BDB_SCRATCH_DIR environment variable
+temp_dir = os.environ.get('BDB_SCRATCH_DIR', os.path.join(img_dir, 'temp'))
 
 # File locations
 games_data_file = os.path.join(data_dir, 'games.csv')
@@ -17,3 +25,8 @@ plays_data_file = os.path.join(data_dir, 'plays.csv')
 players_data_file = os.path.join(data_dir, 'players.csv')
 plot_testing_data_file = os.path.join(data_dir, 'plot_testing.csv')
 
+# Cached files built from the files above
+team_assets_file = os.path.join(cache_dir, 'team_assets.npz')
+player_index_dir = os.path.join(cache_dir, 'player_index')
+play_similarity_file = os.path.join(cache_dir, 'play_similarity.npz')
+
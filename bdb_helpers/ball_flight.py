@@ -0,0 +1,256 @@
+"""
+@author: Ross Drucker
+"""
+import os
+import numpy as np
+import pandas as pd
+
+import bdb_filepaths as fp
+import bdb_helpers.lookup as find
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.kinematics as kin
+import bdb_helpers.receiver_metrics as rec
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.file_movers as file_ops
+import bdb_helpers.input_checkers as check
+
+# Each week's table of ball flights, once it has been read from disk
+_flights = {}
+
+def ball_flights(tracking):
+    """
+    Finds where and when the ball was thrown and where and when it arrived on
+    every pass play, using only the ball's rows. Every play in the tracking
+    data is handled at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    
+    Returns
+    -------
+    flights: a data frame with one row per pass play containing the game_id,
+        play_id, throw_frame, arrival_frame, air_time (seconds), the
+        throw_x, throw_y, arrival_x, and arrival_y of the ball, the
+        throw_distance (yards), the throw_velocity (the average speed of the
+        ball in the air, in yards per second), the max_ball_speed while the
+        ball was in the air, and the air_yards (how far past the line of
+        scrimmage the ball arrived). Plays without both a throw and an
+        arrival are left out
+    """
+    ball = tracking.loc[
+        tracking['team'] == 'football',
+        ['game_id', 'play_id', 'frame_id', 'event_str', 'player_x',
+         'player_y', 'player_speed', 'play_direction', 'absolute_yard_line']
+    ]
+    
+    # Find when the ball was thrown, and when it arrived after that
+    throws = frame_ops.first_event_frame(
+        ball,
+        rec.THROW_EVENTS,
+        name = 'throw_frame'
+    )
+    arrivals = frame_ops.first_event_frame(
+        ball,
+        rec.ARRIVAL_EVENTS,
+        after = throws,
+        name = 'arrival_frame'
+    )
+    
+    flights = pd.merge(
+        left = throws,
+        right = arrivals,
+        how = 'inner',
+        on = ['game_id', 'play_id']
+    )
+    
+    # Find where the ball was at each end of its flight
+    for end in ['throw', 'arrival']:
+        flights = pd.merge(
+            left = flights,
+            right = ball[
+                ['game_id', 'play_id', 'frame_id', 'player_x', 'player_y']
+            ].rename(columns = {
+                'frame_id': f'{end}_frame',
+                'player_x': f'{end}_x',
+                'player_y': f'{end}_y'
+            }),
+            how = 'left',
+            on = ['game_id', 'play_id', f'{end}_frame']
+        )
+    
+    # Find the ball's top speed while it was in the air
+    in_air = pd.merge(
+        left = ball,
+        right = flights[['game_id', 'play_id', 'throw_frame',
+                         'arrival_frame']],
+        how = 'inner',
+        on = ['game_id', 'play_id']
+    )
+    in_air = in_air[
+        (in_air['frame_id'] >= in_air['throw_frame']) &
+        (in_air['frame_id'] <= in_air['arrival_frame'])
+    ]
+    
+    flights = pd.merge(
+        left = flights,
+        right = in_air.groupby(
+            ['game_id', 'play_id'],
+            as_index = False
+        ).agg(
+            max_ball_speed = ('player_speed', 'max'),
+            play_direction = ('play_direction', 'first'),
+            absolute_yard_line = ('absolute_yard_line', 'first')
+        ),
+        how = 'left',
+        on = ['game_id', 'play_id']
+    )
+    
+    flights['air_time'] = (
+        (flights['arrival_frame'] - flights['throw_frame']) *
+        kin.SECONDS_PER_FRAME
+    )
+    flights['throw_distance'] = np.hypot(
+        flights['arrival_x'] - flights['throw_x'],
+        flights['arrival_y'] - flights['throw_y']
+    )
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        flights['throw_velocity'] = (
+            flights['throw_distance'] / flights['air_time']
+        )
+    
+    # Air yards are measured in the direction the offense is moving
+    flights['air_yards'] = np.where(
+        flights['play_direction'] == 'left',
+        flights['absolute_yard_line'] - flights['arrival_x'],
+        flights['arrival_x'] - flights['absolute_yard_line']
+    )
+    
+    flights = flights[[
+        'game_id', 'play_id', 'throw_frame', 'arrival_frame', 'air_time',
+        'throw_x', 'throw_y', 'arrival_x', 'arrival_y', 'throw_distance',
+        'throw_velocity', 'max_ball_speed', 'air_yards'
+    ]]
+    
+    flights = flights.astype({
+        'throw_frame': 'int16',
+        'arrival_frame': 'int16',
+        'air_time': 'float32',
+        'throw_x': 'float32',
+        'throw_y': 'float32',
+        'arrival_x': 'float32',
+        'arrival_y': 'float32',
+        'throw_distance': 'float32',
+        'throw_velocity': 'float32',
+        'max_ball_speed': 'float32',
+        'air_yards': 'float32'
+    })
+    
+    return flights
+
+def week_ball_flights(week, prechecked_week = False, save = True):
+    """
+    Finds the ball flights of every pass play of a week, and saves them to
+    the cache directory
+    
+    Parameters
+    ----------
+    week: an integer of the week to find
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    save: a boolean of whether or not to save the results as
+        ball_flights_week{week}.parquet in the cache directory
+    
+    Returns
+    -------
+    flights: a data frame of the results. See ball_flights()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    flights = ball_flights(tracking)
+    
+    if save:
+        file_ops.write_cache_table(flights, f'ball_flights_week{week}.parquet')
+        _flights[week] = flights
+    
+    return flights
+
+def week_table(week):
+    """
+    Gets a week's table of ball flights, building and saving it first if it
+    hasn't been built. It is only read from disk once per session
+    
+    Parameters
+    ----------
+    week: an integer of the week
+    
+    Returns
+    -------
+    flights: a data frame of the week's ball flights. See ball_flights()
+    """
+    if week not in _flights:
+        fname = f'ball_flights_week{week}.parquet'
+        
+        if os.path.exists(os.path.join(fp.cache_dir, fname)):
+            _flights[week] = load.cached_table(fname)
+        else:
+            week_ball_flights(week, prechecked_week = True)
+    
+    return _flights[week]
+
+def flight_table(weeks = []):
+    """
+    Gets the ball flights of many weeks at once
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to get. Default is every week
+    
+    Returns
+    -------
+    flights: a data frame of the ball flights. See ball_flights()
+    """
+    if len(weeks) == 0:
+        weeks = range(1, 18)
+    
+    flights = pd.concat(
+        [week_table(week) for week in weeks],
+        ignore_index = True
+    )
+    
+    return flights
+
+def play_flight(gid, pid):
+    """
+    Gets the ball flight of a single play
+    
+    Parameters
+    ----------
+    gid: an integer of a game_id
+    pid: an integer of a play_id
+    
+    Returns
+    -------
+    flight: a data frame with the play's row of ball_flights(). Empty if
+        the ball wasn't thrown, or never arrived
+    """
+    flights = week_table(find.game_week(gid))
+    
+    flight = flights[
+        (flights['game_id'] == gid) &
+        (flights['play_id'] == pid)
+    ].reset_index(drop = True)
+    
+    return flight
+
+if __name__ == '__main__':
+    flights = flight_table()
+    flight = play_flight(2018121603, 105)
@@ -1,6 +1,11 @@
 """
 @author: Ross Drucker
 """
+import numpy as np
+import pandas as pd
+
+import bdb_helpers.frame_ops as frame_ops
+
 def convert_trans(df, start = 'ft', trans = True, x_tran = 60, y_tran = 80/3):
     """
     Convert the units from feet to yards (or feet to yards), and translate
@@ -33,4 +38,145 @@ def convert_trans(df, start = 'ft', trans = True, x_tran = 60, y_tran = 80/3):
         df['x'] = df['x'] + x_tran
         df['y'] = df['y'] + y_tran
     
-    return df
\ No newline at end of file
+    return df
+
+def standardize_direction(tracking, field_length = 120, field_width = 160/3):
+    """
+    Flips plays that are moving to the left so that every play moves to the
+    right. Coordinates are mirrored through the center of the field and the
+    angles are turned around to match
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data. May contain any number of plays
+    field_length: a float of the length of the field in yards, including the
+        endzones
+    field_width: a float of the width of the field in yards
+    
+    Returns
+    -------
+    tracking: a copy of the tracking data with every play moving to the right
+    """
+    tracking = tracking.copy()
+    flip = (tracking['play_direction'] == 'left').values
+    
+    tracking.loc[flip, 'player_x'] = field_length - tracking.loc[
+        flip,
+        'player_x'
+    ]
+    tracking.loc[flip, 'player_y'] = field_width - tracking.loc[
+        flip,
+        'player_y'
+    ]
+    
+    # Angles are in radians, so turning around is adding pi
+    for col in ['player_orientation', 'player_direction']:
+        tracking.loc[flip, col] = np.mod(
+            tracking.loc[flip, col] + np.pi,
+            2 * np.pi
+        )
+    
+    if 'absolute_yard_line' in tracking.columns:
+        tracking.loc[flip, 'absolute_yard_line'] = (
+            field_length - tracking.loc[flip, 'absolute_yard_line']
+        )
+    
+    tracking.loc[flip, 'play_direction'] = 'right'
+    
+    return tracking
+
+def snap_relative(tracking, plays = pd.DataFrame(),
+                  snap_events = ['ball_snap']):
+    """
+    Adds each row's time and position relative to the snap of its play, so
+    that plays can be lined up with one another without re-deriving them.
+    Every play is handled at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data, or merged tracking and plays
+        data. May contain any number of plays
+    plays: a dataframe of plays data holding the absolute_yard_line of each
+        play. Not needed if the tracking data already has it. Default is to
+        load the plays data
+    snap_events: a list of the event_str values that mark the snap
+    
+    Returns
+    -------
+    tracking: a copy of the tracking data, in the same order, with:
+        - seconds_from_snap: negative before the snap
+        - yards_past_los: how far past the line of scrimmage the row is, in
+          the direction the offense is moving
+        - lateral_offset: how far to the offense's left of where the ball
+          was at the snap the row is
+        Each is float32, and NaN for plays without a snap (or, for
+        yards_past_los, without a line of scrimmage)
+    """
+    # Build one row per play holding everything the rows are measured from
+    snaps = frame_ops.first_event_frame(
+        tracking,
+        snap_events,
+        name = 'snap_frame'
+    )
+    
+    ball = tracking.loc[
+        tracking['team'] == 'football',
+        ['game_id', 'play_id', 'frame_id', 'player_y']
+    ].rename(columns = {'frame_id': 'snap_frame', 'player_y': 'snap_ball_y'})
+    
+    snaps = pd.merge(
+        left = snaps,
+        right = ball,
+        how = 'left',
+        on = ['game_id', 'play_id', 'snap_frame']
+    )
+    
+    if 'absolute_yard_line' not in tracking.columns:
+        if plays.empty:
+            # Import here, since data_loaders imports this file
+            import bdb_helpers.data_loaders as load
+            plays = load.plays_data()
+        
+        snaps = pd.merge(
+            left = snaps,
+            right = plays[['game_id', 'play_id', 'absolute_yard_line']],
+            how = 'left',
+            on = ['game_id', 'play_id']
+        )
+    
+    # A left merge keeps the rows in the same order as the tracking data
+    keys = tracking[['game_id', 'play_id']]
+    if 'absolute_yard_line' in tracking.columns:
+        keys = tracking[['game_id', 'play_id', 'absolute_yard_line']]
+    
+    per_row = pd.merge(
+        left = keys,
+        right = snaps,
+        how = 'left',
+        on = ['game_id', 'play_id']
+    )
+    
+    # Plays moving to the left have the offense's forward and left turned
+    # around on the field
+    sign = np.where(tracking['play_direction'].values == 'left', -1, 1)
+    
+    tracking = tracking.copy()
+    
+    tracking['seconds_from_snap'] = frame_ops.seconds_from_snap(
+        tracking,
+        snap_events
+    )
+    tracking['yards_past_los'] = (
+        sign * (
+            tracking['player_x'].values -
+            per_row['absolute_yard_line'].values
+        )
+    ).astype('float32')
+    tracking['lateral_offset'] = (
+        sign * (
+            tracking['player_y'].values -
+            per_row['snap_ball_y'].values
+        )
+    ).astype('float32')
+    
+    return tracking
@@ -0,0 +1,365 @@
+"""
+@author: Ross Drucker
+"""
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import bdb_helpers.coord_ops as coord_ops
+import bdb_helpers.resampling as resample
+import bdb_helpers.receiver_metrics as rec
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.file_movers as file_ops
+import bdb_helpers.input_checkers as check
+
+warnings.filterwarnings('ignore')
+
+# Each side of the ball gets 11 player slots
+SIDE_SLOTS = 11
+
+# The y coordinate of the middle of the field
+FIELD_MIDDLE = 80 / 3
+
+def masked_corr(a, b, axis = -1):
+    """
+    Finds the correlation between two sets of series, using only the points
+    where both series have values
+    
+    Parameters
+    ----------
+    a, b: arrays of the same shape of the series to correlate
+    axis: an integer of the axis that the series run along
+    
+    Returns
+    -------
+    corr: an array of the correlation of each pair of series, NaN where
+        there are fewer than two points or either series doesn't vary
+    """
+    both = ~np.isnan(a) & ~np.isnan(b)
+    a = np.where(both, a, 0)
+    b = np.where(both, b, 0)
+    n = both.sum(axis = axis)
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        a_mean = a.sum(axis = axis, keepdims = True) / np.expand_dims(n, axis)
+        b_mean = b.sum(axis = axis, keepdims = True) / np.expand_dims(n, axis)
+        
+        a_dev = np.where(both, a - a_mean, 0)
+        b_dev = np.where(both, b - b_mean, 0)
+        
+        corr = (a_dev * b_dev).sum(axis = axis) / np.sqrt(
+            (a_dev ** 2).sum(axis = axis) * (b_dev ** 2).sum(axis = axis)
+        )
+    
+    corr[n < 2] = np.nan
+    
+    return corr
+
+def receiver_slots(tracking, plays, player_ids):
+    """
+    Finds which offensive slots hold a player running a route
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data
+    plays: a data frame of the game_id and play_id of each play, from
+        resampling.resample_plays()
+    player_ids: an array of shape (play, player) of the player in each slot,
+        from resampling.resample_plays()
+    
+    Returns
+    -------
+    is_receiver: a boolean array of shape (play, offensive player)
+    """
+    routes = tracking.loc[
+        tracking['route_type'].notna(),
+        ['game_id', 'play_id', 'player_id']
+    ].drop_duplicates()
+    
+    slots = pd.DataFrame({
+        'game_id': np.repeat(plays['game_id'].values, SIDE_SLOTS),
+        'play_id': np.repeat(plays['play_id'].values, SIDE_SLOTS),
+        'player_id': player_ids[:, :SIDE_SLOTS].ravel()
+    })
+    
+    is_receiver = pd.merge(
+        left = slots,
+        right = routes.assign(has_route = True),
+        how = 'left',
+        on = ['game_id', 'play_id', 'player_id']
+    )['has_route'].fillna(False).values.astype(bool)
+    
+    return is_receiver.reshape(-1, SIDE_SLOTS)
+
+def velocity(paths):
+    """
+    Splits speed and direction into velocity along each axis
+    
+    Parameters
+    ----------
+    paths: an array from resampling.resample_plays() whose last axis holds
+        the x, y, speed, and direction
+    
+    Returns
+    -------
+    v: an array of the same shape as paths, with the last axis replaced by
+        the velocity along x and y
+    """
+    v = np.stack([
+        paths[..., 2] * np.cos(paths[..., 3]),
+        paths[..., 2] * np.sin(paths[..., 3])
+    ], -1)
+    
+    return v
+
+def pick_receiver(values, slot):
+    """
+    Picks one receiver's value for every defender at every step
+    
+    Parameters
+    ----------
+    values: an array of shape (play, step, receiver) of the receivers' values
+    slot: an integer array of shape (play, step, defender) of which receiver
+        to pick for each defender
+    
+    Returns
+    -------
+    picked: an array of shape (play, step, defender) of the picked values
+    """
+    picked = np.take_along_axis(values, slot, axis = 2)
+    
+    return picked
+
+def coverage_features(tracking, n_steps = 20):
+    """
+    Measures how each defender moved relative to the receivers between the
+    snap and the throw, to tell man coverage (following one receiver) apart
+    from zone coverage (holding an area). Every defender of every play is
+    handled at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays. Plays
+        without a snap and a throw are left out
+    n_steps: an integer of the number of steps to resample the time between
+        the snap and the throw into
+    
+    Returns
+    -------
+    features: a data frame with one row per defender per play containing the
+        game_id, play_id, player_id, the matched_receiver_id (the receiver
+        the defender was closest to on average), and:
+        - trail_corr: the correlation between the defender's velocity and
+          the matched receiver's
+        - velocity_alignment: the average cosine between the defender's
+          velocity and the velocity of whichever receiver is closest to them
+        - depth_at_snap, depth_var: the defender's depth off the line of
+          scrimmage at the snap, and how much it varied
+        - leverage_mean, leverage_var: how far inside the matched receiver
+          the defender was (negative is outside), and how much it varied
+        - separation_mean, separation_var: the distance to the matched
+          receiver, and how much it varied
+    """
+    tracking = coord_ops.standardize_direction(tracking)
+    
+    # Resample the time between the snap and the throw, with the offense in
+    # the first block of slots and the defense in the next
+    plays, times, player_ids, paths = resample.resample_plays(
+        tracking,
+        ['player_x', 'player_y', 'player_speed', 'player_direction'],
+        n_steps = n_steps,
+        end_event = rec.THROW_EVENTS,
+        side_slots = SIDE_SLOTS
+    )
+    
+    # Only keep plays where the throw was found
+    has_throw = ~np.isnan(times[:, -1])
+    plays = plays[has_throw].reset_index(drop = True)
+    player_ids = player_ids[has_throw]
+    paths = paths[has_throw]
+    
+    is_receiver = receiver_slots(tracking, plays, player_ids)
+    
+    # Split out the receivers and defenders as (play, step, player, feature)
+    receivers = np.where(
+        is_receiver[:, None, :, None],
+        paths[:, :, :SIDE_SLOTS, :],
+        np.nan
+    )
+    defenders = paths[:, :, SIDE_SLOTS:2 * SIDE_SLOTS, :]
+    
+    rec_v = velocity(receivers)
+    def_v = velocity(defenders)
+    
+    # The distance from each defender to each receiver at each step, as
+    # (play, step, defender, receiver)
+    gaps = np.hypot(
+        defenders[:, :, :, None, 0] - receivers[:, :, None, :, 0],
+        defenders[:, :, :, None, 1] - receivers[:, :, None, :, 1]
+    )
+    
+    # Match each defender to the receiver they were closest to on average
+    mean_gap = np.nanmean(gaps, axis = 1)
+    has_match = ~np.all(np.isnan(mean_gap), axis = -1)
+    matched = np.argmin(
+        np.where(np.isnan(mean_gap), np.inf, mean_gap),
+        axis = -1
+    )
+    
+    # Pull out the matched receiver's values at every step
+    match_slot = np.broadcast_to(matched[:, None, :], gaps.shape[:3])
+    
+    match_y = pick_receiver(receivers[..., 1], match_slot)
+    match_vx = pick_receiver(rec_v[..., 0], match_slot)
+    match_vy = pick_receiver(rec_v[..., 1], match_slot)
+    match_gap = np.take_along_axis(gaps, match_slot[..., None], 3)[..., 0]
+    
+    match_y[~np.broadcast_to(has_match[:, None, :], match_y.shape)] = np.nan
+    
+    # Correlate the defender's velocity with the matched receiver's, over
+    # both directions together
+    trail_corr = masked_corr(
+        np.concatenate([def_v[..., 0], def_v[..., 1]], 1),
+        np.concatenate([match_vx, match_vy], 1),
+        axis = 1
+    )
+    
+    # Line the defender's velocity up with the closest receiver at each step
+    nearest = np.argmin(np.where(np.isnan(gaps), np.inf, gaps), axis = -1)
+    nearest_v = np.stack([
+        pick_receiver(rec_v[..., 0], nearest),
+        pick_receiver(rec_v[..., 1], nearest)
+    ], -1)
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        alignment = (
+            np.sum(def_v * nearest_v, axis = -1) / (
+                np.linalg.norm(def_v, axis = -1) *
+                np.linalg.norm(nearest_v, axis = -1)
+            )
+        )
+    alignment[~np.isfinite(alignment)] = np.nan
+    
+    # Depth is measured from the line of scrimmage towards the defense
+    los = pd.merge(
+        left = plays,
+        right = tracking.drop_duplicates(['game_id', 'play_id'])[
+            ['game_id', 'play_id', 'absolute_yard_line']
+        ],
+        how = 'left',
+        on = ['game_id', 'play_id']
+    )['absolute_yard_line'].values
+    depth = defenders[..., 0] - los[:, None, None]
+    
+    # Leverage is how much closer to the middle of the field the defender is
+    # than the receiver
+    leverage = (
+        np.abs(match_y - FIELD_MIDDLE) -
+        np.abs(defenders[..., 1] - FIELD_MIDDLE)
+    )
+    
+    matched_ids = np.take_along_axis(
+        player_ids[:, :SIDE_SLOTS],
+        matched,
+        axis = 1
+    )
+    matched_ids[~has_match] = np.nan
+    
+    defender_ids = player_ids[:, SIDE_SLOTS:2 * SIDE_SLOTS]
+    has_defender = ~np.isnan(defender_ids)
+    
+    features = pd.DataFrame({
+        'game_id': np.repeat(plays['game_id'].values, SIDE_SLOTS),
+        'play_id': np.repeat(plays['play_id'].values, SIDE_SLOTS),
+        'player_id': defender_ids.ravel(),
+        'matched_receiver_id': matched_ids.ravel(),
+        'trail_corr': trail_corr.ravel(),
+        'velocity_alignment': np.nanmean(alignment, axis = 1).ravel(),
+        'depth_at_snap': depth[:, 0, :].ravel(),
+        'depth_var': np.nanvar(depth, axis = 1).ravel(),
+        'leverage_mean': np.nanmean(leverage, axis = 1).ravel(),
+        'leverage_var': np.nanvar(leverage, axis = 1).ravel(),
+        'separation_mean': np.nanmean(match_gap, axis = 1).ravel(),
+        'separation_var': np.nanvar(match_gap, axis = 1).ravel()
+    })[has_defender.ravel()].reset_index(drop = True)
+    
+    for col in features.columns[4:]:
+        features[col] = features[col].astype('float32')
+    
+    return features
+
+def week_coverage_features(week, prechecked_week = False, n_steps = 20,
+                           save = True):
+    """
+    Measures the coverage features of every defender on every pass play of a
+    week, and saves them to the cache directory
+    
+    Parameters
+    ----------
+    week: an integer of the week to measure
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    n_steps: see coverage_features()
+    save: a boolean of whether or not to save the results as
+        coverage_features_week{week}.parquet in the cache directory
+    
+    Returns
+    -------
+    features: a data frame of the results. See coverage_features()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    features = coverage_features(tracking, n_steps)
+    features['week'] = week
+    
+    if save:
+        file_ops.write_cache_table(
+            features,
+            f'coverage_features_week{week}.parquet'
+        )
+    
+    return features
+
+def season_coverage_features(weeks = range(1, 18), n_steps = 20,
+                             max_workers = None):
+    """
+    Measures the coverage features for many weeks at once, one week per
+    process. Each week is saved to the cache directory as it finishes
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to measure. Default is every week
+    n_steps: see coverage_features()
+    max_workers: an integer of the most weeks to measure at once. Default is
+        the number of processors
+    
+    Returns
+    -------
+    features: a data frame of the results for every week. See
+        coverage_features()
+    """
+    weeks = [check.week_number(week) for week in weeks]
+    
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        jobs = [
+            pool.submit(week_coverage_features, week, True, n_steps)
+            for week in weeks
+        ]
+        
+        features = pd.concat(
+            [job.result() for job in jobs],
+            ignore_index = True
+        )
+    
+    return features
+
+if __name__ == '__main__':
+    features = season_coverage_features()
@@ -6,6 +6,7 @@ import math
 import warnings
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 
 import bdb_filepaths as fp
 import bdb_helpers.lookup as find
@@ -14,6 +15,10 @@ import bdb_helpers.input_checkers as check
 
 warnings.filterwarnings('ignore')
 
+# Team logos and information, loaded from the team assets file the first time
+# they are needed and kept in memory after that
+_team_assets = {}
+
 def games_data(gid = 0, prechecked_gid = False):
     """
     Loads the game/schedule information provided
@@ -305,6 +310,97 @@ def teams_data():
     
     return teams_data
 
+def team_assets():
+    """
+    Loads the pre-built team logos and team information. The file is built by
+    file_ops.build_team_assets() if it does not already exist, if the teams
+    data or any logo has changed since it was built, or if it was built for
+    other render presets. It is only read from disk once per session
+    
+    Returns
+    -------
+    _team_assets: a dictionary of arrays of the team logos and team
+        information
+    """
+    if not _team_assets:
+        # Import here, since file_movers imports this file via lookup
+        import bdb_helpers.file_movers as file_ops
+        
+        # Rebuild the file if any of the files it is built from are newer
+        sources = [fp.teams_data_file] + [
+            os.path.join(fp.logos_dir, file)
+            for file in os.listdir(fp.logos_dir)
+            if file.endswith('.png')
+        ]
+        
+        rebuild = (
+            not os.path.exists(fp.team_assets_file) or
+            max(os.path.getmtime(source) for source in sources) >
+            os.path.getmtime(fp.team_assets_file)
+        )
+        
+        # Rebuild the file if the presets' logo sizes have changed
+        if not rebuild:
+            with np.load(fp.team_assets_file) as assets:
+                if 'preset_names' in assets.files:
+                    built_sizes = dict(zip(
+                        assets['preset_names'].tolist(),
+                        assets['preset_sizes'].tolist()
+                    ))
+                else:
+                    built_sizes = {}
+            
+            rebuild = built_sizes != file_ops.logo_sizes()
+        
+        if rebuild:
+            file_ops.build_team_assets()
+        
+        with np.load(fp.team_assets_file) as assets:
+            _team_assets.update({key: assets[key] for key in assets.files})
+    
+    return _team_assets
+
+def team_info(team):
+    """
+    Gets a team's information (nickname, colors, etc.) from the team assets
+    
+    Parameters
+    ----------
+    team: a string of a team's code
+    
+    Returns
+    -------
+    info: a dictionary of the team's row in the teams data, keyed by column
+    """
+    assets = team_assets()
+    
+    # Find the team's row, then pull that row out of each column
+    row = np.flatnonzero(assets['team_team_code'] == team)[0]
+    
+    info = {
+        key[len('team_'):]: val[row]
+        for key, val in assets.items()
+        if key.startswith('team_')
+    }
+    
+    return info
+
+def team_logo(team, preset = 'broadcast'):
+    """
+    Gets a team's logo, sized for a render preset, from the team assets
+    
+    Parameters
+    ----------
+    team: a string of a team's code. The AFC, NFC, and NFL codes also have
+        logos
+    preset: a string of the name of the render preset to get the logo for
+    
+    Returns
+    -------
+    logo: an array of the logo's RGBA pixel values
+    """
+    return team_assets()[f'logo_{team.lower()}_{preset}']
+
 def player_data():
     """
     Loads the player information provided
@@ -336,6 +432,116 @@ def player_data():
     
     return players
 
+def cached_table(fname, columns = None):
+    """
+    Loads a table of results saved to the cache directory by
+    file_ops.write_cache_table()
+    
+    Parameters
+    ----------
+    fname: a string of the file name of the table, e.g.
+        'receiver_separation_week1.parquet'
+    columns: a list of the columns to load. Default is to load all columns
+    
+    Returns
+    -------
+    table: a data frame of the cached table
+    """
+    table = pd.read_parquet(
+        os.path.join(fp.cache_dir, fname),
+        columns = columns
+    )
+    
+    return table
+
+def player_trajectories(player_id, weeks = [], columns = None,
+                        player_info = True):
+    """
+    Loads every row of tracking data for a single player, using the player
+    index to read only the parts of the cached weeks that hold the player's
+    rows. The weeks must first be cached with file_ops.build_week_cache()
+    
+    Parameters
+    ----------
+    player_id: an integer of the player's ID
+    weeks: a list of the weeks to load. Default is every cached week
+    columns: a list of the tracking columns to load. Default is to load all
+        columns
+    player_info: a boolean of whether or not to attach the player's
+        information (height, weight, etc.) from player_data()
+    
+    Returns
+    -------
+    trk: a data frame of the player's tracking data, sorted by game, play,
+        and frame
+    """
+    # Find which rows of which weeks belong to the player. Every week's index
+    # file in the directory is read together
+    player_index = pd.read_parquet(
+        fp.player_index_dir,
+        filters = [('player_id', '=', player_id)]
+    )
+    
+    if len(weeks) > 0:
+        player_index = player_index[player_index['week'].isin(weeks)]
+    
+    # The weeks' files aren't read in week order, so put them back in order
+    player_index = player_index.sort_values('week')
+    
+    if columns is not None and 'player_id' not in columns:
+        columns = ['player_id'] + list(columns)
+    
+    pieces = []
+    for week, row_start, row_stop in zip(player_index['week'],
+                                         player_index['row_start'],
+                                         player_index['row_stop']):
+        week_file = pq.ParquetFile(
+            os.path.join(fp.cache_dir, f'week{week}.parquet')
+        )
+        
+        # Find the row groups that overlap the player's rows
+        group_sizes = [
+            week_file.metadata.row_group(i).num_rows
+            for i in range(week_file.num_row_groups)
+        ]
+        group_starts = np.r_[0, np.cumsum(group_sizes)[:-1]]
+        groups = np.flatnonzero(
+            (group_starts < row_stop) &
+            (group_starts + group_sizes > row_start)
+        )
+        
+        # Read only those row groups, then trim them down to the player's rows
+        offset = group_starts[groups[0]]
+        week_trk = week_file.read_row_groups(
+            groups.tolist(),
+            columns = columns
+        ).slice(row_start - offset, row_stop - row_start)
+        
+        pieces.append(week_trk.to_pandas())
+    
+    # Players who aren't in the index have no tracking data to return
+    if len(pieces) == 0:
+        return pd.DataFrame(columns = columns)
+    
+    trk = pd.concat(pieces, ignore_index = True)
+    
+    # Attach the player's information
+    if player_info:
+        players = player_data()
+        players = players[players['player_id'] == player_id].drop(
+            columns = [col for col in players.columns
+                       if col in trk.columns and col != 'player_id']
+        )
+        
+        trk = pd.merge(
+            left = trk,
+            right = players,
+            how = 'left',
+            on = 'player_id'
+        )
+    
+    return trk
+
 def football_field_coords(unit = 'yd', zero = 'l'):
     """
     Generate the points needed to plot a football field
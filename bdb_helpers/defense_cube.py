@@ -0,0 +1,292 @@
+"""
+@author: Ross Drucker
+"""
+import os
+import numpy as np
+import pandas as pd
+
+import bdb_filepaths as fp
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.receiver_metrics as rec
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.file_movers as file_ops
+import bdb_helpers.input_checkers as check
+
+# The dimensions of the cube. Every cell of the cube is one combination of
+# these
+DIMENSIONS = [
+    'player_id', 'week', 'defensive_team', 'player_position', 'down',
+    'offense_formation'
+]
+
+# The measures stored in each cell, and how each one is combined when
+# rolling cells up. Mean separation allowed is separation_sum / targets
+MEASURES = {
+    'snaps': 'sum',
+    'targets': 'sum',
+    'separation_sum': 'sum',
+    'distance': 'sum',
+    'max_speed': 'max'
+}
+
+def targets_faced(tracking, separation):
+    """
+    Finds the defender covering the targeted receiver on each pass play. The
+    targeted receiver is taken to be the one closest to the ball when it
+    arrives, and the defender covering them is the closest defender at that
+    time
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data
+    separation: a data frame from rec.receiver_separation()
+    
+    Returns
+    -------
+    targets: a data frame of the game_id, play_id, the player_id of the
+        defender, and the arrival_separation they allowed
+    """
+    # Find the ball when it arrived
+    ball = pd.merge(
+        left = tracking.loc[
+            tracking['team'] == 'football',
+            ['game_id', 'play_id', 'frame_id', 'player_x', 'player_y']
+        ].rename(columns = {
+            'frame_id': 'arrival_frame',
+            'player_x': 'ball_x',
+            'player_y': 'ball_y'
+        }),
+        right = separation[['game_id', 'play_id', 'arrival_frame']]
+            .drop_duplicates(),
+        how = 'inner',
+        on = ['game_id', 'play_id', 'arrival_frame']
+    )
+    
+    receivers = pd.merge(
+        left = separation,
+        right = tracking[
+            ['game_id', 'play_id', 'frame_id', 'player_id', 'player_x',
+             'player_y']
+        ].rename(columns = {'frame_id': 'arrival_frame'}),
+        how = 'inner',
+        on = ['game_id', 'play_id', 'player_id', 'arrival_frame']
+    )
+    receivers = pd.merge(
+        left = receivers,
+        right = ball,
+        how = 'inner',
+        on = ['game_id', 'play_id', 'arrival_frame']
+    )
+    
+    # Keep the receiver closest to the ball on each play
+    receivers['ball_distance'] = np.hypot(
+        receivers['player_x'] - receivers['ball_x'],
+        receivers['player_y'] - receivers['ball_y']
+    )
+    
+    targets = receivers.sort_values(
+        ['game_id', 'play_id', 'ball_distance'],
+        kind = 'mergesort'
+    ).drop_duplicates(['game_id', 'play_id'])
+    
+    targets = targets.loc[
+        targets['arrival_defender_id'].notna(),
+        ['game_id', 'play_id', 'arrival_defender_id', 'arrival_separation']
+    ].rename(columns = {'arrival_defender_id': 'player_id'})
+    
+    return targets
+
+def week_cells(tracking, week, separation = pd.DataFrame()):
+    """
+    Computes the cells of the cube for a week of tracking data
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data for one week
+    week: an integer of the week
+    separation: a data frame from rec.receiver_separation() for the same
+        week. Default is to compute it from the tracking data
+    
+    Returns
+    -------
+    cells: a data frame with one row per cell, holding the DIMENSIONS and
+        the MEASURES
+    """
+    defense = tracking[frame_ops.defense_mask(tracking)]
+    
+    # Sum up each defender's play
+    plays = defense.groupby(
+        ['game_id', 'play_id', 'player_id'],
+        as_index = False
+    ).agg(
+        defensive_team = ('defensive_team', 'first'),
+        player_position = ('player_position', 'first'),
+        down = ('down', 'first'),
+        offense_formation = ('offense_formation', 'first'),
+        distance = ('distance', 'sum'),
+        max_speed = ('player_speed', 'max')
+    )
+    
+    # Attach the targets each defender faced
+    if separation.empty:
+        separation = rec.receiver_separation(tracking)
+    
+    targets = targets_faced(tracking, separation)
+    targets['targets'] = 1
+    
+    plays = pd.merge(
+        left = plays,
+        right = targets,
+        how = 'left',
+        on = ['game_id', 'play_id', 'player_id']
+    )
+    plays['targets'] = plays['targets'].fillna(0)
+    plays['separation_sum'] = plays['arrival_separation'].fillna(0)
+    plays['snaps'] = 1
+    plays['week'] = week
+    
+    # Missing dimensions would drop out of the grouping, so fill them in
+    plays['offense_formation'] = plays['offense_formation'].fillna('UNKNOWN')
+    plays['player_position'] = plays['player_position'].fillna('UNKNOWN')
+    plays['down'] = plays['down'].fillna(0)
+    
+    cells = plays.groupby(DIMENSIONS, as_index = False).agg(MEASURES)
+    
+    return compact(cells)
+
+def compact(cells):
+    """
+    Stores the cube's columns in the smallest types that hold them
+    
+    Parameters
+    ----------
+    cells: a data frame of cells of the cube
+    
+    Returns
+    -------
+    cells: the same cells with smaller column types
+    """
+    cells = cells.astype({
+        'player_id': 'int32',
+        'week': 'int8',
+        'down': 'int8',
+        'defensive_team': 'category',
+        'player_position': 'category',
+        'offense_formation': 'category',
+        'snaps': 'int32',
+        'targets': 'int32',
+        'separation_sum': 'float32',
+        'distance': 'float32',
+        'max_speed': 'float32'
+    })
+    
+    return cells
+
+def build_week(week, prechecked_week = False):
+    """
+    Builds the week's cells of the cube from its tracking and plays data and
+    saves them to the cache directory. Each week is stored on its own, so
+    adding a week only needs that week's data
+    
+    Parameters
+    ----------
+    week: an integer of the week to build
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    
+    Returns
+    -------
+    cells: a data frame of the week's cells
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    cells = week_cells(tracking, week)
+    file_ops.write_cache_table(cells, f'defense_cube_week{week}.parquet')
+    
+    return cells
+
+def cube(weeks = []):
+    """
+    Loads the cells of the cube for every week that has been built
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to load. Default is every week that has been
+        built
+    
+    Returns
+    -------
+    cells: a data frame of the cells. See week_cells()
+    """
+    if len(weeks) == 0:
+        weeks = range(1, 18)
+    
+    week_files = [
+        f'defense_cube_week{week}.parquet' for week in weeks
+        if os.path.exists(
+            os.path.join(fp.cache_dir, f'defense_cube_week{week}.parquet')
+        )
+    ]
+    
+    if len(week_files) == 0:
+        return compact(pd.DataFrame(columns = DIMENSIONS + list(MEASURES)))
+    
+    cells = pd.concat(
+        [load.cached_table(fname) for fname in week_files],
+        ignore_index = True
+    )
+    
+    return compact(cells)
+
+def rollup(by = ['player_id'], weeks = [], filters = {}):
+    """
+    Rolls the cube up to any combination of its dimensions, e.g. to each
+    player's season, or each team's week
+    
+    Parameters
+    ----------
+    by: a list of the DIMENSIONS to keep. Every other dimension is summed
+        over
+    weeks: a list of the weeks to include. Default is every week that has
+        been built
+    filters: a dictionary of dimensions to the value (or list of values) to
+        keep, e.g. {'down': 3, 'defensive_team': ['CHI', 'GB']}
+    
+    Returns
+    -------
+    totals: a data frame with one row per combination of the by dimensions,
+        holding the MEASURES and the mean_separation allowed on targets
+    """
+    cells = cube(weeks)
+    
+    for key, val in filters.items():
+        if type(val) == list:
+            cells = cells[cells[key].isin(val)]
+        else:
+            cells = cells[cells[key] == val]
+    
+    totals = cells.groupby(
+        by,
+        as_index = False,
+        observed = True
+    ).agg(MEASURES)
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        totals['mean_separation'] = (
+            totals['separation_sum'] / totals['targets']
+        ).astype('float32')
+    
+    return totals
+
+if __name__ == '__main__':
+    for week in range(1, 18):
+        build_week(week, prechecked_week = True)
+    
+    player_seasons = rollup(['player_id'])
+    team_weeks = rollup(['defensive_team', 'week'])
@@ -0,0 +1,230 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+import pandas as pd
+
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.input_checkers as check
+
+def frame_slots(tracking, mask, starts, stops,
+                cols = ['player_x', 'player_y']):
+    """
+    Lays the rows matching a mask out into a dense array with one row per
+    frame and one slot per player. Frames with fewer players than the most
+    crowded frame are padded with NaN
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data sorted with
+        frame_ops.sort_tracking(by = 'frame')
+    mask: a boolean array of which rows to lay out
+    starts: an array of the first row of each frame, from
+        frame_ops.group_bounds()
+    stops: an array of one past the last row of each frame, from
+        frame_ops.group_bounds()
+    cols: a list of the columns to lay out. Default is the player's x and y
+        coordinates
+    
+    Returns
+    -------
+    values: a float32 array of shape (frame, player slot, column)
+    player_ids: a float array of shape (frame, player slot) of the player ID
+        in each slot, NaN where the slot is empty
+    """
+    n_frames = len(starts)
+    
+    # Find which frame each row belongs to and which slot within that frame
+    # it should go in
+    frame = np.repeat(np.arange(n_frames), stops - starts)[mask]
+    slot = frame_ops.rank_within(mask, starts, stops)[mask]
+    n_slots = slot.max() + 1 if len(slot) > 0 else 0
+    
+    values = np.full(
+        (n_frames, n_slots, len(cols)),
+        np.nan,
+        dtype = 'float32'
+    )
+    values[frame, slot] = tracking.loc[mask, cols].values
+    
+    player_ids = np.full((n_frames, n_slots), np.nan)
+    player_ids[frame, slot] = tracking.loc[mask, 'player_id'].values
+    
+    return values, player_ids
+
+def offense_defense_distances(tracking, chunk_size = 20000):
+    """
+    Computes the distance between every offensive player and every defensive
+    player in every frame of the tracking data. The distances are computed
+    for many frames at once, a chunk at a time to keep memory in check
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    chunk_size: an integer of the number of frames to compute at once
+    
+    Returns
+    -------
+    frames: a data frame of the game_id, play_id, and frame_id of each frame
+    offense_ids: an array of shape (frame, offensive player) of the player ID
+        of each offensive player, NaN where a frame has fewer players
+    defense_ids: an array of shape (frame, defensive player) of the player ID
+        of each defensive player, NaN where a frame has fewer players
+    distances: a float32 array of shape
+        (frame, offensive player, defensive player) of the distance in yards
+        between each pair of players, NaN where either player is missing
+    """
+    # The ball is not needed, and sorting puts each frame's rows together
+    tracking = frame_ops.sort_tracking(
+        tracking[tracking['team'] != 'football']
+    )
+    
+    starts, stops = frame_ops.group_bounds(
+        tracking['game_id'].values,
+        tracking['play_id'].values,
+        tracking['frame_id'].values
+    )
+    
+    frames = tracking.loc[
+        starts,
+        ['game_id', 'play_id', 'frame_id']
+    ].reset_index(drop = True)
+    
+    # Lay each side's players out into (frame, player, x/y) arrays
+    is_offense = frame_ops.offense_mask(tracking)
+    
+    offense_xy, offense_ids = frame_slots(
+        tracking,
+        is_offense,
+        starts,
+        stops
+    )
+    defense_xy, defense_ids = frame_slots(
+        tracking,
+        ~is_offense,
+        starts,
+        stops
+    )
+    
+    # Broadcast every offensive player against every defensive player a chunk
+    # of frames at a time
+    distances = np.empty(
+        (len(frames), offense_xy.shape[1], defense_xy.shape[1]),
+        dtype = 'float32'
+    )
+    
+    for chunk_start in range(0, len(frames), chunk_size):
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        
+        diff = offense_xy[chunk, :, None, :] - defense_xy[chunk, None, :, :]
+        distances[chunk] = np.sqrt(np.sum(diff ** 2, axis = -1))
+    
+    return frames, offense_ids, defense_ids, distances
+
+def nearest_defender(tracking = pd.DataFrame(), frames = pd.DataFrame(),
+                     offense_ids = None, defense_ids = None,
+                     distances = None, chunk_size = 20000):
+    """
+    Finds the closest defender to every offensive player in every frame, and
+    how far away that defender is (the offensive player's separation)
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). Not needed if the outputs of
+        offense_defense_distances() are passed instead
+    frames, offense_ids, defense_ids, distances: the outputs of
+        offense_defense_distances(), if they have already been computed
+    chunk_size: an integer of the number of frames to compute at once
+    
+    Returns
+    -------
+    separation: a data frame with one row per offensive player per frame
+        containing the player_id, the nearest_defender_id, and the
+        separation in yards between them
+    """
+    if distances is None:
+        frames, offense_ids, defense_ids, distances = \
+            offense_defense_distances(tracking, chunk_size)
+    
+    # Missing players shouldn't ever be the closest, so treat them as being
+    # infinitely far away
+    n_frames, n_offense, n_defense = distances.shape
+    nearest = np.zeros((n_frames, n_offense), dtype = int)
+    sep = np.full((n_frames, n_offense), np.inf, dtype = 'float32')
+    
+    # With no defenders at all, every offensive player is left without a
+    # nearest defender
+    for chunk_start in range(0, n_frames if n_defense > 0 else 0,
+                             chunk_size):
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        
+        chunk_distances = np.where(
+            np.isnan(distances[chunk]),
+            np.inf,
+            distances[chunk]
+        )
+        nearest[chunk] = np.argmin(chunk_distances, axis = 2)
+        sep[chunk] = np.take_along_axis(
+            chunk_distances,
+            nearest[chunk][:, :, None],
+            axis = 2
+        )[:, :, 0]
+    
+    sep[np.isinf(sep)] = np.nan
+    
+    nearest_ids = np.full((n_frames, n_offense), np.nan)
+    if n_defense > 0:
+        nearest_ids = np.take_along_axis(defense_ids, nearest, axis = 1)
+        nearest_ids[np.isnan(sep)] = np.nan
+    
+    # Flatten back out to one row per offensive player per frame
+    has_player = ~np.isnan(offense_ids)
+    frame_idx = np.nonzero(has_player)[0]
+    
+    separation = frames.iloc[frame_idx].reset_index(drop = True)
+    separation['player_id'] = offense_ids[has_player]
+    separation['nearest_defender_id'] = nearest_ids[has_player]
+    separation['separation'] = sep[has_player]
+    
+    return separation
+
+def week_distances(week, prechecked_week = False, chunk_size = 20000):
+    """
+    Computes the distance between every offensive player and every defensive
+    player in every frame of a week's plays
+    
+    Parameters
+    ----------
+    week: an integer of the week to compute distances for
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    chunk_size: an integer of the number of frames to compute at once
+    
+    Returns
+    -------
+    frames, offense_ids, defense_ids, distances: see
+        offense_defense_distances()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    # Load all of the week's tracking data, and attach the play information
+    # to know which team is on offense
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    return offense_defense_distances(tracking, chunk_size)
+
+if __name__ == '__main__':
+    frames, offense_ids, defense_ids, distances = week_distances(1)
+    separation = nearest_defender(
+        frames = frames,
+        offense_ids = offense_ids,
+        defense_ids = defense_ids,
+        distances = distances
+    )
@@ -4,34 +4,50 @@
 import os
 import shutil
 import imageio
+import tempfile
+import numpy as np
+import pandas as pd
+from PIL import Image
 
 import bdb_filepaths as fp
 import bdb_helpers.lookup as find
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.coord_ops as coord_ops
+import bdb_helpers.data_loaders as load
+import bdb_helpers.input_checkers as check
 
-def make_gif_temp_dir(gid, pid):
+def make_gif_temp_dir(gid, pid, scratch_root = ''):
     """
     Make a temporary directory for the static files of a play while making a
-    gif
+    gif. Every call makes a new, uniquely-named directory so that several
+    gifs (even of the same play) can be rendered at once without their frames
+    colliding
 
     Parameters
     ----------
     gid: an integer of a game_id
     pid: an integer of a play_id
+    scratch_root: a string of the directory in which to make the temporary
+        directory. The default is bdb_filepaths.temp_dir
 
     Returns
     -------
-    None.
+    temp_path: a string of the path to the temporary directory
     """
-    # Make the desired path
-    desired_path = os.path.join(fp.img_dir, 'temp', f'{gid}_{pid}')
+    # Use the configured scratch space unless told otherwise
+    if scratch_root == '':
+        scratch_root = fp.temp_dir
     
-    # Check if the path exists. If not, create one
-    if not os.path.exists(desired_path):
-        os.makedirs(desired_path)
+    # Make sure the scratch space exists. Multiple jobs may get here at the
+    # same time, so don't fail if another job made it first
+    os.makedirs(scratch_root, exist_ok = True)
     
-    return None
+    # Make a directory that is unique to this job
+    temp_path = tempfile.mkdtemp(prefix = f'{gid}_{pid}_', dir = scratch_root)
+    
+    return temp_path
 
-def collect_gif_play_frames(gid, pid):
+def collect_gif_play_frames(gid, pid, temp_path):
     """
     Collects the files needed to make a gif
 
@@ -39,27 +55,26 @@ def collect_gif_play_frames(gid, pid):
     ----------
     gid: an integer of a game_id
     pid: an integer of a play_id
+    temp_path: a string of the path to the temporary directory returned by
+        make_gif_temp_dir()
 
     Returns
     -------
     imgs: a list of images ready to be made into a gif
     """
-    # Find the desired path with static images
-    desired_path = os.path.join(fp.img_dir, 'temp', f'{gid}_{pid}')
-    
     # Go through the directory and select only the .png files for the gif
-    files = [file for file in os.listdir(desired_path) if file.endswith('png')]
+    files = [file for file in os.listdir(temp_path) if file.endswith('png')]
     
     # Reorder since the files may be read out of order, but their order is
     # known and matters
     files.sort()
     
     # Read in the actual image files
-    imgs = [imageio.imread(os.path.join(desired_path, file)) for file in files]
+    imgs = [imageio.imread(os.path.join(temp_path, file)) for file in files]
     
     return imgs
 
-def make_gif(gid, pid, images, fname = ''):
+def make_gif(gid, pid, images, fname = '', fps = 10):
     """
     Make and save the actual gif to the img/gif/{game_id} folder
 
@@ -68,6 +83,10 @@ def make_gif(gid, pid, images, fname = ''):
     gid: an integer of a game_id
     pid: an integer of a play_id
     images: a list of images to convert to a gif
+    fname: a string of the file name to save the gif as. Default is the
+        play ID
+    fps: a float of the number of frames per second of the gif. Default is
+        10, the rate the tracking data is recorded at
 
     Returns
     -------
@@ -80,8 +99,7 @@ def make_gif(gid, pid, images, fname = ''):
     output_path = os.path.join(fp.gif_dir, f'{gid}_{home}_{away}')
     
     # Check if the folder for this game's gifs already exists. If not, make it
-    if not os.path.exists(output_path):
-        os.makedirs(output_path)
+    os.makedirs(output_path, exist_ok = True)
     
     # Save the gif
     if fname == '':
@@ -89,34 +107,294 @@ def make_gif(gid, pid, images, fname = ''):
         
     if fname[-4:] != '.gif':
         fname = f'{fname}.gif'
+    
+    # Write the gif to a partial file first, then move it into place. This
+    # keeps other processes from ever seeing a half-written gif
+    partial_fd, partial_fname = tempfile.mkstemp(
+        suffix = '.gif',
+        dir = output_path
+    )
+    os.close(partial_fd)
+    
+    try:
+        imageio.mimwrite(partial_fname, images, format = 'GIF', fps = fps)
         
-    try:  
-        imageio.mimwrite(
-            os.path.join(output_path, fname),
-            images
+        try:
+            os.replace(partial_fname, os.path.join(output_path, fname))
+        except:
+            os.replace(partial_fname, os.path.join(output_path, f'{pid}.gif'))
+    finally:
+        if os.path.exists(partial_fname):
+            os.remove(partial_fname)
+    
+    return None
+
+def logo_sizes(presets = {}):
+    """
+    Finds how many pixels wide the logos are drawn at in each render preset.
+    Logos are about 500 pixels wide when drawn on the broadcast preset at 100
+    dpi, so each preset's size is relative to that
+    
+    Parameters
+    ----------
+    presets: a dictionary of render presets, as in
+        plot_helpers.RENDER_PRESETS. Default is to use RENDER_PRESETS
+    
+    Returns
+    -------
+    sizes: a dictionary of each preset's name to its logo size in pixels
+    """
+    # Import here, since plot_helpers imports this file
+    if not presets:
+        import bdb_helpers.plot_helpers as draw
+        presets = draw.RENDER_PRESETS
+    
+    sizes = {
+        name: int(np.ceil(500 * preset['scale'] * preset['dpi'] / 100))
+        for name, preset in presets.items()
+    }
+    
+    return sizes
+
+def build_team_assets(presets = {}):
+    """
+    Decodes every logo in img/logos, shrinks each one to the size it is drawn
+    at in every render preset, and saves them along with the team information
+    in team_data.csv to a single compressed file. Plotting functions read the
+    logos and colors from this file instead of the original files. The
+    presets' logo sizes are saved too, so that the file can be rebuilt when
+    the presets change
+
+    Parameters
+    ----------
+    presets: a dictionary of render presets, as in
+        plot_helpers.RENDER_PRESETS. Default is to use RENDER_PRESETS
+
+    Returns
+    -------
+    None.
+    """
+    sizes = logo_sizes(presets)
+    
+    assets = {
+        'preset_names': np.array(list(sizes), dtype = str),
+        'preset_sizes': np.array(list(sizes.values()), dtype = int)
+    }
+    
+    # Store each column of the teams data as its own array. Missing values
+    # are left empty, rather than being turned into the string 'nan'
+    teams = pd.read_csv(fp.teams_data_file)
+    for col in teams.columns:
+        assets[f'team_{col}'] = teams[col].fillna('').values.astype(str)
+    
+    # Size each logo for each preset, without enlarging it
+    for file in sorted(os.listdir(fp.logos_dir)):
+        if not file.endswith('.png'):
+            continue
+        
+        code = file[:-4].lower()
+        logo = Image.open(os.path.join(fp.logos_dir, file)).convert('RGBA')
+        
+        for name, size in sizes.items():
+            size = min(size, logo.size[0])
+            
+            assets[f'logo_{code}_{name}'] = np.asarray(
+                logo.resize((size, size), Image.LANCZOS)
+            )
+    
+    # Write the file somewhere temporary first, then move it into place so
+    # that anything reading it never sees a partial file
+    os.makedirs(fp.cache_dir, exist_ok = True)
+    
+    partial_fd, partial_fname = tempfile.mkstemp(
+        suffix = '.npz',
+        dir = fp.cache_dir
+    )
+    os.close(partial_fd)
+    
+    try:
+        np.savez_compressed(partial_fname, **assets)
+        os.replace(partial_fname, fp.team_assets_file)
+    finally:
+        if os.path.exists(partial_fname):
+            os.remove(partial_fname)
+    
+    return None
+
+def write_cache_table(table, fname, row_group_size = None):
+    """
+    Saves a table of results to the cache directory as a parquet file. The
+    file is written somewhere temporary first, then moved into place so that
+    anything reading it never sees a partial file
+
+    Parameters
+    ----------
+    table: a data frame to save
+    fname: a string of the file name to save the table as, e.g.
+        'receiver_separation_week1.parquet'
+    row_group_size: an integer of the most rows to store in each row group
+        of the file. Smaller row groups let readers skip more of the file.
+        Default is to let pyarrow decide
+
+    Returns
+    -------
+    fpath: a string of the path to the saved file
+    """
+    os.makedirs(fp.cache_dir, exist_ok = True)
+    fpath = os.path.join(fp.cache_dir, fname)
+    
+    partial_fd, partial_fname = tempfile.mkstemp(
+        suffix = '.parquet',
+        dir = fp.cache_dir
+    )
+    os.close(partial_fd)
+    
+    try:
+        table.to_parquet(
+            partial_fname,
+            index = False,
+            row_group_size = row_group_size
         )
-    except:
-        imageio.mimwrite(
-            os.path.join(output_path, f'{pid}.gif'),
-            images
+        os.replace(partial_fname, fpath)
+    finally:
+        if os.path.exists(partial_fname):
+            os.remove(partial_fname)
+    
+    return fpath
+
+def write_cache_arrays(arrays, fname):
+    """
+    Saves a set of arrays to the cache directory as a single .npz file. The
+    file is written somewhere temporary first, then moved into place so that
+    anything reading it never sees a partial file
+
+    Parameters
+    ----------
+    arrays: a dictionary of names to the arrays to save
+    fname: a string of the file name to save the arrays as, e.g.
+        'play_similarity.npz'
+
+    Returns
+    -------
+    fpath: a string of the path to the saved file
+    """
+    os.makedirs(fp.cache_dir, exist_ok = True)
+    fpath = os.path.join(fp.cache_dir, fname)
+    
+    partial_fd, partial_fname = tempfile.mkstemp(
+        suffix = '.npz',
+        dir = fp.cache_dir
+    )
+    os.close(partial_fd)
+    
+    try:
+        np.savez(partial_fname, **arrays)
+        os.replace(partial_fname, fpath)
+    finally:
+        if os.path.exists(partial_fname):
+            os.remove(partial_fname)
+    
+    return fpath
+
+def build_week_cache(week, prechecked_week = False,
+                     row_group_size = 50000):
+    """
+    Saves a week of cleaned tracking data to the cache directory, sorted so
+    that every player's rows for the week are together, and records where
+    each player's rows are in the player index. This lets a player's tracking
+    data be read without loading every week in full (see
+    load.player_trajectories()). Each row's time and position relative to
+    the snap are stored with it (see coord_ops.snap_relative())
+    
+    Parameters
+    ----------
+    week: an integer of the week to cache
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    row_group_size: an integer of the most rows to store in each row group
+        of the cached file
+    
+    Returns
+    -------
+    fpath: a string of the path to the cached week
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    # Attach each row's time and position relative to the snap, so they're
+    # stored with the tracking data rather than re-derived by every reader
+    tracking = coord_ops.snap_relative(
+        load.tracking_data(week = week, prechecked_week = True),
+        load.plays_data()
+    )
+    
+    # Sort the week by player, then by when each row happened. The ball has
+    # no player ID, so its rows go at the end
+    tracking = tracking.sort_values(
+        ['player_id', 'game_id', 'play_id', 'frame_id'],
+        kind = 'mergesort',
+        na_position = 'last'
+    ).reset_index(drop = True)
+    
+    fpath = write_cache_table(
+        tracking,
+        f'week{week}.parquet',
+        row_group_size = row_group_size
+    )
+    
+    # Find the block of rows belonging to each player
+    n_player_rows = tracking['player_id'].notna().sum()
+    player_ids = tracking['player_id'].values[:n_player_rows]
+    starts, stops = frame_ops.group_bounds(player_ids)
+    
+    week_index = pd.DataFrame({
+        'player_id': player_ids[starts].astype(int),
+        'week': week,
+        'row_start': starts,
+        'row_stop': stops
+    })
+    
+    # Each week has its own index file, so that weeks can be cached at the
+    # same time without overwriting each other's entries
+    os.makedirs(fp.player_index_dir, exist_ok = True)
+    write_cache_table(
+        week_index,
+        os.path.join(
+            os.path.basename(fp.player_index_dir),
+            f'week{week}.parquet'
         )
+    )
     
-    return None
+    return fpath
 
-def remove_temp_static_frame_directory(gid, pid):
+def remove_temp_static_frame_directory(gid, pid, temp_path):
     """
-    Remove the temporary directory with the static files
+    Remove the temporary directory with the static files. Only the directory
+    belonging to this job is removed, so other plays being rendered at the
+    same time are left alone
 
     Parameters
     ----------
     gid: an integer of a game_id
     pid: an integer of a play_id
+    temp_path: a string of the path to the temporary directory returned by
+        make_gif_temp_dir()
 
     Returns
     -------
     None.
     """
+    # Rename the directory first. The rename is atomic, so the directory
+    # disappears from its original path all at once, and the slower removal
+    # of its contents happens out of the way
+    trash_path = f'{temp_path}.removing'
+    
+    try:
+        os.rename(temp_path, trash_path)
+    except FileNotFoundError:
+        return None
+    
     # Remove the temporary directory
-    shutil.rmtree(os.path.join('img', 'temp'))
+    shutil.rmtree(trash_path, ignore_errors = True)
     
-    return None
\ No newline at end of file
+    return None
@@ -0,0 +1,229 @@
+"""
+@author: Ross Drucker
+"""
+import os
+import numpy as np
+import pandas as pd
+
+import bdb_filepaths as fp
+import bdb_helpers.lookup as find
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.coord_ops as coord_ops
+import bdb_helpers.data_loaders as load
+
+# Each week's table of snapshots, once it has been read from disk
+_snapshots = {}
+
+def snapshots(tracking, snap_events = ['ball_snap']):
+    """
+    Takes a snapshot of where every player lined up at the snap of each
+    play. Coordinates are standardized so that every offense is moving to
+    the right. Every play in the tracking data is handled at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    snap_events: a list of the event_str values that mark the snap
+    
+    Returns
+    -------
+    snaps: a data frame with one row per player per play containing the
+        game_id, play_id, player_id, side ('offense' or 'defense'),
+        player_position, the standardized player_x and player_y, and:
+        - depth: how far past the ball the player lined up, in the
+          direction the offense is moving. Negative is the offense's
+          backfield
+        - width: how far to the offense's left of the ball the player
+          lined up
+        Plays without a snap, or without the ball at the snap, are left out
+    """
+    snap_frames = frame_ops.first_event_frame(
+        tracking,
+        snap_events,
+        name = 'frame_id'
+    )
+    
+    # Keep only the rows at each play's snap
+    at_snap = pd.merge(
+        left = tracking[
+            ['game_id', 'play_id', 'frame_id', 'player_id', 'team',
+             'player_position', 'player_x', 'player_y', 'player_orientation',
+             'player_direction', 'play_direction', 'offensive_team', 'home']
+        ],
+        right = snap_frames,
+        how = 'inner',
+        on = ['game_id', 'play_id', 'frame_id']
+    )
+    at_snap = coord_ops.standardize_direction(at_snap)
+    
+    is_football = (at_snap['team'] == 'football').values
+    ball = at_snap.loc[
+        is_football,
+        ['game_id', 'play_id', 'player_x', 'player_y']
+    ].rename(columns = {'player_x': 'ball_x', 'player_y': 'ball_y'})
+    
+    # Measure everyone from where the ball was
+    snaps = at_snap[~is_football].copy()
+    snaps['side'] = np.where(
+        frame_ops.offense_mask(snaps),
+        'offense',
+        'defense'
+    )
+    
+    snaps = pd.merge(
+        left = snaps,
+        right = ball,
+        how = 'inner',
+        on = ['game_id', 'play_id']
+    )
+    snaps['depth'] = snaps['player_x'] - snaps['ball_x']
+    snaps['width'] = snaps['player_y'] - snaps['ball_y']
+    
+    snaps = snaps[[
+        'game_id', 'play_id', 'player_id', 'side', 'player_position',
+        'player_x', 'player_y', 'depth', 'width'
+    ]].sort_values(
+        ['game_id', 'play_id', 'side', 'width'],
+        kind = 'mergesort'
+    ).reset_index(drop = True)
+    
+    snaps = snaps.astype({
+        'player_id': 'int32',
+        'side': 'category',
+        'player_position': 'category',
+        'player_x': 'float32',
+        'player_y': 'float32',
+        'depth': 'float32',
+        'width': 'float32'
+    })
+    
+    return snaps
+
+def refresh(weeks = [], max_workers = None):
+    """
+    Brings the saved snapshots up to date with the raw data, by running the
+    pipeline's formation_snapshots stage. Only weeks whose data has changed
+    are built again
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to refresh. Default is every week
+    max_workers: an integer of the most weeks to build at once. See
+        pipe.run()
+    
+    Returns
+    -------
+    results: a data frame of which stages were run. See pipe.run()
+    """
+    # Import here, since pipeline imports this file
+    import bdb_helpers.pipeline as pipe
+    
+    if len(weeks) == 0:
+        weeks = range(1, 18)
+    
+    results = pipe.run(
+        ['formation_snapshots'],
+        weeks,
+        max_workers = max_workers
+    )
+    
+    # Read the weeks from disk again the next time they're asked for
+    for week in weeks:
+        _snapshots.pop(int(week), None)
+    
+    return results
+
+def week_table(week):
+    """
+    Gets a week's table of snapshots, as saved by the pipeline's
+    formation_snapshots stage. The week is only built if it has never been,
+    and is only read from disk once per session. Use refresh() to bring the
+    saved snapshots up to date after the raw data changes
+    
+    Parameters
+    ----------
+    week: an integer of the week
+    
+    Returns
+    -------
+    snaps: a data frame of the week's snapshots. See snapshots()
+    """
+    # Import here, since pipeline imports this file
+    import bdb_helpers.pipeline as pipe
+    
+    week = int(week)
+    if week not in _snapshots:
+        fname = pipe.output_paths('formation_snapshots', week)[0]
+        
+        if not os.path.exists(os.path.join(fp.cache_dir, fname)):
+            refresh([week], max_workers = 1)
+        
+        _snapshots[week] = load.cached_table(fname)
+    
+    return _snapshots[week]
+
+def snapshot_table(weeks = [], plays_info = False):
+    """
+    Gets the snapshots of many weeks at once
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to get. Default is every week
+    plays_info: a boolean of whether or not to attach each play's
+        offense_formation and personnel from the plays data
+    
+    Returns
+    -------
+    snaps: a data frame of the snapshots. See snapshots()
+    """
+    if len(weeks) == 0:
+        weeks = range(1, 18)
+    
+    snaps = pd.concat(
+        [week_table(week) for week in weeks],
+        ignore_index = True
+    )
+    
+    # Attach the play's formation and personnel
+    if plays_info:
+        snaps = pd.merge(
+            left = snaps,
+            right = load.plays_data()[
+                ['game_id', 'play_id', 'offense_formation',
+                 'personnel_offense', 'defenders_in_box',
+                 'personnel_defense']
+            ],
+            how = 'left',
+            on = ['game_id', 'play_id']
+        )
+    
+    return snaps
+
+def play_snapshot(gid, pid):
+    """
+    Gets the snapshot of a single play
+    
+    Parameters
+    ----------
+    gid: an integer of a game_id
+    pid: an integer of a play_id
+    
+    Returns
+    -------
+    snap: a data frame with the play's rows of snapshots(). Empty if the
+        play has no snap
+    """
+    snaps = week_table(find.game_week(gid))
+    
+    snap = snaps[
+        (snaps['game_id'] == gid) &
+        (snaps['play_id'] == pid)
+    ].reset_index(drop = True)
+    
+    return snap
+
+if __name__ == '__main__':
+    results = refresh()
+    snaps = snapshot_table(plays_info = True)
+    snap = play_snapshot(2018121603, 105)
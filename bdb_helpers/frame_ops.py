@@ -0,0 +1,402 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+import pandas as pd
+
+def sort_tracking(tracking, by = 'frame'):
+    """
+    Sorts tracking data into one of the layouts that the batch functions in
+    this package expect. In the 'frame' layout, every frame of every play is a
+    contiguous block of rows. In the 'player' layout, every player's path
+    through a play is a contiguous block of rows
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data
+    by: a string of which layout to sort into. Default is 'frame', could be
+        'player'
+    
+    Returns
+    -------
+    tracking: a sorted copy of the tracking data with a fresh index
+    """
+    if by == 'frame':
+        sort_cols = ['game_id', 'play_id', 'frame_id', 'team', 'player_id']
+    else:
+        sort_cols = ['game_id', 'play_id', 'team', 'player_id', 'frame_id']
+    
+    # A stable sort keeps rows that tie (e.g. the ball, which has no player
+    # ID) in the order they came in
+    tracking = tracking.sort_values(
+        sort_cols,
+        kind = 'mergesort'
+    ).reset_index(drop = True)
+    
+    return tracking
+
+def group_bounds(*keys):
+    """
+    Finds where each run of identical keys starts and stops in sorted data
+    
+    Parameters
+    ----------
+    keys: arrays of the same length that the data is sorted by, e.g. the
+        game_id, play_id, and frame_id columns
+    
+    Returns
+    -------
+    starts: an array of the first row of each group
+    stops: an array of one past the last row of each group
+    """
+    n_rows = len(keys[0])
+    
+    if n_rows == 0:
+        return np.zeros(0, dtype = int), np.zeros(0, dtype = int)
+    
+    # A new group starts wherever any of the keys changes
+    changed = np.zeros(n_rows, dtype = bool)
+    changed[0] = True
+    for key in keys:
+        key = np.asarray(key)
+        changed[1:] |= key[1:] != key[:-1]
+    
+    starts = np.flatnonzero(changed)
+    stops = np.r_[starts[1:], n_rows]
+    
+    return starts, stops
+
+def rank_within(mask, starts, stops):
+    """
+    Numbers the rows matching a mask within each group, starting at 0, in the
+    order they appear. Rows not matching the mask get -1
+    
+    Parameters
+    ----------
+    mask: a boolean array of which rows to number
+    starts: an array of the first row of each group, from group_bounds()
+    stops: an array of one past the last row of each group, from
+        group_bounds()
+    
+    Returns
+    -------
+    rank: an integer array of each row's position among the matching rows
+        of its group
+    """
+    mask = np.asarray(mask, dtype = bool)
+    
+    # Count the matching rows seen so far, then take away the count at the
+    # start of each row's group
+    seen = np.cumsum(mask)
+    before_group = seen[starts] - mask[starts]
+    rank = seen - 1 - np.repeat(before_group, stops - starts)
+    
+    rank[~mask] = -1
+    
+    return rank
+
+def offense_mask(tracking):
+    """
+    Finds which rows of merged tracking and plays data belong to a player on
+    offense
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays()
+    
+    Returns
+    -------
+    is_offense: a boolean array that is True for offensive players' rows
+    """
+    team = tracking['team'].values
+    home_on_offense = (
+        tracking['offensive_team'].values == tracking['home'].values
+    )
+    
+    is_offense = np.where(team == 'home', home_on_offense, ~home_on_offense)
+    is_offense &= team != 'football'
+    
+    return is_offense
+
+def defense_mask(tracking):
+    """
+    Finds which rows of merged tracking and plays data belong to a player on
+    defense
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays()
+    
+    Returns
+    -------
+    is_defense: a boolean array that is True for defensive players' rows
+    """
+    is_defense = ~offense_mask(tracking)
+    is_defense &= tracking['team'].values != 'football'
+    
+    return is_defense
+
+def first_event_frame(tracking, events, after = pd.DataFrame(),
+                      name = 'frame_id'):
+    """
+    Finds the first frame of every play in which any of a list of events
+    happens
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data. May contain any number of plays
+    events: a list of the event_str values to look for
+    after: a data frame of game_id, play_id, and frame_id. If provided, only
+        events at or after the frame given for each play are considered
+    name: a string of what to name the column holding the frame
+    
+    Returns
+    -------
+    event_frames: a data frame of the game_id, play_id, and the first frame
+        of each play where one of the events happens. Plays without any of
+        the events are left out
+    """
+    event_rows = tracking.loc[
+        tracking['event_str'].isin(events),
+        ['game_id', 'play_id', 'frame_id']
+    ]
+    
+    # Only look at events after the given frames, if any
+    if not after.empty:
+        event_rows = pd.merge(
+            left = event_rows,
+            right = after.rename(columns = {after.columns[2]: 'after'}),
+            how = 'inner',
+            on = ['game_id', 'play_id']
+        )
+        event_rows = event_rows[event_rows['frame_id'] >= event_rows['after']]
+    
+    event_frames = event_rows.groupby(
+        ['game_id', 'play_id'],
+        as_index = False
+    )['frame_id'].min().rename(columns = {'frame_id': name})
+    
+    return event_frames
+
+def seconds_from_snap(tracking, snap_events = ['ball_snap']):
+    """
+    Measures how long before or after the snap each row of tracking data was
+    recorded, to use as a time axis that lines plays up with one another
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data. May contain any number of plays
+    snap_events: a list of the event_str values that mark the snap
+    
+    Returns
+    -------
+    seconds: a float32 array of the seconds from the snap of each row (in the
+        order of the tracking data). Negative before the snap, and NaN for
+        plays without a snap
+    """
+    snaps = first_event_frame(tracking, snap_events, name = 'snap_frame')
+    
+    # A left merge keeps the rows in the same order as the tracking data
+    snap_frame = pd.merge(
+        left = tracking[['game_id', 'play_id']],
+        right = snaps,
+        how = 'left',
+        on = ['game_id', 'play_id']
+    )['snap_frame'].values
+    
+    # Tracking is recorded at 10 frames per second
+    seconds = (tracking['frame_id'].values - snap_frame) / 10
+    seconds = seconds.astype('float32')
+    
+    return seconds
+
+class EventIndex:
+    """
+    An index of where every play, and every event within each play, sits in a
+    set of tracking data. Once built, a window of frames between two events
+    is found with a couple of binary searches rather than by filtering the
+    whole play, and is returned as a slice of the tracking data
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data. May contain any number of plays
+    snap_events: a list of the event_str values that mark the snap
+    
+    Attributes
+    ----------
+    tracking: the tracking data, sorted with sort_tracking(by = 'frame')
+    play_rows: a dictionary of (game_id, play_id) to the first row and one
+        past the last row of the play in tracking
+    events: a dictionary of (game_id, play_id) to a dictionary of each event
+        in the play to the first frame it happens in
+    seconds: a float32 array of the seconds from the snap of each row of
+        tracking
+    """
+    def __init__(self, tracking, snap_events = ['ball_snap']):
+        # Sorting puts every play's frames in order in one block of rows
+        tracking = sort_tracking(tracking)
+        
+        starts, stops = group_bounds(
+            tracking['game_id'].values,
+            tracking['play_id'].values
+        )
+        
+        self.play_rows = {
+            (gid, pid): (start, stop)
+            for gid, pid, start, stop in zip(
+                tracking['game_id'].values[starts],
+                tracking['play_id'].values[starts],
+                starts,
+                stops
+            )
+        }
+        
+        # Find the first frame of each event in each play
+        event_frames = tracking.loc[
+            tracking['event_str'].notna() & (tracking['event_str'] != 'None'),
+            ['game_id', 'play_id', 'event_str', 'frame_id']
+        ].groupby(
+            ['game_id', 'play_id', 'event_str'],
+            as_index = False
+        )['frame_id'].min()
+        
+        self.events = {key: {} for key in self.play_rows}
+        for gid, pid, event, frame in event_frames.itertuples(index = False):
+            self.events[(gid, pid)][event] = frame
+        
+        self.tracking = tracking
+        self.frame_ids = tracking['frame_id'].values
+        self.seconds = seconds_from_snap(tracking, snap_events)
+    
+    def event_frame(self, play_key, event):
+        """
+        Finds the first frame of a play where an event happens
+        
+        Parameters
+        ----------
+        play_key: a tuple of the (game_id, play_id) of the play
+        event: a string of the event_str to find, or a list of them, in which
+            case the first of them to happen is used
+        
+        Returns
+        -------
+        frame: an integer of the frame_id of the event, or None if the event
+            does not happen in the play
+        """
+        if isinstance(event, str):
+            event = [event]
+        
+        play_events = self.events.get(play_key, {})
+        frames = [play_events[e] for e in event if e in play_events]
+        
+        if len(frames) == 0:
+            return None
+        
+        return min(frames)
+    
+    def bounds(self, play_key, start_event = None, end_event = None,
+               pad = 0):
+        """
+        Finds the rows of tracking that make up a window of a play
+        
+        Parameters
+        ----------
+        play_key: a tuple of the (game_id, play_id) of the play
+        start_event: a string (or list of strings) of the event that starts
+            the window. If None, the window starts at the start of the play
+        end_event: a string (or list of strings) of the event that ends the
+            window. The end event's frame is included in the window. If None,
+            the window runs to the end of the play
+        pad: an integer of the number of frames to add to both sides of the
+            window. The window never extends beyond the play
+        
+        Returns
+        -------
+        start, stop: integers of the first row and one past the last row of
+            the window. They are equal if the play or either event can't be
+            found
+        """
+        if play_key not in self.play_rows:
+            return 0, 0
+        
+        play_start, play_stop = self.play_rows[play_key]
+        play_frames = self.frame_ids[play_start:play_stop]
+        
+        first_frame = play_frames[0]
+        last_frame = play_frames[-1]
+        
+        if start_event is not None:
+            first_frame = self.event_frame(play_key, start_event)
+        if end_event is not None:
+            last_frame = self.event_frame(play_key, end_event)
+        
+        if first_frame is None or last_frame is None:
+            return play_start, play_start
+        
+        # The play's rows are in frame order, so the window's edges can be
+        # found with a binary search
+        start = play_start + np.searchsorted(
+            play_frames,
+            first_frame - pad,
+            side = 'left'
+        )
+        stop = play_start + np.searchsorted(
+            play_frames,
+            last_frame + pad,
+            side = 'right'
+        )
+        
+        return start, max(start, stop)
+    
+    def window(self, play_key, start_event = None, end_event = None,
+               pad = 0):
+        """
+        Gets the tracking data for a window of a play between two events,
+        e.g. from ball_snap to pass_forward. The window is a slice of
+        the index's tracking data rather than a filtered copy of it, so it
+        should be copied before being modified
+        
+        Parameters
+        ----------
+        play_key: a tuple of the (game_id, play_id) of the play
+        start_event, end_event, pad: see bounds()
+        
+        Returns
+        -------
+        window: a dataframe of the rows of tracking in the window
+        """
+        start, stop = self.bounds(play_key, start_event, end_event, pad)
+        
+        return self.tracking.iloc[start:stop]
+    
+    def window_seconds(self, play_key, start_event = None, end_event = None,
+                       pad = 0):
+        """
+        Gets the seconds from the snap of each row of a window, to use as
+        the window's time axis
+        
+        Parameters
+        ----------
+        play_key: a tuple of the (game_id, play_id) of the play
+        start_event, end_event, pad: see bounds()
+        
+        Returns
+        -------
+        seconds: a float32 array of the seconds from the snap of each row of
+            the window returned by window()
+        """
+        start, stop = self.bounds(play_key, start_event, end_event, pad)
+        
+        return self.seconds[start:stop]
+
+if __name__ == '__main__':
+    import bdb_helpers.data_loaders as load
+    
+    index = EventIndex(load.tracking_data(week = 1, prechecked_week = True))
+    in_air = index.window(
+        (2018090600, 75),
+        'pass_forward',
+        'pass_arrived'
+    )
@@ -0,0 +1,302 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+from scipy.signal import lfilter, savgol_coeffs
+
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.data_loaders as load
+import bdb_helpers.input_checkers as check
+
+# Tracking is recorded at 10 frames per second
+SECONDS_PER_FRAME = 0.1
+
+def segment_bounds(tracking):
+    """
+    Finds the block of rows of each player's (and the ball's) path through
+    each play
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data sorted with
+        frame_ops.sort_tracking(by = 'player')
+    
+    Returns
+    -------
+    starts: an array of the first row of each path
+    stops: an array of one past the last row of each path
+    """
+    # The ball has no player ID, so give it one that can't match a player
+    starts, stops = frame_ops.group_bounds(
+        tracking['game_id'].values,
+        tracking['play_id'].values,
+        tracking['team'].values,
+        tracking['player_id'].fillna(-1).values
+    )
+    
+    return starts, stops
+
+def segment_positions(starts, stops):
+    """
+    Numbers the rows of each path from its start and from its end
+    
+    Parameters
+    ----------
+    starts: an array of the first row of each path, from segment_bounds()
+    stops: an array of one past the last row of each path, from
+        segment_bounds()
+    
+    Returns
+    -------
+    from_start: an integer array of how many rows each row is after the first
+        row of its path
+    to_end: an integer array of how many rows each row is before the last row
+        of its path
+    """
+    lengths = stops - starts
+    row = np.arange(stops[-1] if len(stops) > 0 else 0)
+    
+    from_start = row - np.repeat(starts, lengths)
+    to_end = np.repeat(stops, lengths) - 1 - row
+    
+    return from_start, to_end
+
+def segment_derivative(values, times, from_start, to_end):
+    """
+    Takes the derivative of a value with respect to time along every path at
+    once. Central differences are used inside each path and one-sided
+    differences at its ends. Differences are taken over the actual time
+    between rows, so missing frames don't throw the results off
+    
+    Parameters
+    ----------
+    values: an array of the values to differentiate, sorted by path then time
+    times: an array of the time of each row, in seconds
+    from_start, to_end: arrays from segment_positions()
+    
+    Returns
+    -------
+    derivative: an array of the rate of change of the values at each row.
+        Paths of a single row get NaN
+    """
+    n_rows = len(values)
+    has_prev = from_start > 0
+    has_next = to_end > 0
+    
+    # Shift the values and times by a row in each direction. Rows without a
+    # neighbor in their own path point to themselves
+    row = np.arange(n_rows)
+    prev_row = np.where(has_prev, row - 1, row)
+    next_row = np.where(has_next, row + 1, row)
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        derivative = (
+            (values[next_row] - values[prev_row]) /
+            (times[next_row] - times[prev_row])
+        )
+    
+    derivative[~has_prev & ~has_next] = np.nan
+    
+    return derivative
+
+def savgol_smooth(values, from_start, to_end, window = 7, polyorder = 2):
+    """
+    Smooths every path at once with a Savitzky-Golay filter, applied as a
+    single convolution over all of the rows. Rows too close to either end of
+    their path for the full window to fit inside the path are left as they
+    are
+    
+    Parameters
+    ----------
+    values: an array of the values to smooth, sorted by path then time
+    from_start, to_end: arrays from segment_positions()
+    window: an odd integer of the number of rows in the filter's window
+    polyorder: an integer of the order of the polynomial fit in each window
+    
+    Returns
+    -------
+    smoothed: an array of the smoothed values
+    """
+    half = window // 2
+    
+    smoothed = np.convolve(
+        values,
+        savgol_coeffs(window, polyorder),
+        mode = 'same'
+    )
+    
+    # Windows that run into a neighboring path mix the two paths together,
+    # so keep the original values there
+    at_edge = (from_start < half) | (to_end < half)
+    smoothed[at_edge] = values[at_edge]
+    
+    return smoothed
+
+def ewma_smooth(values, from_start, alpha = 0.5):
+    """
+    Smooths every path at once with an exponentially weighted moving average,
+    run as a single filter over all of the rows. Each path starts from its
+    own first value, as if it were smoothed on its own. Missing values are
+    held over from the closest value in the same path while filtering, so
+    they can't spread into later paths, and are left missing
+    
+    Parameters
+    ----------
+    values: an array of the values to smooth, sorted by path then time
+    from_start: an array from segment_positions()
+    alpha: a float between 0 and 1 of the weight on each new value. Lower
+        values smooth more
+    
+    Returns
+    -------
+    smoothed: an array of the smoothed values
+    """
+    decay = 1 - alpha
+    row = np.arange(len(values))
+    path_start = row - from_start
+    
+    # Fill each missing value with the last value before it in its path, or
+    # the first one after it if there isn't one. A single missing value
+    # would otherwise carry through every row after it
+    is_valid = ~np.isnan(values)
+    before = np.maximum.accumulate(np.where(is_valid, row, -1))
+    after = np.minimum.accumulate(
+        np.where(is_valid, row, len(values))[::-1]
+    )[::-1]
+    
+    source = np.where(before >= path_start, before, after)
+    in_path = source < len(values)
+    in_path[in_path] = path_start[source[in_path]] == path_start[in_path]
+    
+    filled = np.where(
+        in_path,
+        values[np.minimum(source, len(values) - 1)],
+        0
+    )
+    
+    # Filter every path together. Each path picks up some of the previous
+    # path's values, which fade away at a known rate
+    filtered = lfilter([alpha], [1, -decay], filled)
+    
+    carried = np.where(
+        path_start > 0,
+        filtered[np.maximum(path_start - 1, 0)],
+        0
+    )
+    
+    # Swap what was carried over from the previous path for the path's own
+    # first value
+    fade = decay ** (from_start + 1)
+    smoothed = filtered + fade * (filled[path_start] - carried)
+    smoothed[~is_valid] = np.nan
+    
+    return smoothed
+
+def add_kinematics(tracking, smoothing = None, window = 7, polyorder = 2,
+                   alpha = 0.5):
+    """
+    Recomputes each player's (and the ball's) velocity, speed, acceleration,
+    and jerk from their positions, rather than using the noisier values in
+    the raw data. Every path in the tracking data is handled at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data. May contain any number of plays
+    smoothing: a string of how to smooth the positions before computing the
+        kinematics. Either None (no smoothing), 'savgol' (Savitzky-Golay), or
+        'ewma' (exponentially weighted moving average)
+    window, polyorder: the window length and polynomial order used when
+        smoothing is 'savgol'. See savgol_smooth()
+    alpha: the weight used when smoothing is 'ewma'. See ewma_smooth()
+    
+    Returns
+    -------
+    tracking: a copy of the tracking data sorted with
+        frame_ops.sort_tracking(by = 'player'), with float32 columns added
+        for the recomputed velocity (kin_vx, kin_vy), speed (kin_speed),
+        acceleration (kin_ax, kin_ay, kin_acceleration), jerk (kin_jerk), and
+        distance travelled since the previous frame (kin_distance). Speeds
+        are in yards per second, and so on
+    """
+    tracking = frame_ops.sort_tracking(tracking, by = 'player')
+    
+    starts, stops = segment_bounds(tracking)
+    from_start, to_end = segment_positions(starts, stops)
+    
+    times = tracking['frame_id'].values * SECONDS_PER_FRAME
+    x = tracking['player_x'].values.astype(float)
+    y = tracking['player_y'].values.astype(float)
+    
+    # Smooth the positions, if asked to
+    if smoothing == 'savgol':
+        x = savgol_smooth(x, from_start, to_end, window, polyorder)
+        y = savgol_smooth(y, from_start, to_end, window, polyorder)
+    elif smoothing == 'ewma':
+        x = ewma_smooth(x, from_start, alpha)
+        y = ewma_smooth(y, from_start, alpha)
+    
+    # Differentiate the positions to get the velocity, then the velocity to
+    # get the acceleration, then the acceleration to get the jerk
+    vx = segment_derivative(x, times, from_start, to_end)
+    vy = segment_derivative(y, times, from_start, to_end)
+    
+    ax = segment_derivative(vx, times, from_start, to_end)
+    ay = segment_derivative(vy, times, from_start, to_end)
+    
+    jx = segment_derivative(ax, times, from_start, to_end)
+    jy = segment_derivative(ay, times, from_start, to_end)
+    
+    # The distance travelled since the previous frame. The first frame of
+    # each path hasn't travelled anywhere yet
+    step = np.hypot(np.diff(x, prepend = np.nan), np.diff(y, prepend = np.nan))
+    step[from_start == 0] = 0
+    
+    kinematics = {
+        'kin_vx': vx,
+        'kin_vy': vy,
+        'kin_speed': np.hypot(vx, vy),
+        'kin_ax': ax,
+        'kin_ay': ay,
+        'kin_acceleration': np.hypot(ax, ay),
+        'kin_jerk': np.hypot(jx, jy),
+        'kin_distance': step
+    }
+    
+    for col, values in kinematics.items():
+        tracking[col] = values.astype('float32')
+    
+    return tracking
+
+def week_kinematics(week, prechecked_week = False, smoothing = None,
+                    window = 7, polyorder = 2, alpha = 0.5):
+    """
+    Recomputes the kinematics for every path in a week of tracking data
+    
+    Parameters
+    ----------
+    week: an integer of the week to compute
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    smoothing, window, polyorder, alpha: see add_kinematics()
+    
+    Returns
+    -------
+    tracking: the week's tracking data with the kinematics added. See
+        add_kinematics()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    tracking = load.tracking_data(week = week, prechecked_week = True)
+    
+    return add_kinematics(tracking, smoothing, window, polyorder, alpha)
+
+if __name__ == '__main__':
+    tracking = week_kinematics(1, smoothing = 'savgol')
+    
+    # A missing value in one path shouldn't reach the next path
+    values = np.arange(10, dtype = float)
+    values[2] = np.nan
+    from_start, to_end = segment_positions(np.array([0, 5]), np.array([5, 10]))
+    smoothed = ewma_smooth(values, from_start)
+    assert np.isnan(smoothed[2]) and not np.isnan(smoothed[5:]).any()
@@ -472,6 +472,73 @@ def plays_matching(gid = 0, home = '', away = '', play_info = {},
     # Return all plays that match the criteria
     return plays_from_game
 
+def similar_plays(gid, pid, k = 10, prechecked_gid = False,
+                  prechecked_pid = False):
+    """
+    Finds the plays whose routes and coverage shapes are most like a given
+    play's, using the index built by play_similarity.build_index()
+    
+    Parameters
+    ----------
+    gid: an integer of a game_id
+    pid: an integer of a play_id
+    k: an integer of the number of plays to find
+    prechecked_gid: a boolean of whether or not the game ID has been checked
+        before being passed to the function
+    prechecked_pid: a boolean of whether or not the play ID has been checked
+         before being passed to the function
+    
+    Returns
+    -------
+    similar: a data frame of the game_id, play_id, and distance of the k
+        most similar plays, most similar first
+    """
+    # Import here, since play_similarity imports this file via data_loaders
+    import bdb_helpers.play_similarity as similarity
+    
+    if not prechecked_gid:
+        gid = check.game_id(gid)
+    
+    if not prechecked_pid:
+        pid = check.play_id(gid, pid, True)
+    
+    similar = similarity.nearest_plays(gid, pid, k)
+    
+    return similar
+
+def ball_flight(gid, pid, prechecked_gid = False, prechecked_pid = False):
+    """
+    Gets where and when the ball was thrown and arrived on a play, from the
+    table built by ball_flight.week_ball_flights(), so that the play's
+    tracking data doesn't need to be loaded
+    
+    Parameters
+    ----------
+    gid: an integer of a game_id
+    pid: an integer of a play_id
+    prechecked_gid: a boolean of whether or not the game ID has been checked
+        before being passed to the function
+    prechecked_pid: a boolean of whether or not the play ID has been checked
+         before being passed to the function
+    
+    Returns
+    -------
+    flight: a data frame with one row of the play's throw_frame,
+        arrival_frame, air_time, throw and arrival coordinates,
+        throw_distance, throw_velocity, max_ball_speed, and air_yards. Empty
+        if the ball wasn't thrown, or never arrived
+    """
+    # Import here, since ball_flight imports this file
+    import bdb_helpers.ball_flight as flight
+    
+    if not prechecked_gid:
+        gid = check.game_id(gid)
+    
+    if not prechecked_pid:
+        pid = check.play_id(gid, pid, True)
+    
+    return flight.play_flight(gid, pid)
+
 if __name__ == '__main__':
     gid = game_id('CHI', 'GB')
     home_team, away_team = game_teams(gid)
@@ -0,0 +1,254 @@
+"""
+@author: Ross Drucker
+"""
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import bdb_filepaths as fp
+import bdb_helpers.coord_ops as coord_ops
+import bdb_helpers.resampling as resample
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.input_checkers as check
+
+# The features stored for every player (and the ball) at every step
+FEATURES = [
+    'player_x', 'player_y', 'player_speed', 'player_acceleration',
+    'player_orientation', 'player_direction'
+]
+
+# The labels stored for every play. The pass result is stored as its
+# position in PASS_RESULTS, or -1 if it is missing
+LABELS = ['epa', 'pass_result', 'play_result']
+PASS_RESULTS = ['COMPLETE', 'INCOMPLETE', 'INTERCEPTION', 'SACK', 'SCRAMBLE']
+
+# Each side of the ball gets 11 slots, and the ball goes in the last slot
+SIDE_SLOTS = 11
+
+def export_paths(week, export_dir = ''):
+    """
+    Gets the paths of the files a week is exported to
+    
+    Parameters
+    ----------
+    week: an integer of the week
+    export_dir: a string of the directory to export to. Default is
+        fp.export_dir
+    
+    Returns
+    -------
+    paths: a dictionary of the path to the week's features, labels, plays,
+        and done marker files
+    """
+    if export_dir == '':
+        export_dir = fp.export_dir
+    
+    paths = {
+        'features': os.path.join(export_dir, f'week{week}_features.npy'),
+        'labels': os.path.join(export_dir, f'week{week}_labels.npy'),
+        'plays': os.path.join(export_dir, f'week{week}_plays.csv'),
+        'done': os.path.join(export_dir, f'week{week}.done')
+    }
+    
+    return paths
+
+def play_labels(tracking, plays):
+    """
+    Gets the labels of each play, in the same order as the exported plays
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data
+    plays: a data frame of the game_id and play_id of each exported play
+    
+    Returns
+    -------
+    labels: a float32 array of shape (play, label) of each play's labels.
+        See LABELS
+    """
+    play_info = pd.merge(
+        left = plays,
+        right = tracking.drop_duplicates(['game_id', 'play_id'])[
+            ['game_id', 'play_id', 'epa', 'pass_result', 'play_result']
+        ],
+        how = 'left',
+        on = ['game_id', 'play_id']
+    )
+    
+    # Store the pass result as a number
+    pass_result = np.full(len(play_info), -1)
+    for i, result in enumerate(PASS_RESULTS):
+        pass_result[play_info['pass_result'].values == result] = i
+    
+    labels = np.column_stack([
+        play_info['epa'].values.astype(float),
+        pass_result,
+        play_info['play_result'].values.astype(float)
+    ]).astype('float32')
+    
+    return labels
+
+def write_array(array, fpath):
+    """
+    Writes an array to a .npy file that can be opened as a memory map. The
+    file is written somewhere temporary first, then moved into place so that
+    anything reading it never sees a partial file
+    
+    Parameters
+    ----------
+    array: an array to write
+    fpath: a string of the path to write the array to
+    
+    Returns
+    -------
+    None.
+    """
+    partial_fname = f'{fpath}.partial'
+    
+    out = np.lib.format.open_memmap(
+        partial_fname,
+        mode = 'w+',
+        dtype = array.dtype,
+        shape = array.shape
+    )
+    out[:] = array
+    out.flush()
+    del out
+    
+    os.replace(partial_fname, fpath)
+    
+    return None
+
+def export_week(week, prechecked_week = False, n_steps = 50, hz = 10,
+                pre_snap = 1, export_dir = '', overwrite = False):
+    """
+    Exports a week of plays as fixed-shape arrays of features and labels. Each
+    play is lined up on the snap, flipped to move to the right, and
+    resampled to n_steps steps, with the offense in the first 11 player slots,
+    the defense in the next 11, and the ball in the last. Within each side,
+    players are ordered by position (see resampling.POSITION_ORDER)
+    
+    Parameters
+    ----------
+    week: an integer of the week to export
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    n_steps: an integer of the number of steps to keep from each play
+    hz: a float of the number of steps per second
+    pre_snap: a float of the number of seconds before the snap to start at
+    export_dir: a string of the directory to export to. Default is
+        fp.export_dir
+    overwrite: a boolean of whether or not to export the week again if it
+        has already been exported
+    
+    Returns
+    -------
+    paths: a dictionary of the paths of the exported files. See
+        export_paths()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    paths = export_paths(week, export_dir)
+    
+    # The done marker is only written once every file is in place, so a week
+    # with a marker never needs to be redone
+    if os.path.exists(paths['done']) and not overwrite:
+        return paths
+    
+    os.makedirs(os.path.dirname(paths['done']), exist_ok = True)
+    
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    tracking = coord_ops.standardize_direction(tracking)
+    
+    plays, times, player_ids, features = resample.resample_plays(
+        tracking,
+        FEATURES,
+        n_steps = n_steps,
+        hz = hz,
+        pre_snap = pre_snap,
+        side_slots = SIDE_SLOTS
+    )
+    
+    write_array(features, paths['features'])
+    write_array(play_labels(tracking, plays), paths['labels'])
+    plays.to_csv(paths['plays'], index = False)
+    
+    with open(paths['done'], 'w') as done:
+        done.write(f'{len(plays)}\n')
+    
+    return paths
+
+def export_weeks(weeks = range(1, 18), n_steps = 50, hz = 10, pre_snap = 1,
+                 export_dir = '', overwrite = False, max_workers = None):
+    """
+    Exports many weeks at once, one week per process. Weeks that have already
+    been exported are skipped, so an interrupted export can be picked back up
+    by running it again
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to export. Default is every week
+    n_steps, hz, pre_snap, export_dir, overwrite: see export_week()
+    max_workers: an integer of the most weeks to export at once. Default is
+        the number of processors
+    
+    Returns
+    -------
+    paths: a dictionary of each week to the paths of its exported files
+    """
+    weeks = [check.week_number(week) for week in weeks]
+    
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        jobs = {
+            week: pool.submit(
+                export_week,
+                week,
+                True,
+                n_steps,
+                hz,
+                pre_snap,
+                export_dir,
+                overwrite
+            )
+            for week in weeks
+        }
+        
+        paths = {week: job.result() for week, job in jobs.items()}
+    
+    return paths
+
+def open_week(week, export_dir = ''):
+    """
+    Opens an exported week's arrays as memory maps, so that they are read
+    from disk as they are used rather than all at once
+    
+    Parameters
+    ----------
+    week: an integer of the week to open
+    export_dir: a string of the directory the week was exported to. Default
+        is fp.export_dir
+    
+    Returns
+    -------
+    plays: a data frame of the game_id and play_id of each play
+    features: a read-only float32 memory map of shape
+        (play, step, player, feature). See FEATURES
+    labels: a read-only float32 memory map of shape (play, label). See
+        LABELS
+    """
+    paths = export_paths(week, export_dir)
+    
+    plays = pd.read_csv(paths['plays'])
+    features = np.load(paths['features'], mmap_mode = 'r')
+    labels = np.load(paths['labels'], mmap_mode = 'r')
+    
+    return plays, features, labels
+
+if __name__ == '__main__':
+    export_weeks()
+    plays, features, labels = open_week(1)
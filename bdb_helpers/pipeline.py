@@ -0,0 +1,636 @@
+"""
+@author: Ross Drucker
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import bdb_filepaths as fp
+import bdb_helpers.kinematics as kin
+import bdb_helpers.coord_ops as coord_ops
+import bdb_helpers.ball_flight as flight
+import bdb_helpers.defense_cube as cube
+import bdb_helpers.formation_snapshot as formation
+import bdb_helpers.receiver_metrics as rec
+import bdb_helpers.coverage_features as cov
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.file_movers as file_ops
+import bdb_helpers.input_checkers as check
+
+# Every stage's outputs are saved in this subdirectory of the cache directory
+PIPELINE_DIR = 'pipeline'
+
+# The stages that can be run, keyed by name. See add_stage()
+STAGES = {}
+
+# The hash of each raw data file is saved in this subdirectory of
+# PIPELINE_DIR, along with the file's size and modification time, so that
+# files are only read again when they change, even across sessions and
+# worker processes
+SOURCE_HASH_DIR = 'source_hashes'
+
+# Hashes of source files, keyed by path, size, and modification time
+_source_hashes = {}
+
+def add_stage(name, function, inputs = [], sources = [], version = 1):
+    """
+    Adds a stage to the pipeline. A stage makes one table per week, from the
+    tables its input stages made for the same week and from the raw data
+    files it reads
+    
+    Parameters
+    ----------
+    name: a string of the stage's name
+    function: a function of (week, inputs) that returns the stage's table for
+        the week, where inputs is a dictionary of each input stage's name to
+        its table for the week
+    inputs: a list of the names of the stages whose tables this stage uses
+    sources: a list of the raw data files this stage reads. Each is one of
+        'tracking' (the week's tracking file), 'games', 'plays', 'players',
+        or 'teams'
+    version: an integer to bump when the stage's function changes, so that
+        its tables are made again
+    
+    Returns
+    -------
+    None.
+    """
+    STAGES[name] = {
+        'name': name,
+        'function': function,
+        'inputs': inputs,
+        'sources': sources,
+        'version': version
+    }
+    
+    return None
+
+def source_path(source, week):
+    """
+    Gets the path of a raw data file
+    
+    Parameters
+    ----------
+    source: a string of the file. See add_stage()
+    week: an integer of the week, used for the tracking file
+    
+    Returns
+    -------
+    path: a string of the path to the file
+    """
+    paths = {
+        'games': fp.games_data_file,
+        'plays': fp.plays_data_file,
+        'players': fp.players_data_file,
+        'teams': fp.teams_data_file
+    }
+    
+    if source == 'tracking':
+        return os.path.join(fp.data_dir, f'week{week}.csv')
+    
+    return paths[source]
+
+def source_hash(path):
+    """
+    Hashes the contents of a raw data file. A file is only read again if its
+    size or modification time has changed since it was last hashed, by this
+    or any earlier session
+    
+    Parameters
+    ----------
+    path: a string of the path to the file
+    
+    Returns
+    -------
+    digest: a string of the hash of the file's contents, or '' if the file
+        doesn't exist
+    """
+    if not os.path.exists(path):
+        return ''
+    
+    path = os.path.abspath(path)
+    info = os.stat(path)
+    key = (path, info.st_size, info.st_mtime_ns)
+    
+    if key not in _source_hashes:
+        record_path = os.path.join(
+            fp.cache_dir,
+            PIPELINE_DIR,
+            SOURCE_HASH_DIR,
+            f'{os.path.basename(path)}.json'
+        )
+        
+        # Use the saved hash if the file hasn't changed since it was saved
+        try:
+            with open(record_path) as f:
+                record = json.load(f)
+        
+        except (FileNotFoundError, ValueError):
+            record = {}
+        
+        if record.get('key') == list(key):
+            digest = record['hash']
+        
+        else:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            
+            digest = digest.hexdigest()
+            write_json(record_path, {'key': list(key), 'hash': digest})
+        
+        _source_hashes[key] = digest
+    
+    return _source_hashes[key]
+
+def table_hash(table):
+    """
+    Hashes the contents of a table, so that a table made again with the same
+    contents gets the same hash
+    
+    Parameters
+    ----------
+    table: a data frame
+    
+    Returns
+    -------
+    digest: a string of the hash of the table's columns, types, and values
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([
+        [str(col) for col in table.columns],
+        [str(dtype) for dtype in table.dtypes]
+    ]).encode())
+    digest.update(
+        pd.util.hash_pandas_object(table, index = False).values.tobytes()
+    )
+    
+    return digest.hexdigest()
+
+def output_paths(name, week):
+    """
+    Gets where a stage's table for a week, and the record of how it was made,
+    are saved
+    
+    Parameters
+    ----------
+    name: a string of the stage's name
+    week: an integer of the week
+    
+    Returns
+    -------
+    table_fname: a string of the table's file name within the cache
+        directory
+    manifest_path: a string of the full path to the table's manifest
+    """
+    table_fname = os.path.join(PIPELINE_DIR, name, f'week{week}.parquet')
+    manifest_path = os.path.join(
+        fp.cache_dir,
+        PIPELINE_DIR,
+        name,
+        f'week{week}.json'
+    )
+    
+    return table_fname, manifest_path
+
+def read_manifest(name, week):
+    """
+    Reads the record of how a stage's table for a week was last made
+    
+    Parameters
+    ----------
+    name: a string of the stage's name
+    week: an integer of the week
+    
+    Returns
+    -------
+    manifest: a dictionary of the key the table was made with and the hash
+        of the table. Empty if the table hasn't been made
+    """
+    table_fname, manifest_path = output_paths(name, week)
+    
+    if not os.path.exists(os.path.join(fp.cache_dir, table_fname)):
+        return {}
+    
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    
+    return manifest
+
+def write_json(path, contents):
+    """
+    Saves a dictionary as a JSON file. The file is written somewhere
+    temporary first, then moved into place, so that anything reading it
+    never sees a partial file
+    
+    Parameters
+    ----------
+    path: a string of the full path to save the file to
+    contents: a dictionary to save
+    
+    Returns
+    -------
+    None.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    
+    partial_fd, partial_fname = tempfile.mkstemp(
+        suffix = '.json',
+        dir = os.path.dirname(path)
+    )
+    
+    with os.fdopen(partial_fd, 'w') as f:
+        json.dump(contents, f)
+    
+    os.replace(partial_fname, path)
+    
+    return None
+
+def write_manifest(name, week, manifest):
+    """
+    Saves the record of how a stage's table for a week was made
+    
+    Parameters
+    ----------
+    name: a string of the stage's name
+    week: an integer of the week
+    manifest: a dictionary of the key and hash to save
+    
+    Returns
+    -------
+    None.
+    """
+    write_json(output_paths(name, week)[1], manifest)
+    
+    return None
+
+def stage_key(stage, week, input_hashes):
+    """
+    Makes the key that a stage's table for a week depends on. The table only
+    needs to be made again when this changes
+    
+    Parameters
+    ----------
+    stage: a dictionary of the stage. See add_stage()
+    week: an integer of the week
+    input_hashes: a dictionary of each input stage's name to the hash of its
+        table for the week
+    
+    Returns
+    -------
+    key: a string of the hash of the stage's version, the week, and the
+        hashes of everything it reads
+    """
+    key = hashlib.sha256(json.dumps({
+        'stage': stage['name'],
+        'version': stage['version'],
+        'week': week,
+        'sources': {
+            source: source_hash(source_path(source, week))
+            for source in stage['sources']
+        },
+        'inputs': {name: input_hashes[name] for name in stage['inputs']}
+    }, sort_keys = True).encode()).hexdigest()
+    
+    return key
+
+def stage_order(targets = []):
+    """
+    Puts stages in an order where every stage comes after its inputs
+    
+    Parameters
+    ----------
+    targets: a list of the names of the stages to run. Their inputs, and
+        their inputs' inputs, are included. Default is every stage
+    
+    Returns
+    -------
+    order: a list of the names of the stages, in the order to run them
+    """
+    if len(targets) == 0:
+        targets = list(STAGES)
+    
+    order = []
+    
+    def visit(name):
+        if name in order:
+            return None
+        
+        for input_name in STAGES[name]['inputs']:
+            visit(input_name)
+        
+        order.append(name)
+        
+        return None
+    
+    for name in targets:
+        visit(name)
+    
+    return order
+
+def run_week(stages, week, force = False):
+    """
+    Runs the stages for one week, skipping each stage whose inputs have the
+    same contents as when its table was last made
+    
+    Parameters
+    ----------
+    stages: a list of the stages to run, in order, where each stage's inputs
+        come before it. See add_stage()
+    week: an integer of the week
+    force: a boolean of whether or not to make every table again
+    
+    Returns
+    -------
+    results: a list of dictionaries of the stage, week, whether it ran, and
+        how long it took in seconds
+    """
+    hashes = {}
+    tables = {}
+    results = []
+    
+    for stage in stages:
+        start = time.time()
+        name = stage['name']
+        table_fname = output_paths(name, week)[0]
+        
+        key = stage_key(stage, week, hashes)
+        manifest = read_manifest(name, week)
+        
+        if not force and manifest.get('key') == key:
+            hashes[name] = manifest['hash']
+            ran = False
+        
+        else:
+            # Tables made earlier in this run are kept in memory, and the
+            # rest are read back from the cache
+            inputs = {}
+            for input_name in stage['inputs']:
+                if input_name not in tables:
+                    tables[input_name] = load.cached_table(
+                        output_paths(input_name, week)[0]
+                    )
+                inputs[input_name] = tables[input_name]
+            
+            table = stage['function'](week, inputs)
+            
+            os.makedirs(
+                os.path.join(fp.cache_dir, PIPELINE_DIR, name),
+                exist_ok = True
+            )
+            file_ops.write_cache_table(table, table_fname)
+            
+            # Downstream stages key off the table's contents, so if a stage
+            # makes the same table again, they don't need to run
+            hashes[name] = table_hash(table)
+            tables[name] = table
+            write_manifest(name, week, {'key': key, 'hash': hashes[name]})
+            ran = True
+        
+        results.append({
+            'stage': name,
+            'week': week,
+            'ran': ran,
+            'seconds': time.time() - start
+        })
+    
+    return results
+
+def run(targets = [], weeks = range(1, 18), force = False,
+        max_workers = None):
+    """
+    Brings the tables of the target stages up to date for every week. Only
+    the stages downstream of a raw data file or stage whose contents have
+    changed are run again, and each week is run in its own process
+    
+    Parameters
+    ----------
+    targets: a list of the names of the stages to bring up to date. Their
+        inputs are brought up to date too. Default is every stage
+    weeks: a list of the weeks to run. Default is every week
+    force: a boolean of whether or not to make every table again
+    max_workers: an integer of the most weeks to run at once. Default is the
+        number of processors
+    
+    Returns
+    -------
+    results: a data frame with one row per stage per week of the stage,
+        week, whether it ran, and how long it took in seconds
+    """
+    # Weeks go into the JSON stage keys, so they must be plain integers
+    weeks = [int(check.week_number(week)) for week in weeks]
+    stages = [STAGES[name] for name in stage_order(targets)]
+    
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        jobs = [
+            pool.submit(run_week, stages, week, force) for week in weeks
+        ]
+        
+        results = pd.DataFrame(
+            [result for job in jobs for result in job.result()],
+            columns = ['stage', 'week', 'ran', 'seconds']
+        )
+    
+    return results
+
+def stale(targets = [], weeks = range(1, 18)):
+    """
+    Finds which tables would be made again by run(), without running
+    anything. A stage is stale if its version, the raw data it reads, or the
+    tables of its inputs have changed since its table was made, or if any
+    of its inputs are stale
+    
+    Parameters
+    ----------
+    targets: a list of the names of the stages to check. See run()
+    weeks: a list of the weeks to check. Default is every week
+    
+    Returns
+    -------
+    stale: a data frame with one row per stage per week of the stage, week,
+        and whether it is stale
+    """
+    rows = []
+    for week in weeks:
+        week = int(week)
+        hashes = {}
+        stale_stages = set()
+        
+        for name in stage_order(targets):
+            stage = STAGES[name]
+            manifest = read_manifest(name, week)
+            
+            is_stale = (
+                any(input_name in stale_stages
+                    for input_name in stage['inputs']) or
+                manifest.get('key') != stage_key(stage, week, hashes)
+            )
+            
+            if is_stale:
+                stale_stages.add(name)
+            else:
+                hashes[name] = manifest['hash']
+            
+            rows.append({'stage': name, 'week': week, 'stale': is_stale})
+    
+    return pd.DataFrame(rows, columns = ['stage', 'week', 'stale'])
+
+def merged_tracking(week, inputs):
+    """
+    Stage: the week's tracking data merged with the plays data, with each
+    row's time and position relative to the snap. See
+    coord_ops.snap_relative()
+    
+    Parameters
+    ----------
+    week, inputs: see add_stage()
+    
+    Returns
+    -------
+    tracking: a dataframe of merged tracking and plays data
+    """
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    return coord_ops.snap_relative(tracking)
+
+def kinematics(week, inputs):
+    """
+    Stage: each player's velocity, acceleration, and jerk in every frame. See
+    kin.add_kinematics()
+    
+    Parameters
+    ----------
+    week, inputs: see add_stage()
+    
+    Returns
+    -------
+    kinematics: a data frame of the game_id, play_id, frame_id, team,
+        player_id, and kinematics columns of every row
+    """
+    tracking = kin.add_kinematics(inputs['merged_tracking'])
+    
+    return tracking[
+        ['game_id', 'play_id', 'frame_id', 'team', 'player_id'] +
+        [col for col in tracking.columns if col.startswith('kin_')]
+    ]
+
+def receiver_separation(week, inputs):
+    """
+    Stage: how open each receiver was. See rec.receiver_separation()
+    
+    Parameters
+    ----------
+    week, inputs: see add_stage()
+    
+    Returns
+    -------
+    separation: a data frame of the results
+    """
+    return rec.receiver_separation(inputs['merged_tracking'])
+
+def ball_flights(week, inputs):
+    """
+    Stage: the ball's flight on each pass play. See flight.ball_flights()
+    
+    Parameters
+    ----------
+    week, inputs: see add_stage()
+    
+    Returns
+    -------
+    flights: a data frame of the results
+    """
+    return flight.ball_flights(inputs['merged_tracking'])
+
+def coverage_features(week, inputs):
+    """
+    Stage: each defender's man and zone coverage features. See
+    cov.coverage_features()
+    
+    Parameters
+    ----------
+    week, inputs: see add_stage()
+    
+    Returns
+    -------
+    features: a data frame of the results
+    """
+    return cov.coverage_features(inputs['merged_tracking'])
+
+def defense_cube(week, inputs):
+    """
+    Stage: the week's cells of the defensive cube. See cube.week_cells()
+    
+    Parameters
+    ----------
+    week, inputs: see add_stage()
+    
+    Returns
+    -------
+    cells: a data frame of the results
+    """
+    return cube.week_cells(
+        inputs['merged_tracking'],
+        week,
+        separation = inputs['receiver_separation']
+    )
+
+def formation_snapshots(week, inputs):
+    """
+    Stage: where every player lined up at the snap of each play. See
+    formation.snapshots()
+    
+    Parameters
+    ----------
+    week, inputs: see add_stage()
+    
+    Returns
+    -------
+    snaps: a data frame of the results
+    """
+    return formation.snapshots(inputs['merged_tracking'])
+
+add_stage(
+    'merged_tracking',
+    merged_tracking,
+    sources = ['tracking', 'plays', 'games'],
+    version = 2
+)
+add_stage('kinematics', kinematics, inputs = ['merged_tracking'])
+add_stage(
+    'receiver_separation',
+    receiver_separation,
+    inputs = ['merged_tracking']
+)
+add_stage('ball_flights', ball_flights, inputs = ['merged_tracking'])
+add_stage(
+    'coverage_features',
+    coverage_features,
+    inputs = ['merged_tracking']
+)
+add_stage(
+    'defense_cube',
+    defense_cube,
+    inputs = ['merged_tracking', 'receiver_separation']
+)
+add_stage(
+    'formation_snapshots',
+    formation_snapshots,
+    inputs = ['merged_tracking']
+)
+
+if __name__ == '__main__':
+    results = run()
+    up_to_date = stale()
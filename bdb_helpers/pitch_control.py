@@ -0,0 +1,320 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+import pandas as pd
+
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.distances as dist
+import bdb_helpers.data_mergers as merge
+
+# The size of the field of play in yards, matching the field drawn from
+# load.football_field_coords()
+FIELD_LENGTH = 120
+FIELD_WIDTH = 160 / 3
+
+# Parameters of each player's area of influence. A player's influence reaches
+# further the further they are from the ball (between MIN_RADIUS and
+# MAX_RADIUS yards, reaching MAX_RADIUS once RADIUS_DISTANCE yards from the
+# ball), and is stretched out in the direction they're running the closer
+# they are to MAX_SPEED (in yards per second)
+MIN_RADIUS = 4
+MAX_RADIUS = 10
+RADIUS_DISTANCE = 18
+MAX_SPEED = 13
+
+def field_grid(resolution = 1):
+    """
+    Makes the grid of points on the field where control is measured
+    
+    Parameters
+    ----------
+    resolution: a float of the size of each grid cell in yards
+    
+    Returns
+    -------
+    grid_x: an array of the x coordinate of the center of each column of
+        cells
+    grid_y: an array of the y coordinate of the center of each row of cells
+    """
+    grid_x = np.arange(resolution / 2, FIELD_LENGTH, resolution)
+    grid_y = np.arange(resolution / 2, FIELD_WIDTH, resolution)
+    
+    return grid_x.astype('float32'), grid_y.astype('float32')
+
+def influence_params(xy, speed, direction, ball_xy):
+    """
+    Finds the center and shape of each player's area of influence. Each area
+    is a normal distribution centered half a second ahead of where the player
+    is, stretched along the direction they're running
+    
+    Parameters
+    ----------
+    xy: an array of shape (frame, player, 2) of each player's coordinates
+    speed: an array of shape (frame, player) of each player's speed
+    direction: an array of shape (frame, player) of the direction each player
+        is running, in radians
+    ball_xy: an array of shape (frame, 2) of the ball's coordinates
+    
+    Returns
+    -------
+    center: an array of shape (frame, player, 2) of the center of each
+        player's area of influence
+    inv_cov: a tuple of the a, b, and c entries of the inverse covariance
+        matrix [[a, b], [b, c]] of each player's area of influence, each an
+        array of shape (frame, player)
+    """
+    cos_dir = np.cos(direction)
+    sin_dir = np.sin(direction)
+    
+    center = xy + 0.5 * speed[:, :, None] * np.stack([cos_dir, sin_dir], -1)
+    
+    # The radius grows with the distance from the ball. Frames without the
+    # ball use the largest radius
+    ball_dist = np.hypot(
+        xy[:, :, 0] - ball_xy[:, None, 0],
+        xy[:, :, 1] - ball_xy[:, None, 1]
+    )
+    radius = MIN_RADIUS + (
+        (MAX_RADIUS - MIN_RADIUS) *
+        (ball_dist / RADIUS_DISTANCE) ** 3
+    )
+    radius = np.where(
+        np.isnan(radius),
+        MAX_RADIUS,
+        np.minimum(radius, MAX_RADIUS)
+    )
+    
+    # Stretch the area along the direction of travel, and squeeze it across
+    speed_ratio = np.minimum((speed / MAX_SPEED) ** 2, 0.99)
+    along = radius * (1 + speed_ratio) / 2
+    across = radius * (1 - speed_ratio) / 2
+    
+    # Rotate the scaling into field coordinates, then invert it
+    inv_along = 1 / along ** 2
+    inv_across = 1 / across ** 2
+    
+    a = inv_along * cos_dir ** 2 + inv_across * sin_dir ** 2
+    b = (inv_along - inv_across) * cos_dir * sin_dir
+    c = inv_along * sin_dir ** 2 + inv_across * cos_dir ** 2
+    
+    return center, (a, b, c)
+
+def team_influence(center, inv_cov, points):
+    """
+    Adds up a team's influence over each point on the field
+    
+    Parameters
+    ----------
+    center: an array of shape (frame, player, 2) from influence_params()
+    inv_cov: a tuple of arrays from influence_params()
+    points: an array of shape (point, 2) of the points to measure influence
+        over
+    
+    Returns
+    -------
+    influence: an array of shape (frame, point) of the team's total
+        influence over each point
+    """
+    a, b, c = inv_cov
+    
+    dx = points[None, None, :, 0] - center[:, :, None, 0]
+    dy = points[None, None, :, 1] - center[:, :, None, 1]
+    
+    # Each player's influence is scaled to be 1 at the center of their area.
+    # Empty player slots are NaN and add nothing
+    influence = np.exp(-0.5 * (
+        a[:, :, None] * dx ** 2 +
+        2 * b[:, :, None] * dx * dy +
+        c[:, :, None] * dy ** 2
+    ))
+    influence = np.nansum(influence, axis = 1)
+    
+    return influence
+
+def control_surface(tracking, resolution = 1, chunk_size = 50):
+    """
+    Measures how much of the field the offense controls in every frame of the
+    tracking data. Every grid cell, player, and frame in a chunk of frames is
+    computed at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    resolution: a float of the size of each grid cell in yards
+    chunk_size: an integer of the number of frames to compute at once. Each
+        chunk takes about chunk_size * 22 * (number of grid cells) * 4 bytes
+    
+    Returns
+    -------
+    frames: a data frame of the game_id, play_id, and frame_id of each frame
+    grid_x, grid_y: arrays of the coordinates of the grid, from field_grid()
+    control: a float32 array of shape (frame, y, x) of the share of control
+        the offense has over each grid cell, between 0 and 1
+    """
+    tracking = frame_ops.sort_tracking(tracking)
+    
+    starts, stops = frame_ops.group_bounds(
+        tracking['game_id'].values,
+        tracking['play_id'].values,
+        tracking['frame_id'].values
+    )
+    
+    frames = tracking.loc[
+        starts,
+        ['game_id', 'play_id', 'frame_id']
+    ].reset_index(drop = True)
+    
+    # Lay each side's players and the ball out into arrays by frame
+    cols = ['player_x', 'player_y', 'player_speed', 'player_direction']
+    
+    offense, _ = dist.frame_slots(
+        tracking,
+        frame_ops.offense_mask(tracking),
+        starts,
+        stops,
+        cols
+    )
+    defense, _ = dist.frame_slots(
+        tracking,
+        frame_ops.defense_mask(tracking),
+        starts,
+        stops,
+        cols
+    )
+    ball, _ = dist.frame_slots(
+        tracking,
+        tracking['team'].values == 'football',
+        starts,
+        stops
+    )
+    
+    if ball.shape[1] == 0:
+        ball_xy = np.full((len(frames), 2), np.nan, dtype = 'float32')
+    else:
+        ball_xy = ball[:, 0, :]
+    
+    grid_x, grid_y = field_grid(resolution)
+    points = np.stack(np.meshgrid(grid_x, grid_y), -1).reshape(-1, 2)
+    
+    control = np.empty(
+        (len(frames), len(grid_y), len(grid_x)),
+        dtype = 'float32'
+    )
+    
+    for chunk_start in range(0, len(frames), chunk_size):
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        
+        influence = []
+        for side in [offense, defense]:
+            center, inv_cov = influence_params(
+                side[chunk, :, :2],
+                side[chunk, :, 2],
+                side[chunk, :, 3],
+                ball_xy[chunk]
+            )
+            influence.append(team_influence(center, inv_cov, points))
+        
+        # Control is the offense's share of the total influence, squashed to
+        # be between 0 and 1
+        control[chunk] = (
+            1 / (1 + np.exp(influence[1] - influence[0]))
+        ).reshape(-1, len(grid_y), len(grid_x))
+    
+    return frames, grid_x, grid_y, control
+
+def play_control(gid, pid, resolution = 1, tracking = pd.DataFrame()):
+    """
+    Measures how much of the field the offense controls in every frame of a
+    play
+    
+    Parameters
+    ----------
+    gid: an integer of a game_id
+    pid: an integer of a play_id
+    resolution: a float of the size of each grid cell in yards
+    tracking: a dataframe of merged tracking and plays data for the play. If
+        not provided, it will be loaded
+    
+    Returns
+    -------
+    frames, grid_x, grid_y, control: see control_surface()
+    """
+    if tracking.empty:
+        tracking = merge.tracking_and_plays(gid, pid)
+    
+    return control_surface(tracking, resolution)
+
+def control_overlay(frames, grid_x, grid_y, control, cmap = 'coolwarm',
+                    alpha = 0.5):
+    """
+    Makes a function that draws a frame's control surface underneath the
+    players, to pass as the overlay argument of plot_helpers.play_frame() or
+    plot_helpers.play_gif()
+    
+    Parameters
+    ----------
+    frames, grid_x, grid_y, control: the outputs of control_surface() or
+        play_control()
+    cmap: a string of the name of the matplotlib colormap to use. Areas
+        controlled by the offense get the high end of the colormap
+    alpha: a float of how opaque to draw the surface
+    
+    Returns
+    -------
+    overlay: a function of (ax, context, frame_no, scale) that draws the
+        surface of the context's play at the frame
+    """
+    # Find where each frame's surface is
+    frame_rows = {
+        (gid, pid, frame): row
+        for row, (gid, pid, frame) in enumerate(frames.itertuples(
+            index = False
+        ))
+    }
+    
+    # Cells are drawn centered on their grid points
+    half_x = (grid_x[1] - grid_x[0]) / 2 if len(grid_x) > 1 else 0.5
+    half_y = (grid_y[1] - grid_y[0]) / 2 if len(grid_y) > 1 else 0.5
+    extent = [
+        grid_x[0] - half_x,
+        grid_x[-1] + half_x,
+        grid_y[0] - half_y,
+        grid_y[-1] + half_y
+    ]
+    
+    def overlay(ax, context, frame_no, scale):
+        row = frame_rows.get((context.gid, context.pid, frame_no))
+        if row is None:
+            return None
+        
+        ax.imshow(
+            control[row],
+            extent = extent,
+            origin = 'lower',
+            cmap = cmap,
+            vmin = 0,
+            vmax = 1,
+            alpha = alpha,
+            interpolation = 'bilinear',
+            zorder = 5
+        )
+        
+        return None
+    
+    return overlay
+
+if __name__ == '__main__':
+    import bdb_helpers.plot_helpers as draw
+    
+    gid = 2018121603
+    pid = 105
+    
+    frames, grid_x, grid_y, control = play_control(gid, pid)
+    fig, ax = draw.play_frame(
+        gid,
+        pid,
+        frame_no = 33,
+        overlay = control_overlay(frames, grid_x, grid_y, control)
+    )
@@ -0,0 +1,206 @@
+"""
+@author: Ross Drucker
+"""
+import os
+import numpy as np
+import pandas as pd
+
+import bdb_filepaths as fp
+import bdb_helpers.coord_ops as coord_ops
+import bdb_helpers.resampling as resample
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.file_movers as file_ops
+
+# Each side of the ball gets 11 player slots in an embedding
+SIDE_SLOTS = 11
+
+# The version of how plays are embedded. Saved indexes built with another
+# version are built again
+INDEX_VERSION = 2
+
+# The similarity index, once it has been read from disk
+_index = {}
+
+def embed_plays(tracking, n_steps = 10):
+    """
+    Turns every play into a fixed-length vector describing the paths of its
+    players. Each play is flipped to move to the right, resampled from the
+    snap to the end of the play in n_steps steps, and centered on where the
+    ball was snapped from, so that plays run from different spots on the
+    field can be compared. Players of the same position are slotted by where
+    they lined up across the field, so which player ran which route doesn't
+    matter. Plays that are close together in this space have similar routes
+    and coverage shapes
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    n_steps: an integer of the number of steps to keep from each play
+    
+    Returns
+    -------
+    plays: a data frame of the game_id and play_id of each play. Plays
+        without a snap, or without the ball at the snap, are left out
+    embeddings: a float32 array of shape (play, 2 * 22 * n_steps) of each
+        play's embedding
+    """
+    tracking = coord_ops.standardize_direction(tracking)
+    
+    plays, times, player_ids, paths = resample.resample_plays(
+        tracking,
+        ['player_x', 'player_y'],
+        n_steps = n_steps,
+        side_slots = SIDE_SLOTS,
+        slot_by_snap = True
+    )
+    
+    # Plays without the ball at the snap have nothing to be centered on, and
+    # would all embed to the same point, so leave them out
+    ball_at_snap = paths[:, 0, 2 * SIDE_SLOTS, :]
+    has_ball = ~np.isnan(ball_at_snap).any(axis = 1)
+    
+    plays = plays[has_ball].reset_index(drop = True)
+    ball_at_snap = ball_at_snap[has_ball]
+    paths = paths[has_ball]
+    
+    # Measure every position from the ball at the snap, then drop the ball
+    paths = paths[:, :, :2 * SIDE_SLOTS, :] - ball_at_snap[:, None, None, :]
+    
+    # Empty slots sit at the ball
+    embeddings = np.nan_to_num(paths).reshape(len(plays), -1)
+    
+    return plays, embeddings.astype('float32')
+
+def build_index(weeks = range(1, 18), n_steps = 10):
+    """
+    Embeds every play of the given weeks and saves the embeddings to the
+    cache directory for nearest_plays() to search
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to include. Default is every week
+    n_steps: an integer of the number of steps to keep from each play
+    
+    Returns
+    -------
+    None.
+    """
+    plays = []
+    embeddings = []
+    for week in weeks:
+        week_plays, week_embeddings = embed_plays(
+            merge.tracking_and_plays(
+                tracking = load.tracking_data(
+                    week = week,
+                    prechecked_week = True
+                )
+            ),
+            n_steps
+        )
+        plays.append(week_plays)
+        embeddings.append(week_embeddings)
+    
+    plays = pd.concat(plays, ignore_index = True)
+    
+    file_ops.write_cache_arrays(
+        {
+            'game_id': plays['game_id'].values,
+            'play_id': plays['play_id'].values,
+            'embeddings': np.concatenate(embeddings),
+            'version': np.array(INDEX_VERSION)
+        },
+        os.path.basename(fp.play_similarity_file)
+    )
+    
+    _index.clear()
+    
+    return None
+
+def similarity_index():
+    """
+    Loads the similarity index, building it first if it does not exist or
+    was built with another INDEX_VERSION. It is only read from disk once per
+    session
+    
+    Returns
+    -------
+    _index: a dictionary of the game_id, play_id, and embeddings of every
+        play, and the squared length of each embedding
+    """
+    if not _index:
+        if not os.path.exists(fp.play_similarity_file):
+            build_index()
+        
+        with np.load(fp.play_similarity_file) as index:
+            version = index['version'] if 'version' in index.files else 0
+        
+        if version != INDEX_VERSION:
+            build_index()
+        
+        with np.load(fp.play_similarity_file) as index:
+            _index.update({key: index[key] for key in index.files})
+        
+        _index['sq_norms'] = np.einsum(
+            'ij,ij->i',
+            _index['embeddings'],
+            _index['embeddings']
+        )
+    
+    return _index
+
+def nearest_plays(gid, pid, k = 10):
+    """
+    Finds the k plays with embeddings closest to a play's embedding. Every
+    play is compared exactly, in a single matrix-vector product
+    
+    Parameters
+    ----------
+    gid: an integer of a game_id
+    pid: an integer of a play_id
+    k: an integer of the number of plays to find
+    
+    Returns
+    -------
+    similar: a data frame of the game_id, play_id, and distance between
+        embeddings of the k closest plays, closest first. Empty if the play
+        is not in the index
+    """
+    index = similarity_index()
+    
+    row = np.flatnonzero(
+        (index['game_id'] == gid) & (index['play_id'] == pid)
+    )
+    
+    if len(row) == 0:
+        return pd.DataFrame(columns = ['game_id', 'play_id', 'distance'])
+    
+    row = row[0]
+    query = index['embeddings'][row]
+    
+    # The squared distance to every play, expanded so that it only needs one
+    # pass over the embeddings
+    sq_dist = (
+        index['sq_norms'] -
+        2 * (index['embeddings'] @ query) +
+        index['sq_norms'][row]
+    )
+    sq_dist[row] = np.inf
+    
+    # Find the k closest without sorting every play, then sort those
+    k = min(k, len(sq_dist) - 1)
+    closest = np.argpartition(sq_dist, k)[:k]
+    closest = closest[np.argsort(sq_dist[closest])]
+    
+    similar = pd.DataFrame({
+        'game_id': index['game_id'][closest],
+        'play_id': index['play_id'][closest],
+        'distance': np.sqrt(np.maximum(sq_dist[closest], 0))
+    })
+    
+    return similar
+
+if __name__ == '__main__':
+    build_index()
+    similar = nearest_plays(2018121603, 105)
@@ -2,14 +2,23 @@
 @author: Ross Drucker
 """
 import os
-import math
 import warnings
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.patheffects as pe
+from matplotlib.collections import LineCollection
+from matplotlib.path import Path
+from matplotlib.lines import Line2D
+from matplotlib.patches import PathPatch
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D
+from matplotlib.font_manager import FontProperties
 
 import bdb_helpers.lookup as find
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.coord_ops as coord_ops
+import bdb_helpers.kinematics as kin
 import bdb_helpers.data_loaders as load
 import bdb_helpers.data_mergers as merge
 import bdb_helpers.input_checkers as check
@@ -19,6 +28,21 @@ warnings.filterwarnings('ignore')
 
 import time
 
+# Outlines of jersey numbers that have already been drawn, keyed by number and
+# size. These never change, so they are only built once per session
+_jersey_glyphs = {}
+
+# Named quality presets for rendering. The scale multiplies the figure size,
+# font sizes, line widths, and marker sizes together so that a frame looks the
+# same at every preset, only smaller. The dpi is used when saving frames, the
+# fps is the frame rate of gifs, and the frame_step is how many tracking frames
+# to advance between gif frames (tracking is recorded at 10 frames per second)
+RENDER_PRESETS = {
+    'thumbnail': {'scale': 0.2, 'dpi': 50, 'fps': 5, 'frame_step': 2},
+    'preview': {'scale': 0.4, 'dpi': 72, 'fps': 10, 'frame_step': 1},
+    'broadcast': {'scale': 1, 'dpi': 100, 'fps': 10, 'frame_step': 1}
+}
+
 def orient_jersey_num(gid, pid, prechecked_gid = False, prechecked_pid = False,
                 tracking = pd.DataFrame()):
     """
@@ -59,32 +83,191 @@ def orient_jersey_num(gid, pid, prechecked_gid = False, prechecked_pid = False,
     if tracking.empty:
         tracking = merge.tracking_and_plays(gid, pid)
     
-    tracking.loc[tracking['team'] == 'football', 'jersey_num_orientation'] = 0
+    # Home players' numbers face the left sideline when the play is going to
+    # the right, and away players' numbers face the right sideline. This flips
+    # when the play is going to the left. The ball has no number to orient
+    is_right = tracking['play_direction'].values == 'right'
+    
+    jersey_num_orientation = np.select(
+        [
+            tracking['team'].values == 'home',
+            tracking['team'].values == 'away'
+        ],
+        [
+            np.where(is_right, -90, 90),
+            np.where(is_right, 90, -90)
+        ],
+        default = 0
+    )
+    
+    return pd.Series(
+        jersey_num_orientation,
+        index = tracking.index,
+        name = 'jersey_num_orientation'
+    )
+
+def jersey_glyph(jersey_no, size = 0.7):
+    """
+    Gets the outline of a jersey number, centered on the origin. Outlines are
+    only built the first time a number is asked for, and are reused after that
+
+    Parameters
+    ----------
+    jersey_no: an integer of a player's jersey number
+    size: a float of the font size of the number, in yards
+
+    Returns
+    -------
+    glyph: a matplotlib Path of the jersey number's outline
+    """
+    key = (jersey_no, size)
+    
+    if key not in _jersey_glyphs:
+        glyph = TextPath(
+            (0, 0),
+            str(jersey_no),
+            size = size,
+            prop = FontProperties(weight = 'bold')
+        )
+        
+        # Center the number on the origin so that it can be rotated in place
+        extents = glyph.get_extents()
+        glyph = glyph.transformed(Affine2D().translate(
+            -(extents.x0 + extents.x1) / 2,
+            -(extents.y0 + extents.y1) / 2
+        ))
+        
+        _jersey_glyphs[key] = glyph
+        
+    return _jersey_glyphs[key]
+
+def jersey_numbers_path(team_frame, size = 0.7):
+    """
+    Combines the jersey numbers of every player in a frame into a single path,
+    with each number rotated and moved to its player's position
+
+    Parameters
+    ----------
+    team_frame: a dataframe of one team's tracking data for a single frame.
+        Must contain the player_x, player_y, player_no, and
+        jersey_num_orientation columns
+    size: a float of the font size of the numbers, in yards
+
+    Returns
+    -------
+    numbers: a matplotlib Path containing all of the team's jersey numbers
+    """
+    glyphs = [
+        jersey_glyph(int(jersey_no), size)
+        for jersey_no in team_frame['player_no'].values
+    ]
+    
+    if len(glyphs) == 0:
+        return Path(np.empty((0, 2)))
     
-    tracking.loc[
-        (tracking['team'] == 'home') & (tracking['play_direction'] == 'right'),
-        'jersey_num_orientation'
-    ] = -90
+    # Stack the outlines of every number, then repeat each player's position
+    # and rotation once per vertex of their number so that all of the numbers
+    # can be placed at once
+    n_vertices = [len(glyph.vertices) for glyph in glyphs]
+    vertices = np.concatenate([glyph.vertices for glyph in glyphs])
+    codes = np.concatenate([glyph.codes for glyph in glyphs])
     
-    tracking.loc[
-        (tracking['team'] == 'away') & (tracking['play_direction'] == 'right'),
-        'jersey_num_orientation'
-    ] = 90
+    theta = np.repeat(
+        np.radians(team_frame['jersey_num_orientation'].values),
+        n_vertices
+    )
+    x = np.repeat(team_frame['player_x'].values, n_vertices)
+    y = np.repeat(team_frame['player_y'].values, n_vertices)
     
-    tracking.loc[
-        (tracking['team'] == 'home') & (tracking['play_direction'] == 'left'),
-        'jersey_num_orientation'
-    ] = 90
+    cos_theta = np.cos(theta)
+    sin_theta = np.sin(theta)
     
-    tracking.loc[
-        (tracking['team'] == 'away') & (tracking['play_direction'] == 'left'),
-        'jersey_num_orientation'
-    ] = -90
+    numbers = Path(
+        np.column_stack([
+            x + vertices[:, 0] * cos_theta - vertices[:, 1] * sin_theta,
+            y + vertices[:, 0] * sin_theta + vertices[:, 1] * cos_theta
+        ]),
+        codes
+    )
     
-    return tracking['jersey_num_orientation']
+    return numbers
+
+def draw_players(ax, team_frame, uni_base, uni_highlight, uni_number,
+                 uni_number_highlight, plot_arrows = True, scale = 1):
+    """
+    Draws one team's players for a single frame. The players, their jersey
+    numbers, and their orientation arrows are each drawn as a single artist,
+    so the cost of drawing a team does not grow with the number of players
+
+    Parameters
+    ----------
+    ax: the axes object on which to draw the players
+    team_frame: a dataframe of one team's tracking data for a single frame
+    uni_base: a string of the hex code of the team's jersey color
+    uni_highlight: a string of the hex code of the team's jersey trim color
+    uni_number: a string of the hex code of the team's jersey number color
+    uni_number_highlight: a string of the hex code of the team's jersey
+        number trim color
+    plot_arrows: a boolean of whether or not to draw arrows showing which
+        direction each player is facing
+    scale: a float of how much to scale the marker size and line widths by.
+        Should match the scale of the render preset used to draw the field
+
+    Returns
+    -------
+    None.
+    """
+    # Plot the players
+    ax.scatter(
+        team_frame['player_x'],
+        team_frame['player_y'],
+        color = uni_base,
+        s = 800 * scale ** 2,
+        edgecolor = uni_highlight,
+        linewidth = 2 * scale,
+        zorder = 15
+    )
+    
+    # Add the jersey numbers. These sit on top of the player markers, so add
+    # them without recomputing the axis limits from every curve of every
+    # number
+    ax.add_artist(PathPatch(
+        jersey_numbers_path(team_frame),
+        facecolor = uni_number,
+        edgecolor = 'none',
+        path_effects = [
+            pe.withStroke(
+                linewidth = 3 * scale,
+                foreground = uni_number_highlight
+            )
+        ],
+        zorder = 20
+    ))
+    
+    # Add the arrows showing the direction the players are facing
+    if plot_arrows and not team_frame.empty:
+        ax.quiver(
+            team_frame['player_x'].values,
+            team_frame['player_y'].values,
+            3 * np.cos(team_frame['player_orientation'].values),
+            3 * np.sin(team_frame['player_orientation'].values),
+            angles = 'xy',
+            scale_units = 'xy',
+            scale = 1,
+            units = 'xy',
+            width = 0.3,
+            headwidth = 3,
+            headlength = 4.5,
+            headaxislength = 4.5,
+            color = uni_highlight,
+            zorder = 14
+        )
+    
+    return None
 
 def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
-          zero = 'l'):
+          zero = 'l', prechecked_teams = False, field_coords = (),
+          preset = 'broadcast'):
     """
     Draws a football field with the teams who are participating in the game.
     Teams are either supplied via the home and away arguments, or by looking
@@ -102,15 +285,27 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
         for yards, could be 'ft' for feet
     zero: a string for where the origin of the plot should be. Default is 'l',
         meaning lower left corner. Could be 'c' for center
+    prechecked_teams: a boolean of whether or not the home and away team codes
+        have already been checked. If True, the home and away arguments are
+        used as they are, even if a game ID is provided
+    field_coords: a tuple of the field markings returned by
+        load.football_field_coords(). Can be passed to skip rebuilding them
+        when drawing many fields
+    preset: a string of the name of the render preset in RENDER_PRESETS to
+        use. Default is 'broadcast', the full size field
 
     Returns
     -------
     fig, ax: the figure and axes objects (respectively)
     """
     
+    # If the teams have already been checked, use them as they are
+    if prechecked_teams:
+        pass
+    
     # If a game ID is provided, get the home and away team from the provided
     # game ID
-    if gid != 0:
+    elif gid != 0:
         gid = check.game_id(gid)
         home, away = find.game_teams(gid)
         
@@ -128,10 +323,8 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
             away = check.team_code(away)
     
     # Get the teams' color codes
-    team_info = load.teams_data()
-    
-    home_info = team_info[team_info['team_code'] == home]
-    away_info = team_info[team_info['team_code'] == away]
+    home_info = load.team_info(home)
+    away_info = load.team_info(away)
     
     #############################
     # Get the field coordinates #
@@ -140,7 +333,10 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
     minor_yd_lines_t, minor_yd_lines_l, minor_yd_lines_u, major_yd_lines, \
     hashes_l, hashes_u, extra_pt_mark, arrow_40_l, arrow_40_u, \
     arrow_30_l, arrow_30_u, arrow_20_l, arrow_20_u, arrow_10_l, \
-    arrow_10_u, field_marks = load.football_field_coords()
+    arrow_10_u, field_marks = field_coords or load.football_field_coords()
+    
+    # Get how much to scale the figure and everything drawn on it by
+    scale = RENDER_PRESETS[preset]['scale']
         
     #################
     # Make the plot #
@@ -148,7 +344,7 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
     fig, ax = plt.subplots()
     
     ax.set_aspect('equal')
-    fig.set_size_inches(50, 22.2)
+    fig.set_size_inches(50 * scale, 22.2 * scale)
     ax.xaxis.set_visible(False)
     ax.yaxis.set_visible(False)
     
@@ -157,11 +353,9 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
     
     # Put home logo at midfield
     if home.lower() in ['', 'nfl', 'nfc', 'afc']:
-        img = os.path.join('img', 'logos', 'nfl.png')
+        img = load.team_logo('nfl', preset)
     else:
-        img = os.path.join('img', 'logos', f'{home}.png')
-        
-    img = plt.imread(img)
+        img = load.team_logo(home, preset)
     
     if unit == 'yd':
         ax.imshow(img, extent = [52., 68., 18.65, 34.65], zorder = 10)
@@ -192,7 +386,7 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
             x = label['x'],
             y = label['y'],
             s = label['text'],
-            fontsize = 50,
+            fontsize = 50 * scale,
             color = '#ffffff',
             fontweight = 'bold',
             rotation = label['rotation'],
@@ -212,17 +406,17 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
     ax.text(
         x = 5,
         y = 26.65,
-        s = f'{home_info.nickname.iloc[0]}',
+        s = f'{home_info["nickname"]}',
         fontdict = {'ha': 'center', 'va': 'center'},
-        fontsize = 100,
+        fontsize = 100 * scale,
         fontweight = 'bold',
         fontname = 'Impact',
-        color = f'{home_info.endzone_text.iloc[0]}',
+        color = f'{home_info["endzone_text"]}',
         rotation = 90,
         path_effects = [
             pe.withStroke(
-                linewidth = 20,
-                foreground = f'{home_info.endzone_shadow.iloc[0]}'
+                linewidth = 20 * scale,
+                foreground = f'{home_info["endzone_shadow"]}'
             )
         ]
     )
@@ -230,17 +424,17 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
     ax.text(
         x = 114,
         y = 26.65,
-        s = f'{away_info.nickname.iloc[0]}',
+        s = f'{away_info["nickname"]}',
         fontdict = {'ha': 'center', 'va': 'center'},
-        fontsize = 100,
+        fontsize = 100 * scale,
         fontweight = 'bold',
         fontname = 'Impact',
-        color = f'{away_info.endzone_text.iloc[0]}',
+        color = f'{away_info["endzone_text"]}',
         rotation = -90,
         path_effects = [
             pe.withStroke(
-                linewidth = 20,
-                foreground = f'{away_info.endzone_shadow.iloc[0]}'
+                linewidth = 20 * scale,
+                foreground = f'{away_info["endzone_shadow"]}'
             )
         ]
     )
@@ -251,11 +445,217 @@ def field(gid = 0, home = 'nfl', away = '', show = False, unit = 'yd',
     else:
         return fig, ax
     
+class PlayRenderContext:
+    """
+    Everything needed to draw a play that stays the same from one frame to the
+    next. Building this once per play and passing it to play_frame() keeps
+    each frame from reloading and recomputing it
+
+    Parameters
+    ----------
+    gid: an int representing the game_id
+    pid: an int representing the play_id
+    home: a string of the home team's code. Not necessary if a game_id is
+        provided
+    away: a string of the away team's code. Not necessary if a game_id is
+        provided
+    prechecked_gid: a boolean of whether or not the game ID has been checked
+        before being passed to the function
+    prechecked_pid: a boolean of whether or not the play ID has been checked
+         before being passed to the function
+    tracking: a dataframe of merged tracking and play data for the play. If
+        not provided, it will be loaded
+
+    Attributes
+    ----------
+    gid, pid, home, away: the validated game ID, play ID, and team codes
+    tracking: the play's tracking data, sorted by frame and team, with the
+        jersey_num_orientation column added
+    frame_slices: a dictionary of (frame_id, team) to the slice of rows in
+        tracking holding that team's data for that frame
+    n_frames: an integer of the number of frames in the play
+    home_colors, away_colors: tuples of the uniform base, uniform highlight,
+        number, and number highlight colors for each team
+    los, first_down_line: data frames of the polygons to draw for the line
+        of scrimmage and the first down line
+    field_coords: a tuple of the field markings from
+        load.football_field_coords()
+    """
+    def __init__(self, gid = 0, pid = 0, home = '', away = '',
+                 prechecked_gid = False, prechecked_pid = False,
+                 tracking = pd.DataFrame()):
+        if gid != 0:
+            # Start by checking the game ID if it is provided but not yet
+            # checked
+            if not prechecked_gid:
+                gid = check.game_id(gid)
+                prechecked_gid = True
+            
+            # Get the home and away teams for the game
+            home, away = find.game_teams(gid)
+        
+        # If no game ID provided, and the home team is 'NFL', set home and
+        # away to NFC and AFC respectively. Otherwise, check to make sure the
+        # teams are legit
+        else:
+            home = home.upper()
+            away = away.upper()
+            if home == 'NFL':
+                home = 'NFC'
+                away = 'AFC'
+            else:
+                home = check.team_code(home)
+                away = check.team_code(away)
+                gid = find.game_id(home, away)
+            
+        # Next, check the play ID if it has not already been checked
+        if not prechecked_pid:
+            pid = check.play_id(gid, pid, prechecked_gid)
+            prechecked_pid = True
+        
+        # If tracking isn't supplied, load all relevant tracking data
+        if tracking.empty:
+            tracking = merge.tracking_and_plays(gid, pid)
+        
+        # Sort the tracking data so that each team's data in each frame is a
+        # contiguous block of rows, then find where each block starts and stops
+        tracking = tracking.sort_values(
+            ['frame_id', 'team'],
+            kind = 'mergesort'
+        ).reset_index(drop = True)
+        
+        tracking['jersey_num_orientation'] = orient_jersey_num(
+            gid,
+            pid,
+            prechecked_gid,
+            prechecked_pid,
+            tracking
+        )
+        
+        frame_ids = tracking['frame_id'].values
+        teams = tracking['team'].values
+        
+        starts = np.flatnonzero(np.r_[
+            True,
+            (frame_ids[1:] != frame_ids[:-1]) | (teams[1:] != teams[:-1])
+        ])
+        stops = np.r_[starts[1:], len(tracking)]
+        
+        self.frame_slices = {
+            (frame_ids[start], teams[start]): slice(start, stop)
+            for start, stop in zip(starts, stops)
+        }
+        
+        # Get the hex color information about each team to use to make the
+        # plot
+        home_info = load.team_info(home)
+        away_info = load.team_info(away)
+        
+        self.home_colors = (
+            home_info['home_uni_base'],
+            home_info['home_uni_highlight'],
+            home_info['home_uni_number'],
+            home_info['home_uni_number_highlight']
+        )
+        
+        self.away_colors = (
+            away_info['away_uni_base'],
+            away_info['away_uni_highlight'],
+            away_info['away_uni_number'],
+            away_info['away_uni_number_highlight']
+        )
+        
+        # Get the line of scrimmage and first down line. The merged tracking
+        # data already carries the play's information, so only look it up if
+        # it is missing
+        if 'absolute_yard_line' in tracking.columns:
+            los = tracking['absolute_yard_line'].iloc[0]
+        else:
+            los = find.line_of_scrimmage(
+                gid,
+                pid,
+                prechecked_gid,
+                prechecked_pid
+            )
+        
+        if 'yds_to_go' in tracking.columns:
+            if tracking['play_direction'].iloc[0] == 'right':
+                first_down = los + tracking['yds_to_go'].iloc[0]
+            else:
+                first_down = los - tracking['yds_to_go'].iloc[0]
+        else:
+            first_down = find.first_down_line(
+                gid,
+                pid,
+                tracking,
+                prechecked_gid,
+                prechecked_pid
+            )
+        
+        self.los = pd.DataFrame({
+            'x': [los - (2/12),
+                  los + (2/12),
+                  los + (2/12),
+                  los - (2/12),
+                  los - (2/12)
+            ],
+            'y': [1/9, 1/9, 53 + (2/9), 53 + (2/9), 1/9]
+        })
+        
+        self.first_down_line = pd.DataFrame({
+            'x': [first_down - (2/12),
+                  first_down + (2/12),
+                  first_down + (2/12),
+                  first_down - (2/12),
+                  first_down - (2/12)
+            ],
+            'y': [1/9, 1/9, 53 + (2/9), 53 + (2/9), 1/9]
+        })
+        
+        # The field markings are the same for every frame
+        self.field_coords = load.football_field_coords()
+        
+        self.gid = gid
+        self.pid = pid
+        self.home = home
+        self.away = away
+        self.tracking = tracking
+        self.n_frames = tracking['frame_id'].max()
+    
+    def frame(self, frame_no):
+        """
+        Splits a frame's data into the home team, the away team, and the
+        ball's data (respectively)
+
+        Parameters
+        ----------
+        frame_no: the number of the frame to get
+
+        Returns
+        -------
+        home_frame, away_frame, ball_frame: data frames of each team's and the
+            ball's tracking data in the frame
+        """
+        no_rows = slice(0, 0)
+        
+        home_frame = self.tracking.iloc[
+            self.frame_slices.get((frame_no, 'home'), no_rows)
+        ]
+        away_frame = self.tracking.iloc[
+            self.frame_slices.get((frame_no, 'away'), no_rows)
+        ]
+        ball_frame = self.tracking.iloc[
+            self.frame_slices.get((frame_no, 'football'), no_rows)
+        ]
+        
+        return home_frame, away_frame, ball_frame
+
 def play_frame(gid = 0, pid = 0, home = '', away = '', frame_no = 0,
                plot_los = True, plot_first_down_marker = True,
                plot_arrows = True, prechecked_gid = False,
                prechecked_pid = False, prechecked_frame = False,
-               tracking = pd.DataFrame()):
+               tracking = pd.DataFrame(), context = None,
+               preset = 'broadcast', overlay = None):
     """
     Draw a frame of a given play. Teams are either supplied via the home and
     away arguments, or by looking them up from the game_id provided by the gid
@@ -279,313 +679,707 @@ def play_frame(gid = 0, pid = 0, home = '', away = '', frame_no = 0,
         True when using the draw_play_gif() function
     tracking: a dataframe of tracking data that can be used to speed up
         plotting
+    context: a PlayRenderContext for the play. When drawing many frames of
+        the same play, build this once and pass it to every call. If it is
+        provided, gid, pid, home, away, and tracking are ignored
+    preset: a string of the name of the render preset in RENDER_PRESETS to
+        use. Default is 'broadcast', the full size frame
+    overlay: a function called as overlay(ax, context, frame_no, scale)
+        after the field is drawn but before the players, to draw something
+        underneath them (e.g. pitch_control.control_overlay())
 
     Returns
     -------
     fig, ax: the figure and axes objects (respectively)
     """
-    if gid != 0:
-        # Start by checking the game ID if it is provided but not yet checked
-        if not prechecked_gid:
-            gid = check.game_id(gid)
-            prechecked_gid = True
-        
-        # Get the home and away teams for the game
-        home, away = find.game_teams(gid)
-    
-    # If no game ID provided, and the home team is 'NFL', set home and away
-    # to NFC and AFC respectively. Otherwise, check to make sure the teams are
-    # legit
-    else:
-        home = home.upper()
-        away = away.upper()
-        if home == 'NFL':
-            home = 'NFC'
-            away = 'AFC'
-        else:
-            home = check.team_code(home)
-            away = check.team_code(away)
-            gid = find.game_id(home, away)
-        
-    # Next, check the play ID if it has not already been checked
-    if not prechecked_pid:
-        pid = check.play_id(gid, pid, prechecked_gid)
-        prechecked_pid = True
-    
-    # If tracking isn't supplied, load all relevant tracking data
-    if tracking.empty:
-        tracking = merge.tracking_and_plays(gid, pid)
+    # If the play's context isn't supplied, build it
+    if context is None:
+        context = PlayRenderContext(
+            gid,
+            pid,
+            home,
+            away,
+            prechecked_gid,
+            prechecked_pid,
+            tracking
+        )
         
     if not prechecked_frame:
-        frame_no = check.frame_no(gid, pid, frame_no, tracking)
-    
-    # Start prepping the data for the plot. Primarily, the jersey numbers'
-    # rotation angle based on team and play direction
-    tracking['jersey_num_orientation'] = orient_jersey_num(
-        gid,
-        pid,
-        prechecked_gid,
-        prechecked_pid,
-        tracking
-    )
+        frame_no = check.frame_no(
+            context.gid,
+            context.pid,
+            frame_no,
+            context.tracking,
+            prechecked_gid = True,
+            prechecked_pid = True
+        )
     
     # Split the frame's data into the home team, the away team, and the ball's
     # data (respectively)
-    home_frame = tracking[
-        (tracking['team'] == 'home') & (tracking['frame_id'] == frame_no)
-    ]
-    away_frame = tracking[
-        (tracking['team'] == 'away') & (tracking['frame_id'] == frame_no)
-    ]
-    ball_frame = tracking[
-        (tracking['team'] == 'football') & (tracking['frame_id'] == frame_no)
-    ]
+    home_frame, away_frame, ball_frame = context.frame(frame_no)
+    
+    home_uni_base, home_uni_highlight, home_uni_number, \
+        home_uni_number_highlight = context.home_colors
+    
+    away_uni_base, away_uni_highlight, away_uni_number, \
+        away_uni_number_highlight = context.away_colors
     
-    # Get the hex color information about each team to use to make the plot
-    teams_info = load.teams_data()
-    home_info = teams_info[teams_info['team_code'] == home]
-    away_info = teams_info[teams_info['team_code'] == away]
+    # Draw the field
+    fig, ax = field(
+        home = context.home,
+        away = context.away,
+        prechecked_teams = True,
+        field_coords = context.field_coords,
+        preset = preset
+    )
     
-    home_uni_base = home_info['home_uni_base'].iloc[0]
-    home_uni_highlight = home_info['home_uni_highlight'].iloc[0]
-    home_uni_number = home_info['home_uni_number'].iloc[0]
-    home_uni_number_highlight = home_info['home_uni_number_highlight'].iloc[0]
+    scale = RENDER_PRESETS[preset]['scale']
     
-    away_uni_base = away_info['away_uni_base'].iloc[0]
-    away_uni_highlight = away_info['away_uni_highlight'].iloc[0]
-    away_uni_number = away_info['away_uni_number'].iloc[0]
-    away_uni_number_highlight = away_info['away_uni_number_highlight'].iloc[0]
+    # Draw anything that goes between the field and the players
+    if overlay is not None:
+        overlay(ax, context, frame_no, scale)
     
-    # If the line of scrimmage is to be plotted, determine its position
+    # Plot the home team's players, their jersey numbers, and the direction
+    # they are facing
+    draw_players(
+        ax,
+        home_frame,
+        home_uni_base,
+        home_uni_highlight,
+        home_uni_number,
+        home_uni_number_highlight,
+        plot_arrows,
+        scale
+    )
+    
+    # Plot the away team's players, their jersey numbers, and the direction
+    # they are facing
+    draw_players(
+        ax,
+        away_frame,
+        away_uni_base,
+        away_uni_highlight,
+        away_uni_number,
+        away_uni_number_highlight,
+        plot_arrows,
+        scale
+    )
+    
+    # Plot the ball
+    ax.scatter(
+        ball_frame['player_x'],
+        ball_frame['player_y'],
+        color = '#624a2e',
+        s = 100 * scale ** 2,
+        edgecolor = '#000000',
+        linewidth = 2 * scale,
+        zorder = 15
+    )
+    
+    # Add the line of scrimmage and first down line
     if plot_los:
-        los = find.line_of_scrimmage(gid, pid)
-        los = pd.DataFrame({
-            'x': [los - (2/12),
-                  los + (2/12),
-                  los + (2/12),
-                  los - (2/12),
-                  los - (2/12)
-            ],
-            'y': [1/9, 1/9, 53 + (2/9), 53 + (2/9), 1/9]
-        })
+        ax.fill(context.los['x'], context.los['y'], '#183ec1')
     
-    # If the first down line is to be plotted, determine its position
     if plot_first_down_marker:
-        first_down = find.first_down_line(
+        ax.fill(
+            context.first_down_line['x'],
+            context.first_down_line['y'],
+            '#ffcb05'
+        )
+    
+    return fig, ax
+
+def play_gif(gid = 0, pid = 0, home = '', away = '', prechecked_gid = False,
+             prechecked_pid = False, tracking = pd.DataFrame(),
+             context = None, preset = 'broadcast', frame_step = 0,
+             overlay = None):
+    """
+    Draw every frame of a given play and save them together as a gif. Teams
+    are either supplied via the home and away arguments, or by looking them up
+    from the game_id provided by the gid argument
+
+    Parameters
+    ----------
+    gid: an int representing the game_id
+    pid: an int representing the play_id
+    home: a string of the home team's code. Not necessary if a game_id is
+        provided
+    away: a string of the away team's code. Not necessary if a game_id is
+        provided
+    prechecked_gid: a boolean of whether or not the game ID has been checked
+        before being passed to the function
+    prechecked_pid: a boolean of whether or not the play ID has been checked
+         before being passed to the function
+    tracking: a dataframe of tracking data that can be used to speed up
+        plotting
+    context: a PlayRenderContext for the play. If not provided, one is built
+        once and shared by every frame
+    preset: a string of the name of the render preset in RENDER_PRESETS to
+        use. Sets the size and resolution of the frames as well as the gif's
+        frame rate. Default is 'broadcast', the full size gif
+    frame_step: an integer of how many tracking frames to advance between
+        frames of the gif. The default of 0 uses the preset's frame step. When
+        frames are skipped, the gif's frame rate is lowered to match so that
+        the play still runs in real time
+    overlay: a function to draw underneath the players in every frame. See
+        play_frame()
+
+    Returns
+    -------
+    None.
+    """
+    # Build everything that stays the same across frames once, up front
+    if context is None:
+        context = PlayRenderContext(
             gid,
             pid,
-            tracking,
+            home,
+            away,
             prechecked_gid,
-            prechecked_pid
+            prechecked_pid,
+            tracking
         )
+    
+    gid = context.gid
+    pid = context.pid
+    tracking = context.tracking
+    
+    # Get the number of frames in the play
+    n_frames = context.n_frames
+    
+    # Get the resolution and frame rate for the gif. Skipping tracking frames
+    # lowers the frame rate by the same amount to keep the play in real time
+    dpi = RENDER_PRESETS[preset]['dpi']
+    
+    if frame_step == 0:
+        frame_step = RENDER_PRESETS[preset]['frame_step']
+        fps = RENDER_PRESETS[preset]['fps']
+    else:
+        fps = 10 / frame_step
+    
+    # Make the temporary directory to hold static images. This directory is
+    # unique to this call, so other gifs may be rendered at the same time
+    temp_path = file_ops.make_gif_temp_dir(gid, pid)
+    
+    try:
+        # Make each frame as a static image
+        for i in np.arange(1, n_frames + 1, frame_step):
+            print(f'Processing frame {i} of {n_frames}')
+            fig, ax = play_frame(
+                frame_no = i,
+                prechecked_frame = True,
+                context = context,
+                preset = preset,
+                overlay = overlay
+            )
+            
+            if i < 10:
+                fname = os.path.join(temp_path, f'{gid}_{pid}_000{i}.png')
+            elif i < 100:
+                fname = os.path.join(temp_path, f'{gid}_{pid}_00{i}.png')
+            else:
+                fname = os.path.join(temp_path, f'{gid}_{pid}_0{i}.png')
+            
+            plt.savefig(
+                f'{fname}',
+                dpi = dpi,
+                bbox_inches = 'tight',
+                pad_inches = 0
+            )
+            plt.close(fig)
         
-        first_down_line = pd.DataFrame({
-            'x': [first_down - (2/12),
-                  first_down + (2/12),
-                  first_down + (2/12),
-                  first_down - (2/12),
-                  first_down - (2/12)
-            ],
-            'y': [1/9, 1/9, 53 + (2/9), 53 + (2/9), 1/9]
-        })
+        try:
+            gif_fname = tracking['down_dist_summary'].values[0] + '.gif'
+        
+        except:
+            gif_fname = str(pid) + '.gif'
+            
+        # Collect the static images
+        images = file_ops.collect_gif_play_frames(gid, pid, temp_path)
+        
+        # Make and save the gif
+        file_ops.make_gif(gid, pid, images, fname = gif_fname, fps = fps)
     
-    # Draw the field
-    fig, ax = field(gid)
+    finally:
+        # Delete the temporary directory that holds this gif's static images,
+        # even if something went wrong along the way
+        file_ops.remove_temp_static_frame_directory(gid, pid, temp_path)
     
-    # Plot the home team's players
-    home_frame.plot(
-        x = 'player_x',
-        y = 'player_y',
-        kind = 'scatter',
-        ax = ax,
-        color = home_uni_base,
-        s = 800,
-        edgecolor = home_uni_highlight,
-        linewidth = 2,
-        zorder = 15
-    )
+    return None
+
+def event_window_mask(tracking, start_events = [], end_events = []):
+    """
+    Finds the rows of tracking data that fall between two events of their
+    play. Plays missing either event are left out entirely
     
-    # Add the jersey numbers for the home team
-    for i, player in home_frame.iterrows():
-        ax.text(
-            x = player['player_x'],
-            y = player['player_y'],
-            s = str(int(player['player_no'])),
-            fontsize = 15,
-            color = home_uni_number,
-            path_effects = [
-                pe.withStroke(
-                    linewidth = 3,
-                    foreground = home_uni_number_highlight
-                )
-            ],
-            fontweight = 'bold',
-            rotation = player['jersey_num_orientation'],
-            zorder = 20,
-            fontdict = {'ha': 'center', 'va': 'center'},
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data. May contain any number of plays
+    start_events: a list of the event_str values that open the window. If
+        empty, the window opens at the start of each play
+    end_events: a list of the event_str values that close the window. The
+        first of these at or after the window opens is used. If empty, the
+        window closes at the end of each play
+    
+    Returns
+    -------
+    in_window: a boolean array of whether each row is inside its play's
+        window
+    """
+    windows = tracking[['game_id', 'play_id']].drop_duplicates()
+    
+    # Find when each play's window opens and closes
+    if len(start_events) > 0:
+        windows = pd.merge(
+            left = windows,
+            right = frame_ops.first_event_frame(
+                tracking,
+                start_events,
+                name = 'start_frame'
+            ),
+            how = 'inner',
+            on = ['game_id', 'play_id']
         )
-        
-        if plot_arrows:        
-            ax.arrow(x = player['player_x'],
-                     y = player['player_y'],
-                     dx = 3 * math.cos(player['player_orientation']),
-                     dy = 3 * math.sin(player['player_orientation']),
-                     length_includes_head = True, width = 0.3,
-                     color = home_uni_highlight, zorder = 14
-            )
+    else:
+        windows['start_frame'] = 0
     
-    # Plot the away team's players
-    away_frame.plot(
-        'player_x',
-        'player_y',
-        kind = 'scatter',
-        ax = ax,
-        color = away_uni_base,
-        s = 800,
-        edgecolor = away_uni_highlight,
-        linewidth = 2,
-        zorder = 15
+    if len(end_events) > 0:
+        windows = pd.merge(
+            left = windows,
+            right = frame_ops.first_event_frame(
+                tracking,
+                end_events,
+                after = windows,
+                name = 'end_frame'
+            ),
+            how = 'inner',
+            on = ['game_id', 'play_id']
+        )
+    else:
+        windows['end_frame'] = np.inf
+    
+    # Line each row up with its play's window
+    bounds = pd.merge(
+        left = tracking[['game_id', 'play_id']],
+        right = windows,
+        how = 'left',
+        on = ['game_id', 'play_id']
     )
+    frame_ids = tracking['frame_id'].values
     
-    # Add the jersey numbers for the away team
-    for i, player in away_frame.iterrows():
-        ax.text(
-            x = player['player_x'],
-            y = player['player_y'],
-            s = str(int(player['player_no'])),
-            fontsize = 15,
-            color = away_uni_number,
-            path_effects = [
-                pe.withStroke(
-                    linewidth = 3,
-                    foreground = away_uni_number_highlight
-                )
-            ],
-            fontweight = 'bold',
-            rotation = player['jersey_num_orientation'],
-            zorder = 20,
-            fontdict = {'ha': 'center', 'va': 'center'},
+    in_window = (
+        (frame_ids >= bounds['start_frame'].values) &
+        (frame_ids <= bounds['end_frame'].values)
+    )
+    
+    return in_window
+
+def bin_positions(x, y, resolution = 1, field_length = 120,
+                  field_width = 160/3):
+    """
+    Counts how many positions fall in each cell of a grid laid over the field,
+    in a single pass over the positions. Positions off the field are counted
+    in the nearest cell on the field
+    
+    Parameters
+    ----------
+    x: an array of the x coordinates of the positions
+    y: an array of the y coordinates of the positions
+    resolution: a float of the size of each cell in yards
+    field_length: a float of the length of the field in yards, including the
+        endzones
+    field_width: a float of the width of the field in yards
+    
+    Returns
+    -------
+    counts: an integer array of shape (x cell, y cell) of the number of
+        positions in each cell
+    """
+    n_x = int(np.ceil(field_length / resolution))
+    n_y = int(np.ceil(field_width / resolution))
+    
+    # Drop positions that weren't recorded
+    recorded = ~np.isnan(x) & ~np.isnan(y)
+    
+    cell_x = np.clip((x[recorded] // resolution).astype(int), 0, n_x - 1)
+    cell_y = np.clip((y[recorded] // resolution).astype(int), 0, n_y - 1)
+    
+    counts = np.bincount(
+        cell_x * n_y + cell_y,
+        minlength = n_x * n_y
+    ).reshape(n_x, n_y)
+    
+    return counts
+
+def heatmap_counts(weeks = range(1, 18), team = '', player_id = 0,
+                   position = '', start_event = [], end_event = [],
+                   resolution = 1, standardize = True):
+    """
+    Counts where the selected players were over every frame of the given
+    weeks. Weeks are loaded one at a time and only their counts are kept, so
+    memory use does not grow with the number of weeks
+    
+    Parameters
+    ----------
+    weeks: a list of the weeks to count. Default is every week
+    team: a string of the team code of the team to count, or 'offense' or
+        'defense' to count whichever team was on that side of the ball.
+        Default is every team
+    player_id: an integer of the player_id of the player to count. Default
+        is every player
+    position: a string of the position to count, e.g. 'CB'. Default is every
+        position
+    start_event: a string (or list of strings) of the event_str values that
+        start the window of frames to count. Default is the start of each
+        play
+    end_event: a string (or list of strings) of the event_str values that
+        end the window of frames to count. Default is the end of each play
+    resolution: a float of the size of each cell in yards
+    standardize: a boolean of whether or not to flip plays so that the
+        offense is always moving to the right
+    
+    Returns
+    -------
+    counts: an integer array of shape (x cell, y cell) of the number of
+        frames the selected players spent in each cell
+    """
+    if isinstance(start_event, str):
+        start_event = [start_event]
+    if isinstance(end_event, str):
+        end_event = [end_event]
+    
+    if team not in ['', 'offense', 'defense']:
+        team = check.team_code(team)
+    
+    counts = 0
+    for week in weeks:
+        tracking = merge.tracking_and_plays(
+            tracking = load.tracking_data(week = week, prechecked_week = True)
         )
         
-        if plot_arrows:        
-            ax.arrow(x = player['player_x'],
-                     y = player['player_y'],
-                     dx = 3 * math.cos(player['player_orientation']),
-                     dy = 3 * math.sin(player['player_orientation']),
-                     length_includes_head = True, width = 0.3,
-                     color = away_uni_highlight, zorder = 14
-            )
+        # Keep the selected players, inside the window of frames
+        keep = (tracking['team'] != 'football').values
+        
+        if team == 'offense':
+            keep &= frame_ops.offense_mask(tracking)
+        elif team == 'defense':
+            keep &= frame_ops.defense_mask(tracking)
+        elif team != '':
+            keep &= (
+                ((tracking['team'] == 'home') & (tracking['home'] == team)) |
+                ((tracking['team'] == 'away') & (tracking['away'] == team))
+            ).values
+        
+        if player_id != 0:
+            keep &= (tracking['player_id'] == player_id).values
+        
+        if position != '':
+            keep &= (tracking['player_position'] == position.upper()).values
+        
+        if len(start_event) > 0 or len(end_event) > 0:
+            keep &= event_window_mask(tracking, start_event, end_event)
+        
+        x = tracking['player_x'].values[keep]
+        y = tracking['player_y'].values[keep]
+        
+        # Only the kept positions are needed, so flip those directly rather
+        # than copying the whole week through standardize_direction()
+        if standardize:
+            flip = (tracking['play_direction'].values[keep] == 'left')
+            x = np.where(flip, 120 - x, x)
+            y = np.where(flip, 160/3 - y, y)
+        
+        counts = counts + bin_positions(x, y, resolution)
     
-    # Plot the ball
-    ball_frame.plot(
-        'player_x',
-        'player_y',
-        kind = 'scatter',
-        ax = ax,
-        color = '#624a2e',
-        s = 100,
-        edgecolor = '#000000',
-        linewidth = 2,
-        zorder = 15
+    return counts
+
+def heatmap(weeks = range(1, 18), team = '', player_id = 0, position = '',
+            start_event = [], end_event = [], resolution = 1,
+            standardize = True, cmap = 'hot', alpha = 0.7, show = False,
+            preset = 'broadcast'):
+    """
+    Draws a heatmap of where the selected players were on the field over
+    every frame of the given weeks. The positions are counted on a grid (see
+    heatmap_counts()) and the grid is drawn as a single image, so the time it
+    takes to draw does not depend on how many frames are counted
+    
+    Parameters
+    ----------
+    weeks, team, player_id, position, start_event, end_event, resolution,
+        standardize: see heatmap_counts()
+    cmap: a string of the name of the matplotlib colormap to use
+    alpha: a float of how opaque to draw the heatmap
+    show: a boolean of whether or not to show the plot
+    preset: a string of the name of the render preset in RENDER_PRESETS to
+        use. Default is 'broadcast', the full size field
+    
+    Returns
+    -------
+    fig, ax: the figure and axes objects (respectively)
+    """
+    counts = heatmap_counts(
+        weeks,
+        team,
+        player_id,
+        position,
+        start_event,
+        end_event,
+        resolution,
+        standardize
     )
     
-    ax.fill(los['x'], los['y'], '#183ec1')
-    ax.fill(first_down_line['x'], first_down_line['y'], '#ffcb05')
+    # Draw the field
+    fig, ax = field(home = 'nfl', preset = preset)
+    
+    # Leave cells nobody was in clear, so the field shows through them
+    density = np.ma.masked_equal(np.asarray(counts, dtype = float), 0)
+    density = density / max(density.sum(), 1)
+    
+    xlim = ax.get_xlim()
+    ylim = ax.get_ylim()
+    
+    ax.imshow(
+        density.T,
+        extent = [
+            0,
+            density.shape[0] * resolution,
+            0,
+            density.shape[1] * resolution
+        ],
+        origin = 'lower',
+        cmap = cmap,
+        alpha = alpha,
+        interpolation = 'nearest',
+        zorder = 5
+    )
+    
+    # Drawing the image resizes the axes, so put them back around the field
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    
+    if show:
+        plt.show()
     
     return fig, ax
 
-def play_gif(gid = 0, pid = 0, home = '', away = '', prechecked_gid = False,
-             prechecked_pid = False, tracking = pd.DataFrame()):
-    # If a game ID is provided, get the home and away team from the provided
-    # game ID
-    if gid != 0:
-        # Start by checking the game ID if it is provided but not yet checked
-        if not prechecked_gid:
-            gid = check.game_id(gid)
-            prechecked_gid = True
-        
-        # Get the home and away teams for the game
-        home, away = find.game_teams(gid)
+def plays_tracking(plays):
+    """
+    Loads the merged tracking and plays data of a set of plays, one week at a
+    time so that only the selected plays are ever kept in memory
     
-    # If no game ID provided, and the home team is 'NFL', set home and away
-    # to NFC and AFC respectively. Otherwise, check to make sure the teams are
-    # legit
+    Parameters
+    ----------
+    plays: a data frame with the game_id and play_id of each play, e.g. from
+        find.plays_matching(). If it has a week column, only those weeks are
+        loaded
+    
+    Returns
+    -------
+    tracking: a dataframe of merged tracking and plays data of the plays
+    """
+    keys = plays[['game_id', 'play_id']].drop_duplicates()
+    
+    if 'week' in plays.columns:
+        weeks = sorted(plays['week'].unique())
     else:
-        home = home.upper()
-        away = away.upper()
-        if home == 'NFL':
-            home = 'NFC'
-            away = 'AFC'
-        else:
-            home = check.team_code(home)
-            away = check.team_code(away)
-            gid = find.game_id(home, away)
+        weeks = range(1, 18)
+    
+    tracking = []
+    for week in weeks:
+        week_tracking = pd.merge(
+            left = load.tracking_data(week = week, prechecked_week = True),
+            right = keys,
+            how = 'inner',
+            on = ['game_id', 'play_id']
+        )
         
-    # Next, check the play ID if it has not already been checked
-    if not prechecked_pid:
-        pid = check.play_id(gid, pid, prechecked_gid)
-        prechecked_pid = True
+        if not week_tracking.empty:
+            tracking.append(merge.tracking_and_plays(tracking = week_tracking))
+    
+    if len(tracking) == 0:
+        return pd.DataFrame()
+    
+    return pd.concat(tracking, ignore_index = True)
+
+def trajectory_segments(tracking, group_by = '', step = 1):
+    """
+    Splits tracking data into the path of each player through each play,
+    grouped so that each group can be drawn as a single LineCollection
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data. May contain any number of plays
+    group_by: a string of the column to group the paths by, e.g.
+        'route_type'. Default is to put every path in one group
+    step: an integer of how many frames to advance between the points kept
+        from each path. The last point of each path is always kept
+    
+    Returns
+    -------
+    segments: a dictionary of each group to a list of the (point, 2) arrays
+        of x and y coordinates of its paths
+    """
+    tracking = frame_ops.sort_tracking(tracking, by = 'player')
+    tracking = tracking[tracking['player_x'].notna()].reset_index(drop = True)
     
-    # If tracking isn't supplied, load all relevant tracking data
     if tracking.empty:
-        tracking = merge.tracking_and_plays(gid, pid)
+        return {}
     
-    # Get the number of frames in the play
-    n_frames = find.n_frames(
-        gid = gid,
-        pid = pid,
-        tracking = tracking,
-        prechecked_gid = True,
-        prechecked_pid = True
-    )
+    # Thin out each path, keeping its last point
+    starts, stops = kin.segment_bounds(tracking)
+    if step > 1:
+        from_start, to_end = kin.segment_positions(starts, stops)
+        tracking = tracking[
+            (from_start % step == 0) | (to_end == 0)
+        ].reset_index(drop = True)
+        starts, stops = kin.segment_bounds(tracking)
     
-    # Make the temporary directory to hold static images
-    file_ops.make_gif_temp_dir(gid, pid)
+    # Split every path out at once, and drop paths of a single point
+    xy = tracking[['player_x', 'player_y']].values
+    paths = np.split(xy, starts[1:])
+    long_enough = (stops - starts) > 1
     
-    # Make each frame as a static image
-    for i in np.arange(1, n_frames + 1):
-        print(f'Processing frame {i} of {n_frames}')
-        fig, ax = play_frame(
-            gid,
-            pid,
-            frame_no = i,
-            prechecked_gid = True,
-            prechecked_pid = True,
-            tracking = tracking,
-            prechecked_frame = True
+    if group_by == '':
+        groups = np.zeros(len(starts), dtype = int)
+    else:
+        groups = tracking[group_by].fillna('NONE').values[starts]
+    
+    segments = {}
+    for group in pd.unique(groups[long_enough]):
+        segments[group] = [
+            paths[i] for i in np.flatnonzero(long_enough & (groups == group))
+        ]
+    
+    return segments
+
+def route_tree(plays, tracking = pd.DataFrame(), side = 'offense',
+               routes_only = True, start_event = ['ball_snap'],
+               end_event = [], group_by = 'route_type', step = 1,
+               align_los = True, linewidth = 4, alpha = 0.5, show = False,
+               preset = 'broadcast'):
+    """
+    Draws the full paths of players over many plays on one field, e.g. every
+    route a team ran on third down. Every play is flipped to move to the
+    right, and each group of paths is drawn as a single LineCollection, so
+    thousands of paths can be drawn at once
+    
+    Parameters
+    ----------
+    plays: a data frame with the game_id and play_id of each play to draw,
+        e.g. from find.plays_matching()
+    tracking: a dataframe of merged tracking and plays data that contains the
+        plays. If not provided, it is loaded
+    side: a string of which players to draw. Either 'offense', 'defense', or
+        '' for both
+    routes_only: a boolean of whether or not to only draw players who ran a
+        route
+    start_event: a string (or list of strings) of the event_str values to
+        start each path at. If empty, paths start at the start of the play
+    end_event: a string (or list of strings) of the event_str values to end
+        each path at. If empty, paths end at the end of the play
+    group_by: a string of the column to color the paths by. If empty, every
+        path is drawn in one color
+    step: an integer of how many frames to advance between the points drawn
+        from each path
+    align_los: a boolean of whether or not to move every play's line of
+        scrimmage to midfield, so that paths from plays run at different
+        yard lines line up
+    linewidth: a float of the width of the paths
+    alpha: a float of how opaque to draw the paths
+    show: a boolean of whether or not to show the plot
+    preset: a string of the name of the render preset in RENDER_PRESETS to
+        use. Default is 'broadcast', the full size field
+    
+    Returns
+    -------
+    fig, ax: the figure and axes objects (respectively)
+    """
+    if isinstance(start_event, str):
+        start_event = [start_event]
+    if isinstance(end_event, str):
+        end_event = [end_event]
+    
+    # Get the tracking data of the plays
+    if tracking.empty:
+        tracking = plays_tracking(plays)
+    
+    # Keep the selected players of the selected plays, between the events
+    keep = pd.merge(
+        left = tracking[['game_id', 'play_id']],
+        right = plays[['game_id', 'play_id']].drop_duplicates().assign(
+            selected = True
+        ),
+        how = 'left',
+        on = ['game_id', 'play_id']
+    )['selected'].notna().values
+    keep &= (tracking['team'] != 'football').values
+    
+    if side == 'offense':
+        keep &= frame_ops.offense_mask(tracking)
+    elif side == 'defense':
+        keep &= frame_ops.defense_mask(tracking)
+    
+    if routes_only:
+        keep &= tracking['route_type'].notna().values
+    
+    if len(start_event) > 0 or len(end_event) > 0:
+        keep &= event_window_mask(tracking, start_event, end_event)
+    
+    # Only carry the columns that are needed from here on
+    columns = [
+        'game_id', 'play_id', 'frame_id', 'player_id', 'team', 'player_x',
+        'player_y', 'player_orientation', 'player_direction',
+        'play_direction', 'absolute_yard_line'
+    ]
+    if group_by not in columns + ['']:
+        columns.append(group_by)
+    
+    tracking = coord_ops.standardize_direction(tracking.loc[keep, columns])
+    
+    if align_los:
+        tracking['player_x'] = (
+            tracking['player_x'] - tracking['absolute_yard_line'] + 60
         )
-        
-        if i < 10:
-            fname = os.path.join(
-                'img', 'temp', f'{gid}_{pid}', f'{gid}_{pid}_000{i}.png'
-            )
-        elif i < 100:
-            fname = os.path.join(
-                'img', 'temp', f'{gid}_{pid}', f'{gid}_{pid}_00{i}.png'
-            )
-        else:
-            fname = os.path.join(
-                'img', 'temp', f'{gid}_{pid}', f'{gid}_{pid}_0{i}.png'
-            )
-        
-        plt.savefig(f'{fname}', bbox_inches = 'tight', pad_inches = 0)
     
-    try:
-        gif_fname = tracking['down_dist_summary'].values[0] + '.gif'
+    segments = trajectory_segments(tracking, group_by, step)
+    
+    # Draw the field, then each group of paths on top of it
+    fig, ax = field(home = 'nfl', preset = preset)
+    scale = RENDER_PRESETS[preset]['scale']
     
-    except:
-        gif_fname = str(pid) + '.gif'
+    colors = plt.get_cmap('tab10' if len(segments) <= 10 else 'tab20')
+    handles = []
+    for i, (group, paths) in enumerate(segments.items()):
+        color = colors(i % colors.N)
         
-    # Collect the static images
-    images = file_ops.collect_gif_play_frames(gid, pid)
+        ax.add_collection(LineCollection(
+            paths,
+            colors = [color],
+            linewidths = linewidth * scale,
+            alpha = alpha,
+            zorder = 10
+        ))
+        
+        handles.append(Line2D(
+            [],
+            [],
+            color = color,
+            linewidth = 8 * scale,
+            label = f'{group} ({len(paths)})'
+        ))
     
-    # Make and save the gif
-    file_ops.make_gif(gid, pid, images, fname = gif_fname)
+    if group_by != '' and len(handles) > 0:
+        ax.legend(
+            handles = handles,
+            loc = 'upper left',
+            fontsize = 40 * scale,
+            framealpha = 0.8
+        )
     
-    # Delete the temporary directory that holds all static images.
-    file_ops.remove_temp_static_frame_directory(gid, pid)
+    if show:
+        plt.show()
     
-    return None
+    return fig, ax
 
 if __name__ == '__main__':
     gid = 2018121603
@@ -0,0 +1,206 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+import pandas as pd
+
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.distances as dist
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.file_movers as file_ops
+import bdb_helpers.input_checkers as check
+
+# Events marking when the ball is thrown, and when it gets to the receiver. If
+# a play has no pass_arrived event, the first outcome of the pass is used
+THROW_EVENTS = ['pass_forward', 'pass_shovel']
+ARRIVAL_EVENTS = [
+    'pass_arrived', 'pass_outcome_caught', 'pass_outcome_incomplete',
+    'pass_outcome_interception', 'pass_outcome_touchdown'
+]
+
+def receiver_separation(tracking):
+    """
+    Measures how open each receiver was when the ball was thrown and when it
+    arrived, and how quickly the closest defender at the throw closed on the
+    receiver while the ball was in the air. Every pass play in the tracking
+    data is handled at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    
+    Returns
+    -------
+    separation: a data frame with one row per receiver per pass play
+        containing the game_id, play_id, player_id, route_type, throw_frame,
+        arrival_frame, air_time (seconds), throw_defender_id and
+        throw_separation (the closest defender and distance to them when the
+        ball was thrown), arrival_defender_id and arrival_separation (the
+        same, when the ball arrived), and closing_speed (how quickly, in
+        yards per second, the closest defender at the throw closed the gap
+        while the ball was in the air)
+    """
+    # Find the frames where the ball was thrown and where it arrived
+    throws = frame_ops.first_event_frame(
+        tracking,
+        THROW_EVENTS,
+        name = 'throw_frame'
+    )
+    arrivals = frame_ops.first_event_frame(
+        tracking,
+        ARRIVAL_EVENTS,
+        after = throws,
+        name = 'arrival_frame'
+    )
+    
+    pass_frames = pd.merge(
+        left = throws,
+        right = arrivals,
+        how = 'inner',
+        on = ['game_id', 'play_id']
+    )
+    
+    # Keep only the throw and arrival frames of each pass play
+    tracking = pd.merge(
+        left = tracking[tracking['team'] != 'football'],
+        right = pass_frames,
+        how = 'inner',
+        on = ['game_id', 'play_id']
+    )
+    
+    tracking = tracking[
+        (tracking['frame_id'] == tracking['throw_frame']) |
+        (tracking['frame_id'] == tracking['arrival_frame'])
+    ]
+    
+    # Find every offensive player's closest defender in both frames
+    nearest = dist.nearest_defender(tracking)
+    
+    # Receivers are the offensive players running a route
+    receivers = tracking.loc[
+        frame_ops.offense_mask(tracking) & tracking['route_type'].notna(),
+        ['game_id', 'play_id', 'player_id', 'route_type']
+    ].drop_duplicates(['game_id', 'play_id', 'player_id'])
+    
+    separation = pd.merge(
+        left = receivers,
+        right = pass_frames,
+        how = 'inner',
+        on = ['game_id', 'play_id']
+    )
+    
+    at_throw = nearest.rename(columns = {
+        'frame_id': 'throw_frame',
+        'nearest_defender_id': 'throw_defender_id',
+        'separation': 'throw_separation'
+    })
+    at_arrival = nearest.rename(columns = {
+        'frame_id': 'arrival_frame',
+        'nearest_defender_id': 'arrival_defender_id',
+        'separation': 'arrival_separation'
+    })
+    
+    separation = pd.merge(
+        left = separation,
+        right = at_throw,
+        how = 'left',
+        on = ['game_id', 'play_id', 'player_id', 'throw_frame']
+    )
+    separation = pd.merge(
+        left = separation,
+        right = at_arrival,
+        how = 'left',
+        on = ['game_id', 'play_id', 'player_id', 'arrival_frame']
+    )
+    
+    # Find where the receiver and the closest defender at the throw were when
+    # the ball arrived
+    positions = tracking.loc[
+        tracking['frame_id'] == tracking['arrival_frame'],
+        ['game_id', 'play_id', 'player_id', 'player_x', 'player_y']
+    ]
+    
+    receiver_pos = pd.merge(
+        left = separation[['game_id', 'play_id', 'player_id']],
+        right = positions,
+        how = 'left',
+        on = ['game_id', 'play_id', 'player_id']
+    )
+    defender_pos = pd.merge(
+        left = separation[['game_id', 'play_id', 'throw_defender_id']],
+        right = positions.rename(columns = {
+            'player_id': 'throw_defender_id'
+        }),
+        how = 'left',
+        on = ['game_id', 'play_id', 'throw_defender_id']
+    )
+    
+    gap_at_arrival = np.hypot(
+        receiver_pos['player_x'].values - defender_pos['player_x'].values,
+        receiver_pos['player_y'].values - defender_pos['player_y'].values
+    )
+    
+    # Tracking is recorded at 10 frames per second
+    separation['air_time'] = (
+        separation['arrival_frame'] - separation['throw_frame']
+    ) / 10
+    
+    separation['closing_speed'] = np.where(
+        separation['air_time'] > 0,
+        (separation['throw_separation'] - gap_at_arrival) /
+            separation['air_time'],
+        np.nan
+    )
+    
+    # Keep the results compact
+    for col in ['air_time', 'throw_separation', 'arrival_separation',
+                'closing_speed']:
+        separation[col] = separation[col].astype('float32')
+    
+    separation = separation[[
+        'game_id', 'play_id', 'player_id', 'route_type', 'throw_frame',
+        'arrival_frame', 'air_time', 'throw_defender_id', 'throw_separation',
+        'arrival_defender_id', 'arrival_separation', 'closing_speed'
+    ]]
+    
+    return separation
+
+def week_receiver_separation(week, prechecked_week = False, save = True):
+    """
+    Measures receiver separation and closing speed for every pass play of a
+    week, in a single pass over the week's tracking data, and saves the
+    results to the cache directory
+    
+    Parameters
+    ----------
+    week: an integer of the week to measure
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    save: a boolean of whether or not to save the results as
+        receiver_separation_week{week}.parquet in the cache directory
+    
+    Returns
+    -------
+    separation: a data frame of the results. See receiver_separation()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    separation = receiver_separation(tracking)
+    
+    if save:
+        file_ops.write_cache_table(
+            separation,
+            f'receiver_separation_week{week}.parquet'
+        )
+    
+    return separation
+
+if __name__ == '__main__':
+    separation = week_receiver_separation(1)
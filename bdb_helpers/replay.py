@@ -0,0 +1,324 @@
+"""
+@author: Ross Drucker
+"""
+import asyncio
+import pandas as pd
+
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.kinematics as kin
+import bdb_helpers.data_loaders as load
+import bdb_helpers.input_checkers as check
+
+class Subscriber:
+    """
+    One consumer of a ReplayStream. Frames wait in the subscriber's own
+    bounded queue until its handler gets to them, and how far behind the
+    stream the handler is running is measured as each frame is handled
+    """
+    def __init__(self, handler, name, queue_size, drop_when_full):
+        """
+        Parameters
+        ----------
+        handler: a function (or coroutine function) of (frame) that is
+            called on each frame, where frame is a data frame of the frame's
+            tracking data
+        name: a string of the subscriber's name
+        queue_size: an integer of the most frames that can wait for the
+            handler
+        drop_when_full: a boolean of whether to skip frames while the queue
+            is full. If False, the stream waits for the handler to catch up
+        """
+        self.handler = handler
+        self.name = name
+        self.queue_size = queue_size
+        self.drop_when_full = drop_when_full
+        
+        # The queue is made when the stream runs, so that it belongs to the
+        # event loop the stream is run on
+        self.queue = None
+        
+        self.frames = 0
+        self.dropped = 0
+        self.errors = 0
+        self.first_error = None
+        self.total_lag = 0.
+        self.max_lag = 0.
+        self.max_depth = 0
+    
+    async def consume(self, loop):
+        """
+        Hands each frame in the queue to the handler until the stream ends
+        
+        Parameters
+        ----------
+        loop: the event loop the stream is running on
+        
+        Returns
+        -------
+        None.
+        """
+        while True:
+            item = await self.queue.get()
+            
+            # The stream puts None in the queue when it ends
+            if item is None:
+                return None
+            
+            due, frame = item
+            
+            # Lag is how long after the frame was due the handler got it
+            lag = max(loop.time() - due, 0)
+            self.frames += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            
+            # A handler that fails on a frame is counted, and keeps getting
+            # frames, so that the stream isn't left waiting on its queue. The
+            # first failure is kept, and reported through the event loop
+            try:
+                result = self.handler(frame)
+                if asyncio.iscoroutine(result):
+                    await result
+            
+            except Exception as error:
+                self.errors += 1
+                
+                if self.first_error is None:
+                    self.first_error = error
+                    loop.call_exception_handler({
+                        'message': f'Subscriber {self.name} failed on a '
+                                   'frame',
+                        'exception': error
+                    })
+    
+    def stats(self):
+        """
+        Summarizes how the subscriber kept up with the stream
+        
+        Returns
+        -------
+        stats: a dictionary of the subscriber's name, the number of frames
+            handled, dropped, and that the handler failed on, the first
+            error the handler raised (an empty string if it never failed),
+            the mean and max lag (in seconds), and the most frames that were
+            ever waiting in its queue
+        """
+        stats = {
+            'name': self.name,
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'first_error': (
+                '' if self.first_error is None else repr(self.first_error)
+            ),
+            'mean_lag': self.total_lag / max(self.frames, 1),
+            'max_lag': self.max_lag,
+            'max_queue_depth': self.max_depth
+        }
+        
+        return stats
+
+class ReplayStream:
+    """
+    Replays tracking data one frame at a time, as if it were arriving live,
+    to any number of subscribers. Frames are sent at the native 10 frames per
+    second, or faster, and each subscriber handles them from its own bounded
+    queue
+    """
+    def __init__(self, tracking, speed = 1, queue_size = 100,
+                 drop_when_full = False):
+        """
+        Parameters
+        ----------
+        tracking: a dataframe of tracking data, or merged tracking and plays
+            data. May contain any number of plays, which are replayed one
+            after another
+        speed: a float of how many times faster than real time to replay.
+            If 0, frames are sent as fast as the subscribers can take them
+        queue_size: an integer of the most frames that can wait for each
+            subscriber, unless set when subscribing
+        drop_when_full: a boolean of whether subscribers skip frames while
+            their queue is full, unless set when subscribing. If False, the
+            stream slows down to the pace of the slowest subscriber
+        """
+        self.tracking = frame_ops.sort_tracking(tracking, by = 'frame')
+        self.starts, self.stops = frame_ops.group_bounds(
+            self.tracking['game_id'].values,
+            self.tracking['play_id'].values,
+            self.tracking['frame_id'].values
+        )
+        
+        self.speed = speed
+        self.queue_size = queue_size
+        self.drop_when_full = drop_when_full
+        self.subscribers = []
+        
+        # How far behind schedule the stream itself fell, from waiting on
+        # full queues
+        self.max_behind = 0.
+    
+    def subscribe(self, handler, name = '', queue_size = None,
+                  drop_when_full = None):
+        """
+        Adds a subscriber to the stream. Subscribers must be added before the
+        stream is run
+        
+        Parameters
+        ----------
+        handler: a function (or coroutine function) of (frame) to call on
+            each frame, where frame is a data frame of the frame's tracking
+            data
+        name: a string of the subscriber's name. Default is the handler's
+            name
+        queue_size: an integer of the most frames that can wait for the
+            subscriber. Default is the stream's queue_size
+        drop_when_full: a boolean of whether the subscriber skips frames
+            while its queue is full. Default is the stream's drop_when_full
+        
+        Returns
+        -------
+        subscriber: the Subscriber that was added
+        """
+        subscriber = Subscriber(
+            handler,
+            name or getattr(handler, '__name__', str(len(self.subscribers))),
+            queue_size or self.queue_size,
+            self.drop_when_full if drop_when_full is None else drop_when_full
+        )
+        self.subscribers.append(subscriber)
+        
+        return subscriber
+    
+    async def publish(self, due, frame):
+        """
+        Sends a frame to every subscriber. Full queues either drop the frame
+        or hold up the stream until there is room
+        
+        Parameters
+        ----------
+        due: a float of the event loop time the frame was due at
+        frame: a data frame of the frame's tracking data
+        
+        Returns
+        -------
+        None.
+        """
+        for subscriber in self.subscribers:
+            if subscriber.queue.full() and subscriber.drop_when_full:
+                subscriber.dropped += 1
+                continue
+            
+            await subscriber.queue.put((due, frame))
+            subscriber.max_depth = max(
+                subscriber.max_depth,
+                subscriber.queue.qsize()
+            )
+        
+        return None
+    
+    async def run(self):
+        """
+        Replays every frame to the subscribers, then waits for them to finish
+        handling what is left in their queues
+        
+        Returns
+        -------
+        stats: a data frame of each subscriber's stats. See
+            Subscriber.stats()
+        """
+        loop = asyncio.get_running_loop()
+        for subscriber in self.subscribers:
+            subscriber.queue = asyncio.Queue(maxsize = subscriber.queue_size)
+        
+        consumers = [
+            asyncio.ensure_future(subscriber.consume(loop))
+            for subscriber in self.subscribers
+        ]
+        
+        start = loop.time()
+        for i, (row_start, row_stop) in enumerate(zip(self.starts,
+                                                      self.stops)):
+            # Wait until the frame is due. When replaying as fast as
+            # possible, still give the subscribers a turn
+            if self.speed > 0:
+                due = start + i * kin.SECONDS_PER_FRAME / self.speed
+                await asyncio.sleep(max(due - loop.time(), 0))
+            else:
+                due = loop.time()
+                await asyncio.sleep(0)
+            
+            await self.publish(due, self.tracking.iloc[row_start:row_stop])
+            self.max_behind = max(self.max_behind, loop.time() - due)
+        
+        # Tell the subscribers the stream is over, then let them catch up
+        for subscriber in self.subscribers:
+            await subscriber.queue.put(None)
+        
+        await asyncio.gather(*consumers)
+        
+        return self.stats()
+    
+    def stats(self):
+        """
+        Summarizes how each subscriber kept up with the stream
+        
+        Returns
+        -------
+        stats: a data frame with one row per subscriber. See
+            Subscriber.stats()
+        """
+        stats = pd.DataFrame(
+            [subscriber.stats() for subscriber in self.subscribers],
+            columns = [
+                'name', 'frames', 'dropped', 'errors', 'first_error',
+                'mean_lag', 'max_lag', 'max_queue_depth'
+            ]
+        )
+        
+        return stats
+
+def replay_week(week, handlers, speed = 1, queue_size = 100,
+                drop_when_full = False, gid = 0, prechecked_week = False):
+    """
+    Replays a week of tracking data to a set of handlers, as if the frames
+    were arriving live. Speeds well above 1 can be used to load test
+    handlers at many times real time
+    
+    Parameters
+    ----------
+    week: an integer of the week to replay
+    handlers: a list of functions (or coroutine functions) of (frame) to
+        call on each frame. See ReplayStream.subscribe()
+    speed, queue_size, drop_when_full: see ReplayStream
+    gid: an integer of a game_id, to only replay that game. Default is to
+        replay every game of the week
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    
+    Returns
+    -------
+    stats: a data frame of each handler's stats. See Subscriber.stats()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    tracking = load.tracking_data(
+        gid = gid,
+        week = week,
+        prechecked_week = True
+    )
+    
+    stream = ReplayStream(tracking, speed, queue_size, drop_when_full)
+    for handler in handlers:
+        stream.subscribe(handler)
+    
+    return asyncio.run(stream.run())
+
+if __name__ == '__main__':
+    def count_players(frame):
+        return len(frame)
+    
+    async def slow_handler(frame):
+        await asyncio.sleep(0.01)
+    
+    stats = replay_week(1, [count_players, slow_handler], speed = 50)
@@ -0,0 +1,325 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+import pandas as pd
+
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.kinematics as kin
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.input_checkers as check
+
+# Columns that hold angles. These are interpolated as directions rather than
+# as plain numbers, so that e.g. 350 and 10 degrees average to 0 and not 180
+ANGLE_COLS = ['player_orientation', 'player_direction']
+
+# The order that positions go in within each side of the ball, from the
+# quarterback out to the receivers on offense, and from the line back to the
+# safeties on defense. Positions not listed go last
+POSITION_ORDER = [
+    'QB', 'RB', 'HB', 'FB', 'TE', 'WR', 'C', 'G', 'T', 'OL',
+    'DT', 'NT', 'DE', 'DL', 'OLB', 'ILB', 'MLB', 'LB', 'CB', 'DB', 'S',
+    'SS', 'FS'
+]
+
+# Each path's times are shifted by this many seconds from the path before it,
+# so that every path can be interpolated with a single call. This is much
+# longer than any play
+PATH_SPACING = 10000.
+
+def slot_order(tracking, starts, side_slots = 0, lateral = None):
+    """
+    Decides which player slot each path of a play goes in. When the tracking
+    data has the play information attached, the offense comes first, then
+    the defense, then the ball. Otherwise the home team comes first, then the
+    away team, then the ball. Players on the same side are ordered by their
+    position (see POSITION_ORDER), then by their player ID, or by where they
+    lined up across the field if lateral is given
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data sorted with
+        frame_ops.sort_tracking(by = 'player')
+    starts: an array of the first row of each path, from
+        kin.segment_bounds()
+    side_slots: an integer of the number of slots to give each side of the
+        ball. If 0, slots are numbered straight through each play. Otherwise
+        each side gets its own fixed block of slots (so the ball is always in
+        slot 2 * side_slots), and players beyond the block are left out
+    lateral: a float array of where each path lined up across the field, to
+        order players of the same position by instead of their player ID
+    
+    Returns
+    -------
+    play_idx: an integer array of which play each path belongs to
+    slot: an integer array of which slot each path goes in. Paths that are
+        left out get -1
+    """
+    game_ids = tracking['game_id'].values[starts]
+    play_ids = tracking['play_id'].values[starts]
+    
+    # Paths are already grouped by play, so find the block of paths in each
+    # play
+    play_starts, play_stops = frame_ops.group_bounds(game_ids, play_ids)
+    play_idx = np.repeat(
+        np.arange(len(play_starts)),
+        play_stops - play_starts
+    )
+    
+    # Rank the sides of the ball
+    path_rows = tracking.iloc[starts]
+    if 'offensive_team' in tracking.columns:
+        side = np.where(frame_ops.offense_mask(path_rows), 0, 1)
+    else:
+        side = np.where(path_rows['team'].values == 'home', 0, 1)
+    side[path_rows['team'].values == 'football'] = 2
+    
+    position = path_rows['player_position'].values
+    role = np.full(len(starts), len(POSITION_ORDER))
+    for i, pos in enumerate(POSITION_ORDER):
+        role[position == pos] = i
+    
+    # Player IDs are only labels, so where the players lined up is a better
+    # way to line up similar plays, when it is known
+    if lateral is None:
+        lateral = path_rows['player_id'].fillna(-1).values
+    
+    # Put the paths in slot order within each play, then number them
+    order = np.lexsort((
+        lateral,
+        role,
+        side,
+        play_idx
+    ))
+    
+    if side_slots == 0:
+        group_starts, group_stops = play_starts, play_stops
+    else:
+        group_starts, group_stops = frame_ops.group_bounds(
+            play_idx[order],
+            side[order]
+        )
+    
+    slot = np.empty(len(starts), dtype = int)
+    slot[order] = frame_ops.rank_within(
+        np.ones(len(starts), dtype = bool),
+        group_starts,
+        group_stops
+    )
+    
+    # Give each side its own block of slots
+    if side_slots > 0:
+        slot[slot >= side_slots] = -1
+        slot[slot >= 0] += side[slot >= 0] * side_slots
+        slot[side == 2] = 2 * side_slots
+    
+    return play_idx, slot
+
+def resample_plays(tracking, features = ['player_x', 'player_y',
+                                         'player_speed'],
+                   n_steps = 50, hz = 0, pre_snap = 0, end_event = None,
+                   snap_events = ['ball_snap'], side_slots = 0,
+                   slot_by_snap = False):
+    """
+    Turns plays of any length into fixed length sequences, lined up on the
+    snap. Every path is interpolated between the frames it has, which also
+    fills in any missing frames, and all of the plays are handled at once
+    
+    Parameters
+    ----------
+    tracking: a dataframe of tracking data, or merged tracking and plays
+        data. May contain any number of plays. Plays without a snap are left
+        out
+    features: a list of the columns to resample
+    n_steps: an integer of the number of steps in each sequence
+    hz: a float of the number of steps per second. If 0, each play's
+        sequence is instead stretched to cover the play from the start to the
+        end in n_steps steps. Otherwise steps are evenly spaced in time from
+        the start, and steps after a path ends are NaN
+    pre_snap: a float of the number of seconds before the snap to start each
+        sequence at
+    end_event: a string (or list of strings) of the event to end each
+        sequence at when hz is 0, e.g. 'pass_arrived'. Default is to use the
+        end of the play. Plays without the event are all NaN
+    snap_events: a list of the event_str values that mark the snap
+    side_slots: an integer of the number of player slots to give each side
+        of the ball. See slot_order()
+    slot_by_snap: a boolean of whether to order players of the same side and
+        position by where they lined up across the field at the snap, from
+        the offense's right to its left, rather than by their player ID
+    
+    Returns
+    -------
+    plays: a data frame of the game_id and play_id of each sequence
+    times: a float32 array of shape (play, step) of the seconds from the
+        snap of each step
+    player_ids: an array of shape (play, player) of the player ID in each
+        slot, NaN for the ball and for empty slots
+    sequences: a float32 array of shape (play, step, player, feature) of
+        the resampled features. Empty slots, and steps outside of a path,
+        are NaN
+    """
+    if isinstance(end_event, str):
+        end_event = [end_event]
+    
+    tracking = frame_ops.sort_tracking(tracking, by = 'player')
+    
+    # Line every play up on the snap
+    seconds = frame_ops.seconds_from_snap(tracking, snap_events)
+    tracking = tracking[~np.isnan(seconds)].reset_index(drop = True)
+    seconds = seconds[~np.isnan(seconds)].astype(float)
+    
+    starts, stops = kin.segment_bounds(tracking)
+    
+    # Shift each path's times so that the paths don't overlap, so that every
+    # path can be interpolated at once
+    path_of_row = np.repeat(np.arange(len(starts)), stops - starts)
+    row_keys = path_of_row * PATH_SPACING + seconds
+    
+    # Find where each path was across the field at the snap (or as close to
+    # it as the path goes), measured towards the offense's left
+    lateral = None
+    if slot_by_snap:
+        snap_times = np.clip(0, seconds[starts], seconds[stops - 1])
+        lateral = np.interp(
+            np.arange(len(starts)) * PATH_SPACING + snap_times,
+            row_keys,
+            tracking['player_y'].values.astype(float)
+        )
+        lateral[tracking['play_direction'].values[starts] == 'left'] *= -1
+    
+    play_idx, slot = slot_order(tracking, starts, side_slots, lateral)
+    
+    plays = tracking.loc[
+        starts,
+        ['game_id', 'play_id']
+    ].drop_duplicates().reset_index(drop = True)
+    n_plays = len(plays)
+    
+    # Leave out the paths that didn't get a slot
+    has_slot = slot >= 0
+    path_ids = np.flatnonzero(has_slot)
+    starts = starts[has_slot]
+    stops = stops[has_slot]
+    play_idx = play_idx[has_slot]
+    slot = slot[has_slot]
+    
+    # Find when each play's sequence ends
+    if hz > 0:
+        end = np.full(n_plays, np.nan)
+    elif end_event is None:
+        end = np.full(n_plays, -np.inf)
+        np.maximum.at(end, play_idx, seconds[stops - 1])
+    else:
+        end_frames = pd.merge(
+            left = plays,
+            right = frame_ops.first_event_frame(
+                tracking,
+                end_event,
+                name = 'end_frame'
+            ),
+            how = 'left',
+            on = ['game_id', 'play_id']
+        )['end_frame'].values
+        
+        snap_frames = np.zeros(n_plays)
+        snap_frames[play_idx] = (
+            tracking['frame_id'].values[starts] -
+            seconds[starts] / kin.SECONDS_PER_FRAME
+        )
+        end = (end_frames - snap_frames) * kin.SECONDS_PER_FRAME
+    
+    # Lay out the time of each step of each play
+    if hz > 0:
+        times = np.tile(-pre_snap + np.arange(n_steps) / hz, (n_plays, 1))
+    else:
+        times = -pre_snap + (
+            (end + pre_snap)[:, None] *
+            np.linspace(0, 1, n_steps)[None, :]
+        )
+    
+    # Interpolate every path at every step of its play at once
+    path_times = times[play_idx]
+    query_keys = path_ids[:, None] * PATH_SPACING + path_times
+    
+    # Steps outside of a path's first and last frame are not filled in
+    outside = (
+        (path_times < seconds[starts][:, None]) |
+        (path_times > seconds[stops - 1][:, None]) |
+        np.isnan(path_times)
+    )
+    
+    if side_slots > 0:
+        n_slots = 2 * side_slots + 1
+    else:
+        n_slots = slot.max() + 1 if len(slot) > 0 else 0
+    sequences = np.full(
+        (n_plays, n_steps, n_slots, len(features)),
+        np.nan,
+        dtype = 'float32'
+    )
+    
+    for i, col in enumerate(features):
+        values = tracking[col].values.astype(float)
+        
+        if col in ANGLE_COLS:
+            # Interpolate the direction the angle points in, then turn it
+            # back into an angle
+            resampled = np.mod(np.arctan2(
+                np.interp(query_keys, row_keys, np.sin(values)),
+                np.interp(query_keys, row_keys, np.cos(values))
+            ), 2 * np.pi)
+        else:
+            resampled = np.interp(query_keys, row_keys, values)
+        
+        resampled[outside] = np.nan
+        sequences[play_idx, :, slot, i] = resampled
+    
+    player_ids = np.full((n_plays, n_slots), np.nan)
+    player_ids[play_idx, slot] = tracking['player_id'].values[starts]
+    
+    return plays, times.astype('float32'), player_ids, sequences
+
+def week_sequences(week, prechecked_week = False,
+                   features = ['player_x', 'player_y', 'player_speed'],
+                   n_steps = 50, hz = 0, pre_snap = 0, end_event = None):
+    """
+    Turns every play of a week into fixed length sequences
+    
+    Parameters
+    ----------
+    week: an integer of the week to resample
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    features, n_steps, hz, pre_snap, end_event: see resample_plays()
+    
+    Returns
+    -------
+    plays, times, player_ids, sequences: see resample_plays()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    # Attach the play information so that the offense and defense are put
+    # in their own slots
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    return resample_plays(
+        tracking,
+        features,
+        n_steps,
+        hz,
+        pre_snap,
+        end_event
+    )
+
+if __name__ == '__main__':
+    plays, times, player_ids, sequences = week_sequences(
+        1,
+        hz = 10,
+        n_steps = 60,
+        pre_snap = 1
+    )
@@ -0,0 +1,339 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from scipy.spatial import cKDTree
+
+import bdb_helpers.frame_ops as frame_ops
+
+# Each frame of a play is placed this many yards apart from the next along a
+# third axis, so that a single tree per play keeps every frame separate. This
+# is far larger than any distance on the field, so a query from one frame can
+# only find points from another frame when its own frame has run out of points
+FRAME_SEPARATION = 1000.
+
+# The most trees to keep at once. Once there are more, the tree used least
+# recently is dropped
+MAX_CACHED_TREES = 256
+
+# Trees that have already been built, keyed by game ID, play ID, which
+# players are in the tree, and the points in it, in the order they were last
+# used
+_play_trees = OrderedDict()
+
+def side_mask(tracking, side):
+    """
+    Finds which rows of merged tracking and plays data belong to a side of the
+    ball
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays()
+    side: a string of the side to find. One of 'offense', 'defense',
+        'football', 'players' (both teams), or 'all'
+    
+    Returns
+    -------
+    mask: a boolean array of the rows on that side of the ball
+    """
+    if side == 'offense':
+        mask = frame_ops.offense_mask(tracking)
+    elif side == 'defense':
+        mask = frame_ops.defense_mask(tracking)
+    elif side == 'football':
+        mask = tracking['team'].values == 'football'
+    elif side == 'players':
+        mask = tracking['team'].values != 'football'
+    else:
+        mask = np.ones(len(tracking), dtype = bool)
+    
+    return mask
+
+def frame_points(play_tracking):
+    """
+    Converts a play's tracking data to the points stored in its tree: the x
+    and y coordinates, plus each frame's offset along the third axis
+    
+    Parameters
+    ----------
+    play_tracking: a dataframe of one play's tracking data
+    
+    Returns
+    -------
+    points: an array of shape (row, 3)
+    """
+    points = np.column_stack([
+        play_tracking['player_x'].values,
+        play_tracking['player_y'].values,
+        play_tracking['frame_id'].values * FRAME_SEPARATION
+    ])
+    
+    return points
+
+def play_tree(play_tracking, side = 'all'):
+    """
+    Gets the tree of one side of the ball's positions in every frame of a
+    play. Trees are kept for reuse, and are only reused for the same points,
+    so a play given with other frames or positions gets its own tree
+    
+    Parameters
+    ----------
+    play_tracking: a dataframe of merged tracking and plays data for a single
+        play
+    side: a string of which players to put in the tree. One of 'offense',
+        'defense', 'football', 'players' (both teams), or 'all'
+    
+    Returns
+    -------
+    index: a dictionary holding the tree, and the player_id, team, and
+        frame_id of each point in the tree
+    """
+    members = play_tracking[side_mask(play_tracking, side)]
+    points = frame_points(members)
+    
+    key = (
+        play_tracking['game_id'].iloc[0],
+        play_tracking['play_id'].iloc[0],
+        side,
+        len(points),
+        hash(points.tobytes())
+    )
+    
+    if key in _play_trees:
+        _play_trees.move_to_end(key)
+    
+    else:
+        _play_trees[key] = {
+            'tree': cKDTree(points),
+            'player_id': members['player_id'].values,
+            'team': members['team'].values,
+            'frame_id': members['frame_id'].values
+        }
+        
+        if len(_play_trees) > MAX_CACHED_TREES:
+            _play_trees.popitem(last = False)
+    
+    return _play_trees[key]
+
+def clear_cache():
+    """
+    Removes all trees that have been built so far
+    
+    Returns
+    -------
+    None.
+    """
+    _play_trees.clear()
+    
+    return None
+
+def is_anchor(index, rows, anchor):
+    """
+    Finds which points returned from a tree are the anchor itself, so that the
+    anchor is not returned as its own neighbor
+    
+    Parameters
+    ----------
+    index: a dictionary from play_tree()
+    rows: an array of the rows of the tree returned by a query
+    anchor: either 'football', or the player ID of the anchor
+    
+    Returns
+    -------
+    is_self: a boolean array of the same shape as rows
+    """
+    if anchor == 'football':
+        is_self = index['team'][rows] == 'football'
+    else:
+        is_self = index['player_id'][rows] == anchor
+    
+    return is_self
+
+def anchor_rows(play_tracking, anchor):
+    """
+    Finds the rows of a play to query from
+    
+    Parameters
+    ----------
+    play_tracking: a dataframe of tracking data for a single play
+    anchor: either 'football' to query from the ball, or a player ID to
+        query from that player
+    
+    Returns
+    -------
+    anchors: a dataframe of the anchor's rows, one per frame
+    """
+    if anchor == 'football':
+        anchors = play_tracking[play_tracking['team'] == 'football']
+    else:
+        anchors = play_tracking[play_tracking['player_id'] == anchor]
+    
+    return anchors
+
+def nearest_players(tracking, anchor, k = 1, side = 'defense'):
+    """
+    Finds the k players closest to an anchor (the ball, or a player) in every
+    frame of every play in the tracking data. Each play is answered with a
+    single query of its tree covering all of its frames
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    anchor: either 'football' to search around the ball, or a player ID to
+        search around that player (e.g. the targeted receiver)
+    k: an integer of the number of closest players to find
+    side: a string of which players to search. One of 'offense', 'defense',
+        'football', 'players' (both teams), or 'all'
+    
+    Returns
+    -------
+    nearest: a data frame with k rows per frame containing the game_id,
+        play_id, frame_id, anchor_id, the neighbor_rank (1 is the closest),
+        the neighbor_id, and the distance between them in yards. Frames with
+        fewer than k players on the searched side have fewer rows
+    """
+    tracking = frame_ops.sort_tracking(tracking)
+    
+    starts, stops = frame_ops.group_bounds(
+        tracking['game_id'].values,
+        tracking['play_id'].values
+    )
+    
+    results = []
+    for start, stop in zip(starts, stops):
+        play_tracking = tracking.iloc[start:stop]
+        anchors = anchor_rows(play_tracking, anchor)
+        
+        if anchors.empty:
+            continue
+        
+        index = play_tree(play_tracking, side)
+        if index['tree'].n == 0:
+            continue
+        
+        # Query every frame of the play at once. One extra neighbor is asked
+        # for in case the anchor finds itself
+        distances, rows = index['tree'].query(
+            frame_points(anchors),
+            k = k + 1,
+            distance_upper_bound = FRAME_SEPARATION / 2
+        )
+        
+        # Misses (i.e. the frame ran out of players) come back as infinitely
+        # far away, with a row one past the end of the tree
+        found = np.isfinite(distances)
+        found[found] = ~is_anchor(index, rows[found], anchor)
+        
+        # Keep the closest k neighbors that are not the anchor
+        rank = np.cumsum(found, axis = 1)
+        found &= rank <= k
+        anchor_idx = np.nonzero(found)[0]
+        
+        results.append(pd.DataFrame({
+            'game_id': anchors['game_id'].values[anchor_idx],
+            'play_id': anchors['play_id'].values[anchor_idx],
+            'frame_id': anchors['frame_id'].values[anchor_idx],
+            'anchor_id': anchors['player_id'].values[anchor_idx],
+            'neighbor_rank': rank[found],
+            'neighbor_id': index['player_id'][rows[found]],
+            'distance': distances[found].astype('float32')
+        }))
+    
+    if len(results) == 0:
+        return pd.DataFrame(columns = [
+            'game_id', 'play_id', 'frame_id', 'anchor_id', 'neighbor_rank',
+            'neighbor_id', 'distance'
+        ])
+    
+    nearest = pd.concat(results, ignore_index = True)
+    
+    return nearest
+
+def players_within(tracking, r, anchor = 'football', side = 'players'):
+    """
+    Finds every player within a given radius of an anchor (the ball, or a
+    player) in every frame of every play in the tracking data
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    r: a float of the radius to search within, in yards
+    anchor: either 'football' to search around the ball, or a player ID to
+        search around that player
+    side: a string of which players to search. One of 'offense', 'defense',
+        'football', 'players' (both teams), or 'all'
+    
+    Returns
+    -------
+    within: a data frame with one row per player found containing the
+        game_id, play_id, frame_id, anchor_id, the neighbor_id, and the
+        distance between them in yards
+    """
+    tracking = frame_ops.sort_tracking(tracking)
+    
+    starts, stops = frame_ops.group_bounds(
+        tracking['game_id'].values,
+        tracking['play_id'].values
+    )
+    
+    results = []
+    for start, stop in zip(starts, stops):
+        play_tracking = tracking.iloc[start:stop]
+        anchors = anchor_rows(play_tracking, anchor)
+        
+        if anchors.empty:
+            continue
+        
+        index = play_tree(play_tracking, side)
+        
+        # Query every frame of the play at once. Each anchor gets back a list
+        # of the rows within the radius
+        anchor_points = frame_points(anchors)
+        found = index['tree'].query_ball_point(anchor_points, r)
+        
+        n_found = np.array([len(rows) for rows in found], dtype = int)
+        if n_found.sum() == 0:
+            continue
+        
+        anchor_idx = np.repeat(np.arange(len(anchors)), n_found)
+        rows = np.concatenate(found).astype(int)
+        
+        # Leave the anchor out of its own results
+        not_self = ~is_anchor(index, rows, anchor)
+        anchor_idx = anchor_idx[not_self]
+        rows = rows[not_self]
+        
+        distances = np.hypot(
+            index['tree'].data[rows, 0] - anchor_points[anchor_idx, 0],
+            index['tree'].data[rows, 1] - anchor_points[anchor_idx, 1]
+        )
+        
+        results.append(pd.DataFrame({
+            'game_id': anchors['game_id'].values[anchor_idx],
+            'play_id': anchors['play_id'].values[anchor_idx],
+            'frame_id': anchors['frame_id'].values[anchor_idx],
+            'anchor_id': anchors['player_id'].values[anchor_idx],
+            'neighbor_id': index['player_id'][rows],
+            'distance': distances.astype('float32')
+        }))
+    
+    if len(results) == 0:
+        return pd.DataFrame(columns = [
+            'game_id', 'play_id', 'frame_id', 'anchor_id', 'neighbor_id',
+            'distance'
+        ])
+    
+    within = pd.concat(results, ignore_index = True)
+    
+    return within
+
+if __name__ == '__main__':
+    import bdb_helpers.data_mergers as merge
+    
+    tracking = merge.tracking_and_plays(2018121603, 105)
+    ball_area = players_within(tracking, 5)
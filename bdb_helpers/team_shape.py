@@ -0,0 +1,527 @@
+"""
+@author: Ross Drucker
+"""
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import bdb_helpers.frame_ops as frame_ops
+import bdb_helpers.data_loaders as load
+import bdb_helpers.data_mergers as merge
+import bdb_helpers.file_movers as file_ops
+import bdb_helpers.input_checkers as check
+
+# How far a point can be from a line (in square yards of cross product) and
+# still count as on it
+COLLINEAR_TOL = 1e-9
+
+# The most frames to work on at once. Hulls need (frame, player, player,
+# player) sized arrays, so this keeps memory in check
+CHUNK_FRAMES = 2000
+
+def field_bounds():
+    """
+    Gets the edges of the field of play from the field markings
+    
+    Returns
+    -------
+    x_min, x_max, y_min, y_max: floats of the edges of the field, in yards
+    """
+    sidelines = load.football_field_coords()[0]
+    
+    # The sidelines are drawn as strips outside of the field, so the field is
+    # between their inside edges
+    y_edges = np.sort(sidelines['y'].unique())
+    
+    x_min = sidelines['x'].min()
+    x_max = sidelines['x'].max()
+    y_min = y_edges[1]
+    y_max = y_edges[-2]
+    
+    return x_min, x_max, y_min, y_max
+
+def frame_layout(tracking):
+    """
+    Lays the players of every frame out in an array, with one row per frame
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data
+    
+    Returns
+    -------
+    frames: a data frame of the game_id, play_id, and frame_id of each frame
+    player_ids: an array of shape (frame, slot) of the player in each slot,
+        NaN for empty slots
+    points: an array of shape (frame, slot, 2) of each player's x and y, NaN
+        for empty slots
+    is_offense: a boolean array of shape (frame, slot) of whether each slot
+        holds an offensive player
+    """
+    tracking = tracking[tracking['team'] != 'football']
+    tracking = frame_ops.sort_tracking(tracking, by = 'frame')
+    
+    starts, stops = frame_ops.group_bounds(
+        tracking['game_id'].values,
+        tracking['play_id'].values,
+        tracking['frame_id'].values
+    )
+    
+    # Give each player a slot within their frame
+    frame_idx = np.repeat(np.arange(len(starts)), stops - starts)
+    slot = frame_ops.rank_within(
+        np.ones(len(tracking), dtype = bool),
+        starts,
+        stops
+    )
+    n_slots = (stops - starts).max() if len(starts) > 0 else 0
+    
+    frames = tracking.loc[
+        starts,
+        ['game_id', 'play_id', 'frame_id']
+    ].reset_index(drop = True)
+    
+    player_ids = np.full((len(starts), n_slots), np.nan)
+    player_ids[frame_idx, slot] = tracking['player_id'].values
+    
+    points = np.full((len(starts), n_slots, 2), np.nan)
+    points[frame_idx, slot, 0] = tracking['player_x'].values
+    points[frame_idx, slot, 1] = tracking['player_y'].values
+    
+    is_offense = np.zeros((len(starts), n_slots), dtype = bool)
+    is_offense[frame_idx, slot] = frame_ops.offense_mask(tracking)
+    
+    return frames, player_ids, points, is_offense
+
+def pack_side(points, on_side):
+    """
+    Packs one team's players into the leading slots of each frame, so that a
+    side's arrays are only as wide as its most crowded frame rather than the
+    full width of both teams
+    
+    Parameters
+    ----------
+    points: an array of shape (frame, slot, 2) of each player's x and y, as
+        returned by frame_layout()
+    on_side: a boolean array of shape (frame, slot) of which slots hold the
+        side's players
+    
+    Returns
+    -------
+    side_points: an array of shape (frame, side slot, 2) of the side's
+        players' x and y, NaN for empty slots
+    """
+    n_frames, n_slots = on_side.shape
+    on_side = on_side & ~np.isnan(points[..., 0])
+    
+    # Number each of the side's players within their frame
+    starts = np.arange(n_frames) * n_slots
+    rank = frame_ops.rank_within(
+        on_side.ravel(),
+        starts,
+        starts + n_slots
+    ).reshape(n_frames, n_slots)
+    n_side_slots = rank.max() + 1 if rank.size > 0 else 0
+    
+    frame_idx, slot = np.nonzero(on_side)
+    side_points = np.full((n_frames, n_side_slots, 2), np.nan)
+    side_points[frame_idx, rank[frame_idx, slot]] = points[frame_idx, slot]
+    
+    return side_points
+
+def hull_area(points):
+    """
+    Finds the area of the convex hull of each set of points. An edge from one
+    point to another is on the hull when no other point is to its right, so
+    every edge of every set is tested at once rather than building each hull
+    in turn
+    
+    Parameters
+    ----------
+    points: an array of shape (set, point, 2) of the points. Missing points
+        are NaN
+    
+    Returns
+    -------
+    area: an array of the area of each set's hull. Sets with fewer than three
+        points that aren't in a line have an area of 0
+    """
+    x = points[..., 0]
+    y = points[..., 1]
+    n_points = points.shape[1]
+    
+    # Only count the first of any points in the same spot
+    valid = ~np.isnan(x)
+    same_spot = (
+        (x[:, :, None] == x[:, None, :]) &
+        (y[:, :, None] == y[:, None, :])
+    )
+    earlier = np.tril(np.ones((n_points, n_points), dtype = bool), -1)
+    valid &= ~np.any(same_spot & earlier[None], axis = 2)
+    
+    x = np.where(valid, x, 0)
+    y = np.where(valid, y, 0)
+    
+    # The direction of each edge from point i to point j, as
+    # (set, i, j)
+    dx = x[:, None, :] - x[:, :, None]
+    dy = y[:, None, :] - y[:, :, None]
+    
+    # Where each point k is relative to each edge, as (set, i, j, k)
+    kx = x[:, None, None, :] - x[:, :, None, None]
+    ky = y[:, None, None, :] - y[:, :, None, None]
+    cross = dx[..., None] * ky - dy[..., None] * kx
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        along = (
+            (dx[..., None] * kx + dy[..., None] * ky) /
+            (dx ** 2 + dy ** 2)[..., None]
+        )
+    
+    # An edge is off the hull if a point is to its right, or if a point is
+    # on it between its ends (the edge is then made of shorter edges)
+    on_line = np.abs(cross) <= COLLINEAR_TOL
+    blocked = (cross < -COLLINEAR_TOL) | (on_line & (along > 0) & (along < 1))
+    blocked &= valid[:, None, None, :]
+    
+    on_hull = (
+        valid[:, :, None] &
+        valid[:, None, :] &
+        ~np.eye(n_points, dtype = bool)[None] &
+        ~np.any(blocked, axis = 3)
+    )
+    
+    # Add up the hull's edges with the shoelace formula. When every point is
+    # in a line, each edge is found in both directions and they cancel out
+    shoelace = x[:, :, None] * y[:, None, :] - x[:, None, :] * y[:, :, None]
+    area = 0.5 * np.sum(np.where(on_hull, shoelace, 0), axis = (1, 2))
+    
+    return area
+
+def clip_polygons(verts, counts, normal, offset):
+    """
+    Cuts a batch of convex polygons down to the side of a line where
+    normal . p <= offset, all at once
+    
+    Parameters
+    ----------
+    verts: an array of shape (polygon, vertex, 2) of each polygon's
+        vertices, in order
+    counts: an integer array of how many vertices each polygon has
+    normal: an array of shape (polygon, 2) of the normal of each polygon's
+        line
+    offset: an array of the offset of each polygon's line. Polygons whose
+        normal is NaN are left as they are
+    
+    Returns
+    -------
+    verts, counts: the vertices and vertex counts of the cut polygons
+    """
+    n_polys, n_verts = verts.shape[:2]
+    
+    k = np.arange(n_verts)[None, :]
+    has_vert = k < counts[:, None]
+    nxt = np.where(k + 1 < counts[:, None], k + 1, 0)
+    nxt_verts = np.take_along_axis(verts, nxt[..., None], axis = 1)
+    
+    # How far each vertex is past the line. Polygons without a line are
+    # treated as being entirely inside of it
+    side = np.einsum('pvc,pc->pv', verts, normal) - offset[:, None]
+    nxt_side = np.take_along_axis(side, nxt, axis = 1)
+    side = np.where(np.isnan(side), -1, side)
+    nxt_side = np.where(np.isnan(nxt_side), -1, nxt_side)
+    
+    # Each edge keeps its first vertex if it is inside the line, and adds
+    # the point where it crosses the line if it does
+    keep = (side <= 0) & has_vert
+    crosses = ((side <= 0) != (nxt_side <= 0)) & has_vert
+    
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        t = side / (side - nxt_side)
+    crossing = verts + t[..., None] * (nxt_verts - verts)
+    
+    n_out = keep.astype(int) + crosses
+    out_pos = np.cumsum(n_out, axis = 1) - n_out
+    
+    new_verts = np.zeros((n_polys, n_verts + 1, 2))
+    poly, vert = np.nonzero(keep)
+    new_verts[poly, out_pos[poly, vert]] = verts[poly, vert]
+    poly, vert = np.nonzero(crosses)
+    new_verts[poly, out_pos[poly, vert] + keep[poly, vert]] = crossing[
+        poly,
+        vert
+    ]
+    
+    counts = n_out.sum(axis = 1)
+    
+    return new_verts[:, :max(counts.max(), 1)], counts
+
+def voronoi_area(points, bounds):
+    """
+    Finds the area of the field that each player is closer to than any other
+    player in their frame, i.e. their Voronoi cell cut to the field. Each
+    cell starts as the whole field and is cut by the line halfway to each
+    other player in turn, nearest first, with every player of every frame
+    cut at once
+    
+    Parameters
+    ----------
+    points: an array of shape (frame, slot, 2) of each player's x and y, NaN
+        for empty slots
+    bounds: a tuple of the x_min, x_max, y_min, and y_max of the field
+    
+    Returns
+    -------
+    area: an array of shape (frame, slot) of the area of each player's cell,
+        NaN for empty slots
+    """
+    n_frames, n_slots = points.shape[:2]
+    x_min, x_max, y_min, y_max = bounds
+    
+    # Every cell starts as the whole field
+    verts = np.tile(
+        np.array([
+            [x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]
+        ]),
+        (n_frames * n_slots, 1, 1)
+    )
+    counts = np.full(n_frames * n_slots, 4)
+    
+    own = points.reshape(-1, 2)
+    own_sq = np.sum(own ** 2, axis = 1)
+    
+    # Cut each cell by the nearest players first, since they shrink it the
+    # most. Nobody is cut by themselves or by an empty slot
+    gaps = np.hypot(
+        points[:, :, None, 0] - points[:, None, :, 0],
+        points[:, :, None, 1] - points[:, None, :, 1]
+    )
+    gaps[:, np.arange(n_slots), np.arange(n_slots)] = np.inf
+    gaps[np.isnan(gaps)] = np.inf
+    
+    nearest = np.argsort(gaps, axis = 2).reshape(-1, n_slots)
+    gaps = np.sort(gaps, axis = 2).reshape(-1, n_slots)
+    frame_of_cell = np.repeat(np.arange(n_frames), n_slots)
+    
+    # The line halfway to a player can only cut a cell if some corner of the
+    # cell is more than half that player's distance away. Cells only shrink
+    # and later players are only further away, so once a cell can't be cut
+    # it is finished
+    active = np.arange(len(own))
+    for r in range(n_slots - 1):
+        reach = np.sqrt(np.max(
+            np.where(
+                np.arange(verts.shape[1])[None, :] < counts[active, None],
+                np.sum((verts[active] - own[active, None, :]) ** 2, axis = 2),
+                0
+            ),
+            axis = 1
+        ))
+        active = active[gaps[active, r] < 2 * reach]
+        
+        if len(active) == 0:
+            break
+        
+        # A player is closer to p than the other player when
+        # 2 (other - own) . p <= |other|^2 - |own|^2
+        other = points[frame_of_cell[active], nearest[active, r]]
+        normal = 2 * (other - own[active])
+        offset = np.sum(other ** 2, axis = 1) - own_sq[active]
+        
+        cut_verts, cut_counts = clip_polygons(
+            verts[active],
+            counts[active],
+            normal,
+            offset
+        )
+        
+        if cut_verts.shape[1] > verts.shape[1]:
+            verts = np.pad(
+                verts,
+                ((0, 0), (0, cut_verts.shape[1] - verts.shape[1]), (0, 0))
+            )
+        
+        verts[active, :cut_verts.shape[1]] = cut_verts
+        counts[active] = cut_counts
+    
+    # Find each cell's area with the shoelace formula
+    k = np.arange(verts.shape[1])[None, :]
+    has_vert = k < counts[:, None]
+    nxt = np.where(k + 1 < counts[:, None], k + 1, 0)
+    nxt_verts = np.take_along_axis(verts, nxt[..., None], axis = 1)
+    
+    shoelace = (
+        verts[..., 0] * nxt_verts[..., 1] - nxt_verts[..., 0] * verts[..., 1]
+    )
+    area = 0.5 * np.sum(np.where(has_vert, shoelace, 0), axis = 1)
+    area[np.isnan(own[:, 0])] = np.nan
+    
+    return area.reshape(n_frames, n_slots)
+
+def play_shapes(tracking):
+    """
+    Measures the shape of each team, and the space each player controls, in
+    every frame of the plays given. Frames are handled in batches, with no
+    loop over frames or players
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    
+    Returns
+    -------
+    frame_shapes: a data frame with one row per frame containing the
+        game_id, play_id, frame_id, and for each of the offense and defense:
+        - hull_area: the area of the convex hull around the team's players
+        - width: how far apart the team's widest players are across the
+          field
+        - depth: how far apart the team's deepest players are along the
+          field
+    player_space: a data frame with one row per player per frame containing
+        the game_id, play_id, frame_id, player_id, and voronoi_area, the area
+        of the field the player is closer to than anyone else
+    """
+    frames, player_ids, points, is_offense = frame_layout(tracking)
+    bounds = field_bounds()
+    
+    frame_shapes = frames.copy()
+    voronoi = np.full(player_ids.shape, np.nan)
+    
+    for side, on_side in [('offense', is_offense), ('defense', ~is_offense)]:
+        side_points = pack_side(points, on_side)
+        
+        area = np.zeros(len(frames))
+        for start in range(0, len(frames), CHUNK_FRAMES):
+            chunk = slice(start, start + CHUNK_FRAMES)
+            area[chunk] = hull_area(side_points[chunk])
+        
+        frame_shapes[f'{side}_hull_area'] = area
+        frame_shapes[f'{side}_width'] = (
+            np.nanmax(side_points[..., 1], axis = 1) -
+            np.nanmin(side_points[..., 1], axis = 1)
+        )
+        frame_shapes[f'{side}_depth'] = (
+            np.nanmax(side_points[..., 0], axis = 1) -
+            np.nanmin(side_points[..., 0], axis = 1)
+        )
+    
+    for start in range(0, len(frames), CHUNK_FRAMES):
+        chunk = slice(start, start + CHUNK_FRAMES)
+        voronoi[chunk] = voronoi_area(points[chunk], bounds)
+    
+    for col in frame_shapes.columns[3:]:
+        frame_shapes[col] = frame_shapes[col].astype('float32')
+    
+    has_player = ~np.isnan(player_ids)
+    player_space = pd.DataFrame({
+        'game_id': np.repeat(
+            frames['game_id'].values,
+            player_ids.shape[1]
+        )[has_player.ravel()],
+        'play_id': np.repeat(
+            frames['play_id'].values,
+            player_ids.shape[1]
+        )[has_player.ravel()],
+        'frame_id': np.repeat(
+            frames['frame_id'].values,
+            player_ids.shape[1]
+        )[has_player.ravel()],
+        'player_id': player_ids[has_player],
+        'voronoi_area': voronoi[has_player].astype('float32')
+    })
+    
+    return frame_shapes, player_space
+
+def team_shapes(tracking, max_workers = 1, plays_per_job = 200):
+    """
+    Measures the shapes of many plays, split across processes by play. See
+    play_shapes()
+    
+    Parameters
+    ----------
+    tracking: a dataframe of merged tracking and plays data, as returned by
+        merge.tracking_and_plays(). May contain any number of plays
+    max_workers: an integer of the most processes to use. If 1, everything
+        is done in this process. If None, the number of processors is used
+    plays_per_job: an integer of the number of plays to give each process at
+        a time
+    
+    Returns
+    -------
+    frame_shapes, player_space: see play_shapes()
+    """
+    if max_workers == 1:
+        return play_shapes(tracking)
+    
+    # Split the plays into jobs, keeping each play's rows together
+    play_keys = tracking[['game_id', 'play_id']].drop_duplicates()
+    job_of_play = play_keys.assign(
+        job = np.arange(len(play_keys)) // plays_per_job
+    )
+    job = pd.merge(
+        left = tracking[['game_id', 'play_id']],
+        right = job_of_play,
+        how = 'left',
+        on = ['game_id', 'play_id']
+    )['job'].values
+    
+    jobs = [tracking[job == i] for i in range(job_of_play['job'].max() + 1)]
+    
+    with ProcessPoolExecutor(max_workers = max_workers) as pool:
+        results = list(pool.map(play_shapes, jobs))
+    
+    frame_shapes = pd.concat(
+        [result[0] for result in results],
+        ignore_index = True
+    )
+    player_space = pd.concat(
+        [result[1] for result in results],
+        ignore_index = True
+    )
+    
+    return frame_shapes, player_space
+
+def week_team_shapes(week, prechecked_week = False, max_workers = None,
+                     save = True):
+    """
+    Measures the shapes of every frame of every play of a week, and saves
+    them to the cache directory
+    
+    Parameters
+    ----------
+    week: an integer of the week to measure
+    prechecked_week: a boolean of whether or not the week has been checked
+        before being passed to the function
+    max_workers: see team_shapes()
+    save: a boolean of whether or not to save the results as
+        team_shapes_week{week}.parquet and player_space_week{week}.parquet
+        in the cache directory
+    
+    Returns
+    -------
+    frame_shapes, player_space: see play_shapes()
+    """
+    if not prechecked_week:
+        week = check.week_number(week)
+    
+    tracking = merge.tracking_and_plays(
+        tracking = load.tracking_data(week = week, prechecked_week = True)
+    )
+    
+    frame_shapes, player_space = team_shapes(tracking, max_workers)
+    
+    if save:
+        file_ops.write_cache_table(
+            frame_shapes,
+            f'team_shapes_week{week}.parquet'
+        )
+        file_ops.write_cache_table(
+            player_space,
+            f'player_space_week{week}.parquet'
+        )
+    
+    return frame_shapes, player_space
+
+if __name__ == '__main__':
+    frame_shapes, player_space = week_team_shapes(1)